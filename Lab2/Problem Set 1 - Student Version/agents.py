@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
-from typing import Callable, Dict, Generic, List
+from typing import Callable, Dict, Generic, List, Optional
+import time
 from problem import HeuristicFunction, Problem, S, A, Solution
+from policy_store import PolicyStore, stored_search
 
 # This is an abstract class for all goal based agents
 class GoalBasedAgent(ABC, Generic[S, A]):
@@ -22,17 +24,19 @@ class HumanAgent(GoalBasedAgent[S, A]):
         return self.user_input_fn(problem, state)
 
 # This agent applies an uninformed search algorithm to find the solution to goal for the given state
+# If a policy store is given, the solutions are read from it (if they were found before) and saved into it.
 class UninformedSearchAgent(GoalBasedAgent[S, A]):
-    def __init__(self, search_fn: Callable[[Problem[S, A], S], Solution]) -> None:
+    def __init__(self, search_fn: Callable[[Problem[S, A], S], Solution], store: Optional[PolicyStore] = None) -> None:
         super().__init__()
         self.search_fn = search_fn
+        self.store = store
         # The policy will store the action to do for each state so as not to search again after each observation
         self.policy: Dict[S, A] = {}
     
     def act(self, problem: Problem[S, A], state: S) -> A:
         # This state is not stored in the policy, we need to search for a solution 
         if state not in self.policy:
-            solution = self.search_fn(problem, state)
+            solution = stored_search(self.store, problem, state, self.search_fn, None, lambda: self.search_fn(problem, state))
             # if no solution was found, we return None
             if solution is None:
                 self.policy[state] = None
@@ -45,18 +49,29 @@ class UninformedSearchAgent(GoalBasedAgent[S, A]):
         return self.policy.get(state)
 
 # This agent applies an informed search algorithm to find the solution to goal for the given state
+# If a time budget (in seconds) is given, the search function receives a deadline and should return
+# the best solution it found before it (so it must accept a 'deadline' argument).
+# If a policy store is given, the solutions are read from it (if they were found before) and saved into it,
+# except for the solutions found with a time budget since a longer search may find a better one.
 class InformedSearchAgent(GoalBasedAgent[S, A]):
-    def __init__(self, search_fn: Callable[[Problem[S, A], S, HeuristicFunction], Solution], heuristic: HeuristicFunction) -> None:
+    def __init__(self, search_fn: Callable[[Problem[S, A], S, HeuristicFunction], Solution], heuristic: HeuristicFunction,
+                 time_budget: Optional[float] = None, store: Optional[PolicyStore] = None) -> None:
         super().__init__()
         self.search_fn = search_fn
         self.heuristic = heuristic
+        self.time_budget = time_budget
+        self.store = store
         # The policy will store the action to do for each state so as not to search again after each observation
         self.policy: Dict[S, A] = {}
     
     def act(self, problem: Problem[S, A], state: S) -> A:
         # This state is not stored in the policy, we need to search for a solution 
         if state not in self.policy:
-            solution = self.search_fn(problem, state, self.heuristic)
+            def search() -> Solution:
+                if self.time_budget is None:
+                    return self.search_fn(problem, state, self.heuristic)
+                return self.search_fn(problem, state, self.heuristic, deadline=time.monotonic() + self.time_budget)
+            solution = stored_search(self.store, problem, state, self.search_fn, self.heuristic, search, save=self.time_budget is None)
             # if no solution was found, we return None
             if solution is None:
                 self.policy[state] = None
@@ -0,0 +1,151 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+from collections import deque
+from multiprocessing.connection import wait
+import argparse, glob, json, multiprocessing, os, sys, time
+
+# The search and problem modules are imported once here, so the forked workers do not import them again for every job
+import search, sokoban, sokoban_heuristic, parking, graph
+from search_benchmark import get_search_function, run_search
+from portfolio import solution_cost
+
+try:
+    import resource
+except ImportError:
+    # The peak memory is not reported on the platforms without the 'resource' module (Windows)
+    resource = None
+
+# This script solves a set of levels with a list of algorithm and heuristic combinations.
+# Every (level, combination) pair is a job which runs in its own process, with at most 'workers' jobs running at the same time,
+# and the job is stopped if it exceeds the time limit. A process per job allows the time limit to be enforced
+# and the peak memory of every job to be measured separately.
+# The results are written as JSON lines as soon as the jobs finish (in the order they finish), for example:
+#   {"level": "levels/level1.txt", "problem": "sokoban", "algorithm": "astar", "heuristic": "strong", "status": "solved",
+#    "length": 19, "cost": 19, "expanded": 96, "time": 0.004, "peak_memory_kb": 136}
+# The status is one of "solved", "no solution", "invalid" (the solution does not reach a goal), "timeout" or "error".
+# The peak memory of a job is how much its process grew beyond the memory it inherited from this script,
+# so it does not include the modules and data that were loaded before the jobs started.
+# Example:
+#   python batch_solve.py "levels/*.txt" "parks/*.txt" --combos bfs astar:weak astar:strong --workers 4 --output results.jsonl
+
+# Guess the problem type of a file from its extension and folder
+def infer_problem_type(path: str) -> str:
+    if path.endswith(".json"):
+        return "graph"
+    folder = os.path.basename(os.path.dirname(os.path.abspath(path)))
+    if folder == "parks" or os.path.basename(path).startswith("park"):
+        return "parking"
+    return "sokoban"
+
+# Split a combination "algorithm" or "algorithm:heuristic" into the algorithm and the heuristic (None for the uninformed searches).
+# The informed searches use the zero heuristic if no heuristic is given.
+def parse_combo(combo: str) -> Tuple[str, Optional[str]]:
+    algorithm, _, heuristic = combo.partition(":")
+    _, informed = get_search_function(algorithm)
+    return algorithm, (heuristic or "zero") if informed else None
+
+# Returns the peak resident memory of this process in kilobytes (ru_maxrss is in kilobytes on Linux and in bytes on macOS)
+def _peak_memory_kb() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+# Run a job in a child process and send its record through the connection.
+# A forked child starts with the peak memory of the parent (the pages it shares with it),
+# so the peak memory of the job is measured from the peak at the start of the job.
+def _run_job(record: Dict, prune_deadlocks: bool, connection) -> None:
+    baseline = _peak_memory_kb() if resource is not None else 0
+    try:
+        problem, solution, expanded, elapsed = run_search(record["problem"], record["level"], record["algorithm"], record["heuristic"] or "zero", prune_deadlocks)
+        record.update(expanded=expanded, time=elapsed)
+        if solution is None:
+            record["status"] = "no solution"
+        else:
+            cost = solution_cost(problem, problem.get_initial_state(), solution)
+            record.update(status="solved" if cost is not None else "invalid", length=len(solution), cost=cost)
+    except Exception as error:
+        record.update(status="error", error=repr(error))
+    if resource is not None:
+        record["peak_memory_kb"] = _peak_memory_kb() - baseline
+    connection.send(record)
+    connection.close()
+
+# Run the jobs with at most 'workers' processes at the same time and yield their records as soon as they finish
+def run_jobs(jobs: List[Dict], workers: int, timeout: Optional[float], prune_deadlocks: bool = False) -> Iterator[Dict]:
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context()
+    pending = deque(jobs)
+    # The running jobs by the receiving end of their connection: (process, record, start time)
+    running: Dict = {}
+    while pending or running:
+        while pending and len(running) < workers:
+            record = pending.popleft()
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=_run_job, args=(record, prune_deadlocks, sender), daemon=True)
+            process.start()
+            sender.close()
+            running[receiver] = (process, record, time.perf_counter())
+        # Wait until a job sends its record, a job process exits or the next job reaches the time limit
+        wait_time = None
+        if timeout is not None:
+            wait_time = max(0, min(start for _, _, start in running.values()) + timeout - time.perf_counter())
+        ready = wait(list(running) + [process.sentinel for process, _, _ in running.values()], wait_time)
+        now = time.perf_counter()
+        for receiver in list(running):
+            process, record, start = running[receiver]
+            if receiver in ready or process.sentinel in ready:
+                try:
+                    record = receiver.recv()
+                except EOFError:
+                    # The process exited without sending its record
+                    record.update(status="error", error=f"exit code {process.exitcode}", time=now - start)
+            elif timeout is not None and now - start >= timeout:
+                process.terminate()
+                record.update(status="timeout", time=now - start)
+            else:
+                continue
+            del running[receiver]
+            process.join()
+            receiver.close()
+            yield record
+
+def main(args: argparse.Namespace):
+    paths: List[str] = sorted(path for pattern in args.levels for path in glob.glob(pattern))
+    if not paths:
+        print("No levels matched the given patterns", file=sys.stderr)
+        return
+    combos = [parse_combo(combo) for combo in args.combos]
+    jobs = [
+        {"level": path, "problem": args.problem or infer_problem_type(path), "algorithm": algorithm, "heuristic": heuristic}
+        for path in paths for algorithm, heuristic in combos
+    ]
+    output = sys.stdout if args.output is None else open(args.output, 'w')
+    statuses: Dict[str, int] = {}
+    start = time.perf_counter()
+    try:
+        for record in run_jobs(jobs, args.workers, args.timeout, args.deadlocks):
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    summary = ", ".join(f"{count} {status}" for status, count in statuses.items())
+    print(f"{len(jobs)} jobs in {time.perf_counter() - start:.3f} seconds: {summary}", file=sys.stderr)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve a set of levels with several algorithms in parallel and write the results as JSON lines")
+    parser.add_argument("levels", nargs="+", help="glob patterns for the level files (levels/*.txt, parks/*.txt or graphs/*.json)")
+    parser.add_argument("--combos", "-a", nargs="+", default=["astar:strong"],
+                        help="the algorithms to run as 'algorithm' or 'algorithm:heuristic' (for example: bfs astar:strong)")
+    parser.add_argument("--problem", "-p", default=None, choices=["sokoban", "sokoban-packed", "sokoban-push", "parking", "graph", "graph-compact"],
+                        help="the type of the problems (by default, it is guessed from the file extension and folder)")
+    parser.add_argument("--workers", "-w", type=int, default=os.cpu_count() or 1,
+                        help="the maximum number of jobs running at the same time (default: the number of cores)")
+    parser.add_argument("--timeout", "-t", type=float, default=60,
+                        help="the time limit (in seconds) for each job")
+    parser.add_argument("--output", "-o", default=None,
+                        help="the JSON lines file to write the results to (default: the standard output)")
+    parser.add_argument("--deadlocks", "-dl", action="store_true", default=False,
+                        help="prune the pushes that lead to deadlocks (sokoban only)")
+    main(parser.parse_args())
@@ -0,0 +1,119 @@
+from typing import Any, Callable, Container, Optional
+from enum import Enum
+import time
+
+from problem import HeuristicFunction, Problem, S, A, Solution
+from priority_queue import IndexedPriorityQueue, InsertionOrderQueue
+from search_nodes import SearchNodeStore
+from search_stats import SearchStatistics, collects_statistics
+
+# This file contains the generic best first search which is shared by the search functions in 'search.py'.
+# The searches only differ in:
+#   the priority of a node, which is computed from its path cost (g) and its heuristic value (h),
+#   how the ties between equal priorities are broken,
+#   and whether the goal test is applied when a node is generated or when it is expanded.
+# The frontier holds every state at most once, and a state is only replaced by a node with a better priority.
+
+# A priority function receives the path cost (g) and the heuristic value (h) of a node and returns its priority
+PriorityFunction = Callable[[float, float], Any]
+
+# Every node has the same priority, so the order only depends on the tie breaking (used by BFS and DFS)
+def constant_priority(g: float, h: float) -> float:
+    return 0
+
+# The priority of uniform cost search
+def cost_priority(g: float, h: float) -> float:
+    return g
+
+# The priority of greedy best first search
+def heuristic_priority(g: float, h: float) -> float:
+    return h
+
+# The priority of A*
+def astar_priority(g: float, h: float) -> float:
+    return g + h
+
+# The priority of weighted A* (g + w * h). A weight above 1 finds solutions faster
+# but they can cost up to 'weight' times the optimal cost.
+def weighted_priority(weight: float) -> PriorityFunction:
+    def priority(g: float, h: float) -> float:
+        return g + weight * h
+    return priority
+
+# The ways to break the ties between nodes with the same priority
+class TieBreaking(Enum):
+    FIFO = "fifo"                       # The node that was added first is expanded first
+    LIFO = "lifo"                       # The node that was added last is expanded first
+    PREFER_HIGHER_COST = "higher-cost"  # The node with the higher path cost (the deeper node for A*) is expanded first, then FIFO
+
+# The data structures that can hold the frontier
+class Frontier(Enum):
+    HEAP = "heap"                       # 'IndexedPriorityQueue' (the default)
+    INSERTION_ORDER = "insertion-order" # A queue or a stack ('InsertionOrderQueue'), only valid if all the priorities are equal
+
+# Searches for a path from the initial state to a goal using the given priority function.
+# The heuristic is only called if it is given (otherwise h is 0) and the action costs are only
+# computed if 'track_costs' is True (otherwise g is 0), so the searches which do not need them do not pay for them.
+# If 'goal_on_generation' is True, the goal test is applied to the new states when they are generated (like BFS),
+# otherwise it is applied when they are expanded, which is needed for the optimality of UCS and A*.
+# If a deadline (a 'time.monotonic()' value) is given, the search gives up and returns None once it is reached.
+# The closed set is a new 'set' by default. Any empty container with 'add' can be given instead,
+# such as a 'zobrist.FingerprintSet' which only stores the 64-bit fingerprints of the states.
+# If a 'SearchStatistics' object is given as 'stats', the search fills it in (see 'search_stats.py').
+@collects_statistics
+def GenericBestFirstSearch(problem: Problem[S, A], initial_state: S, priority: PriorityFunction,
+                           heuristic: Optional[HeuristicFunction] = None,
+                           tie_breaking: TieBreaking = TieBreaking.FIFO,
+                           goal_on_generation: bool = False,
+                           track_costs: bool = True,
+                           frontier_type: Frontier = Frontier.HEAP,
+                           deadline: Optional[float] = None,
+                           closed_set: Optional[Container[S]] = None,
+                           stats: Optional[SearchStatistics] = None) -> Solution:
+    if goal_on_generation and problem.is_goal(initial_state):
+        return []
+
+    prefer_higher_cost = tie_breaking == TieBreaking.PREFER_HIGHER_COST
+    lifo = tie_breaking == TieBreaking.LIFO
+    if frontier_type == Frontier.INSERTION_ORDER:
+        frontier = InsertionOrderQueue(lifo=lifo)
+    else:
+        frontier = IndexedPriorityQueue(lifo=lifo)
+    explored = set() if closed_set is None else closed_set
+    nodes = SearchNodeStore(with_costs=track_costs)
+    if stats is not None:
+        problem, heuristic = stats.instrument(problem, heuristic, lambda: len(frontier), lambda: len(explored), lambda: len(nodes) - 1)
+
+    # When the higher path costs are preferred, the priority of a node is extended with its negated path cost as a second key
+    root_priority = priority(0, 0 if heuristic is None else heuristic(problem, initial_state))
+    frontier.push(initial_state, (root_priority, 0) if prefer_higher_cost else root_priority, nodes.add_root())
+    # The methods used in the inner loop are looked up once
+    get_successor, get_cost, is_goal, push = problem.get_successor, problem.get_cost, problem.is_goal, frontier.push
+
+    while frontier:
+        state, _, node = frontier.pop()
+        if not goal_on_generation and is_goal(state):
+            return nodes.solution(node)
+        if deadline is not None and time.monotonic() >= deadline:
+            return None
+        explored.add(state)
+        cost = nodes.cost(node) if track_costs else 0
+
+        for action in problem.get_actions(state):
+            next_state = get_successor(state, action)
+            if next_state in explored:
+                continue
+            next_cost = cost + get_cost(state, action) if track_costs else 0
+            # The frontier only accepts the state if it is new or if this node has a better priority (according to the tie breaking).
+            # The node is pushed with the index it will get in the node store, and it is only stored if it was accepted.
+            next_priority = priority(next_cost, 0 if heuristic is None else heuristic(problem, next_state))
+            if prefer_higher_cost:
+                next_priority = (next_priority, -next_cost)
+            next_node = len(nodes)
+            if not push(next_state, next_priority, next_node):
+                continue
+            nodes.add(node, action, next_cost)
+            if goal_on_generation and is_goal(next_state):
+                return nodes.solution(next_node)
+
+    return None
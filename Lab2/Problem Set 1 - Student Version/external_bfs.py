@@ -0,0 +1,305 @@
+from abc import ABC, abstractmethod
+from typing import Iterable, Iterator, List, Optional, Tuple
+from heapq import merge
+import argparse, os, shutil, sys, tempfile, time
+
+from problem import Problem, S, A, Solution
+from search_stats import SearchStatistics, collects_statistics
+
+# This file contains an external memory (out-of-core) breadth first search, for the state spaces whose explored set
+# does not fit in memory. Only the successors of the layer that is being expanded are kept in memory:
+#   Every layer (the states at the same depth) is a file of fixed-size state encodings sorted in byte order.
+#   The successors of the current layer are collected in a buffer of at most 'memory_budget' bytes.
+#   When the buffer is full, it is sorted, its duplicates are removed and it is written to a run file.
+#   At the end of the layer, the runs are merged and the result is merge-joined against the files of the previous layers
+#   (which are also sorted), so a state is only kept if no previous layer contains it. The result is the next layer file.
+#   The parents are not stored: when a goal is found, the path is rebuilt backwards by scanning the previous layers
+#   for a state that has the current state as a successor (this costs one more expansion of the layers at most).
+# The states are written using a codec (see 'get_codec') which converts a state to bytes and back.
+# Example:
+#   python external_bfs.py parks/park2.txt --problem parking --memory 1000000
+
+# A codec converts the states of a problem to byte strings of a fixed size and back.
+# Comparing the encodings is only used to sort and merge the files, so any byte order works.
+class StateCodec(ABC):
+    size: int   # The number of bytes of every encoding
+
+    @abstractmethod
+    def encode(self, state) -> bytes:
+        pass
+
+    @abstractmethod
+    def decode(self, data: bytes):
+        pass
+
+# Sokoban states (of 'SokobanProblem' and 'SokobanPushProblem') are encoded as the index of the player cell (2 bytes)
+# followed by the bitmask of the crates, using the cell numbering of 'PackedSokobanLayout'
+class SokobanCodec(StateCodec):
+    def __init__(self, problem) -> None:
+        from sokoban_packed import PackedSokobanLayout
+        self.problem = problem
+        self.packed = PackedSokobanLayout(problem.layout)
+        self.mask_size = (len(self.packed.cells) + 7) // 8
+        self.size = 2 + self.mask_size
+
+    def encode(self, state) -> bytes:
+        packed = self.packed
+        return packed.index[state.player].to_bytes(2, "big") + packed.pack(state.crates).to_bytes(self.mask_size, "big")
+
+    def decode(self, data: bytes):
+        from sokoban import SokobanState
+        packed = self.packed
+        player = packed.cells[int.from_bytes(data[:2], "big")]
+        state = SokobanState(self.problem.layout, player, packed.unpack(int.from_bytes(data[2:], "big")))
+        # The states of a problem with Zobrist hashing must carry their key
+        return state if getattr(self.problem, "zobrist", None) is None else self.problem.zobrist_state(state)
+
+# Packed sokoban states are already numbers, so they are encoded directly
+class PackedSokobanCodec(StateCodec):
+    def __init__(self, problem) -> None:
+        self.problem = problem
+        self.mask_size = (len(problem.packed_layout.cells) + 7) // 8
+        self.size = 2 + self.mask_size
+
+    def encode(self, state) -> bytes:
+        return state.player.to_bytes(2, "big") + state.crates.to_bytes(self.mask_size, "big")
+
+    def decode(self, data: bytes):
+        from sokoban_packed import PackedSokobanState
+        return PackedSokobanState(self.problem.packed_layout, int.from_bytes(data[:2], "big"), int.from_bytes(data[2:], "big"))
+
+# Parking states are encoded as the cell index of every car (1 byte per car, or 2 if the lot has more than 256 cells).
+# The occupancy bitmask and the number of cars in place are computed again when a state is decoded.
+class ParkingCodec(StateCodec):
+    def __init__(self, problem) -> None:
+        self.problem = problem
+        self.cell_size = 1 if len(problem.cells) <= 256 else 2
+        self.size = self.cell_size * len(problem.cars)
+
+    def encode(self, state) -> bytes:
+        if self.cell_size == 1:
+            return bytes(state.cars)
+        return b"".join(cell.to_bytes(2, "big") for cell in state.cars)
+
+    def decode(self, data: bytes):
+        from parking import ParkingState, ZobristParkingState
+        problem, size = self.problem, self.cell_size
+        cars = tuple(data) if size == 1 else tuple(int.from_bytes(data[i:i + size], "big") for i in range(0, len(data), size))
+        occupied = 0
+        for cell in cars:
+            occupied |= 1 << cell
+        in_place = sum(1 for car, cell in enumerate(cars) if problem.cell_slots[cell] == car)
+        if problem.zobrist is None:
+            return ParkingState(cars, occupied, in_place)
+        key = 0
+        for car, cell in enumerate(cars):
+            key ^= problem.zobrist[car][cell]
+        return ZobristParkingState(cars, occupied, in_place, key)
+
+# Returns the codec of the problem's states
+def get_codec(problem: Problem) -> StateCodec:
+    from sokoban import SokobanState
+    from sokoban_packed import PackedSokobanProblem
+    from parking import ParkingProblem
+    if isinstance(problem, PackedSokobanProblem):
+        return PackedSokobanCodec(problem)
+    if isinstance(problem, ParkingProblem):
+        return ParkingCodec(problem)
+    if isinstance(problem.get_initial_state(), SokobanState):
+        return SokobanCodec(problem)
+    raise ValueError(f"No state codec is available for '{type(problem).__name__}'")
+
+# The number of bytes read from a file at once
+_READ_SIZE = 1 << 16
+
+# Yields the records of a file of fixed-size records
+def read_records(path: str, size: int) -> Iterator[bytes]:
+    chunk = max(1, _READ_SIZE // size) * size
+    with open(path, "rb") as f:
+        while True:
+            data = f.read(chunk)
+            if not data:
+                return
+            for start in range(0, len(data), size):
+                yield data[start:start + size]
+
+# Writes the records to a file and returns how many were written
+def write_records(path: str, records: Iterable[bytes]) -> int:
+    count = 0
+    with open(path, "wb") as f:
+        for record in records:
+            f.write(record)
+            count += 1
+    return count
+
+# Yields the records of a sorted stream without the repeated ones
+def unique(records: Iterable[bytes]) -> Iterator[bytes]:
+    previous = None
+    for record in records:
+        if record != previous:
+            yield record
+            previous = record
+
+# Yields the records of the sorted stream 'records' that are not in the sorted stream 'removed' (a merge join)
+def subtract(records: Iterable[bytes], removed: Iterable[bytes]) -> Iterator[bytes]:
+    removed = iter(removed)
+    current = next(removed, None)
+    for record in records:
+        while current is not None and current < record:
+            current = next(removed, None)
+        if current != record:
+            yield record
+
+# The files of an external breadth first search: the sorted layers and the runs of the layer that is being generated
+class LayerFiles:
+    def __init__(self, directory: Optional[str], size: int) -> None:
+        # If no directory is given, a temporary directory is created and removed by 'close'
+        self.temporary = directory is None
+        self.directory = tempfile.mkdtemp(prefix="external_bfs_") if directory is None else directory
+        os.makedirs(self.directory, exist_ok=True)
+        self.size = size
+        self.layers: List[str] = []     # The path of every layer file (layers[d] contains the states at depth d)
+        self.runs: List[str] = []       # The run files of the next layer
+
+    def add_run(self, records: List[bytes]) -> None:
+        path = os.path.join(self.directory, f"run_{len(self.layers)}_{len(self.runs)}.bin")
+        records.sort()
+        write_records(path, unique(records))
+        self.runs.append(path)
+
+    # Merges the runs into the next layer, without the states of the previous layers, and returns the number of new states
+    def add_layer(self, locality: Optional[int] = None) -> int:
+        path = os.path.join(self.directory, f"layer_{len(self.layers)}.bin")
+        records = unique(merge(*(read_records(run, self.size) for run in self.runs)))
+        previous = self.layers if locality is None else self.layers[-locality:]
+        for layer in previous:
+            records = subtract(records, read_records(layer, self.size))
+        count = write_records(path, records)
+        for run in self.runs:
+            os.remove(run)
+        self.runs.clear()
+        self.layers.append(path)
+        return count
+
+    # The number of bytes of the layer files
+    def disk_usage(self) -> int:
+        return sum(os.path.getsize(path) for path in self.layers + self.runs)
+
+    # Removes the files (only the unfinished runs if the directory was given, so the layers can be inspected)
+    def close(self) -> None:
+        for run in self.runs:
+            os.remove(run)
+        self.runs.clear()
+        if self.temporary:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+# The memory used by every buffered encoding of 'size' bytes: the bytes object and its reference in the buffer list
+def _record_memory(size: int) -> int:
+    return sys.getsizeof(bytes(size)) + 8
+
+# Runs a breadth first search that keeps the layers in sorted files in 'directory' (a temporary directory by default,
+# which is removed at the end) and at most 'memory_budget' bytes of buffered successors in memory.
+# 'locality' is the number of previous layers used to remove the duplicates: by default all of them, which is needed
+# for the problems with irreversible actions (sokoban pushes). With reversible actions (parking), 2 layers are enough.
+# If 'info' is given, it is filled in with the size of every layer and the peak disk usage.
+@collects_statistics
+def ExternalBreadthFirstSearch(problem: Problem[S, A], initial_state: S, memory_budget: int = 64 * 2**20,
+                               directory: Optional[str] = None, codec: Optional[StateCodec] = None,
+                               locality: Optional[int] = None, info: Optional[dict] = None,
+                               stats: Optional[SearchStatistics] = None) -> Solution:
+    codec = codec or get_codec(problem)
+    # The path is rebuilt with the original problem, so the statistics only count the nodes of the search itself
+    original_problem = problem
+    if stats is not None:
+        problem, _ = stats.instrument(problem)
+    if problem.is_goal(initial_state):
+        return []
+    files = LayerFiles(directory, codec.size)
+    capacity = max(1, memory_budget // _record_memory(codec.size))
+    layer_sizes = [1]
+    peak_disk = 0
+    try:
+        files.add_run([codec.encode(initial_state)])
+        files.add_layer()
+        while layer_sizes[-1] > 0:
+            buffer: List[bytes] = []
+            for record in read_records(files.layers[-1], codec.size):
+                state = codec.decode(record)
+                for action in problem.get_actions(state):
+                    successor = problem.get_successor(state, action)
+                    # The goal test is applied on generation, so the first goal found is at the smallest depth
+                    if problem.is_goal(successor):
+                        return _rebuild_path(original_problem, codec, files, state) + [action]
+                    buffer.append(codec.encode(successor))
+                    if len(buffer) >= capacity:
+                        files.add_run(buffer)
+                        buffer = []
+            if buffer:
+                files.add_run(buffer)
+            peak_disk = max(peak_disk, files.disk_usage())
+            layer_sizes.append(files.add_layer(locality))
+        return None
+    finally:
+        if info is not None:
+            info.update(layers=layer_sizes, peak_disk=max(peak_disk, files.disk_usage()), directory=files.directory)
+        files.close()
+
+# Returns the actions that lead from the initial state to the given state of the last layer.
+# Starting from the state, it finds a parent in every previous layer by expanding that layer's states until one of them has the state as a successor.
+def _rebuild_path(problem: Problem[S, A], codec: StateCodec, files: LayerFiles, state: S) -> List[A]:
+    path: List[A] = []
+    target = codec.encode(state)
+    for layer in reversed(files.layers[:-1]):
+        target, action = _find_parent(problem, codec, layer, target)
+        path.append(action)
+    path.reverse()
+    return path
+
+def _find_parent(problem: Problem[S, A], codec: StateCodec, layer: str, target: bytes) -> Tuple[bytes, A]:
+    for record in read_records(layer, codec.size):
+        state = codec.decode(record)
+        for action in problem.get_actions(state):
+            if codec.encode(problem.get_successor(state, action)) == target:
+                return record, action
+    raise RuntimeError("The layer files do not contain a parent of the state")
+
+# Solves a level with the external breadth first search (and the in-memory breadth first search to compare them)
+def main(args: argparse.Namespace):
+    from search_benchmark import load_problem
+    from search import BreadthFirstSearch
+    import tracemalloc
+    header = f"{'search':<12}{'length':>8}{'expanded':>10}{'layers':>8}{'disk (MB)':>11}{'peak (MB)':>11}{'time (s)':>10}"
+    print(header)
+    print('-' * len(header))
+    for name in ["external", "in-memory"] if args.compare else ["external"]:
+        problem = load_problem(args.problem, args.level)
+        stats, info = SearchStatistics(), {}
+        tracemalloc.start()
+        start = time.perf_counter()
+        if name == "external":
+            solution = ExternalBreadthFirstSearch(problem, problem.get_initial_state(), args.memory, args.directory,
+                                                  locality=args.locality, info=info, stats=stats)
+        else:
+            solution = BreadthFirstSearch(problem, problem.get_initial_state(), stats=stats)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        length = "-" if solution is None else len(solution)
+        layers = len(info["layers"]) if "layers" in info else "-"
+        disk = f"{info['peak_disk'] / 2**20:.2f}" if "peak_disk" in info else "-"
+        print(f"{name:<12}{length:>8}{stats.expanded:>10}{layers:>8}{disk:>11}{peak / 2**20:>11.2f}{elapsed:>10.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve a level with an external memory breadth first search")
+    parser.add_argument("level", help="path to the level file")
+    parser.add_argument("--problem", "-p", default="sokoban", choices=["sokoban", "sokoban-packed", "sokoban-push", "parking"],
+                        help="the type of the problem stored in the level file")
+    parser.add_argument("--memory", "-m", type=int, default=64 * 2**20,
+                        help="the number of bytes of successors buffered in memory before they are written to a run file")
+    parser.add_argument("--directory", "-d", default=None,
+                        help="the directory of the layer files (a temporary directory by default)")
+    parser.add_argument("--locality", "-l", type=int, default=None,
+                        help="the number of previous layers used to remove duplicates (all of them by default)")
+    parser.add_argument("--compare", "-c", action="store_true", default=False,
+                        help="also run the in-memory breadth first search")
+    main(parser.parse_args())
@@ -0,0 +1,67 @@
+from typing import List
+import argparse, heapq, queue, random, time
+
+from priority_queue import IndexedPriorityQueue, InsertionOrderQueue
+
+# This script compares the throughput of the data structures that can hold a search frontier.
+# Each run pushes 'n' keys with random priorities (with many ties like the path costs in a search), then pops all of them.
+# 'queue.PriorityQueue' is included since it is the usual choice in Python, but it takes a lock on every put and get
+# to be thread safe, which a single threaded search never needs.
+# Example:
+#   python frontier_benchmark.py --size 200000 --repeats 5
+
+def run_heapq(priorities: List[int]) -> None:
+    heap = []
+    for order, priority in enumerate(priorities):
+        heapq.heappush(heap, (priority, order, order))
+    while heap:
+        heapq.heappop(heap)
+
+def run_priority_queue(priorities: List[int]) -> None:
+    frontier = queue.PriorityQueue()
+    for order, priority in enumerate(priorities):
+        frontier.put((priority, order, order))
+    while not frontier.empty():
+        frontier.get()
+
+def run_indexed(priorities: List[int]) -> None:
+    frontier = IndexedPriorityQueue()
+    for key, priority in enumerate(priorities):
+        frontier.push(key, priority, key)
+    while frontier:
+        frontier.pop()
+
+def run_insertion_order(priorities: List[int]) -> None:
+    frontier = InsertionOrderQueue()
+    for key, priority in enumerate(priorities):
+        frontier.push(key, priority, key)
+    while frontier:
+        frontier.pop()
+
+def main(args: argparse.Namespace):
+    rng = random.Random(args.seed)
+    priorities = [rng.randrange(args.size // 10 + 1) for _ in range(args.size)]
+    candidates = {
+        "heapq (raw tuples)": run_heapq,
+        "queue.PriorityQueue": run_priority_queue,
+        "IndexedPriorityQueue": run_indexed,
+        "InsertionOrderQueue (FIFO)": run_insertion_order,
+    }
+    header = f"{'frontier':<32}{'best time (s)':>16}{'operations/s':>16}"
+    print(header)
+    print('-' * len(header))
+    for name, run in candidates.items():
+        best = float('inf')
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            run(priorities)
+            best = min(best, time.perf_counter() - start)
+        # Every key is pushed and popped once
+        print(f"{name:<32}{best:>16.3f}{2 * args.size / best:>16.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the throughput of the frontier data structures")
+    parser.add_argument("--size", "-n", type=int, default=200_000, help="the number of keys pushed in each run")
+    parser.add_argument("--repeats", "-r", type=int, default=3, help="the number of runs of each data structure (the best is reported)")
+    parser.add_argument("--seed", "-s", type=int, default=0, help="the random seed")
+    main(parser.parse_args())
@@ -0,0 +1,42 @@
+from typing import Any, Dict
+import argparse, json, random
+
+# This script generates large synthetic graph routing problems in the same JSON format as the files in 'graphs/'.
+# The nodes are laid out on a jittered grid and every node has a directed edge to each of its 4 grid neighbours
+# with the given probability, so the graph is not symmetric and the backward searches need the reverse adjacency.
+# The start and the goal are on the middle row, at a quarter and three quarters of the width.
+# Example (a graph with 10^6 nodes):
+#   python generate_graph.py graphs/large.json --width 1000 --height 1000
+
+def generate_graph(width: int, height: int, edge_probability: float = 0.8, seed: int = 0) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    name = lambda x, y: f"n{y * width + x}"
+    spacing, jitter = 10, 3
+    graph = {}
+    for y in range(height):
+        for x in range(width):
+            adjacent = []
+            for dx, dy in ((1, 0), (0, -1), (-1, 0), (0, 1)):
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < width and 0 <= ny < height and rng.random() < edge_probability:
+                    adjacent.append(name(nx, ny))
+            graph[name(x, y)] = {
+                "position": [x * spacing + rng.randint(-jitter, jitter), y * spacing + rng.randint(-jitter, jitter)],
+                "adjacent": adjacent
+            }
+    return {
+        "graph": graph,
+        "start": name(width // 4, height // 2),
+        "goal": name(width - 1 - width // 4, height // 2)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a large synthetic graph routing problem")
+    parser.add_argument("output", help="path to the output JSON file")
+    parser.add_argument("--width", type=int, default=320, help="the number of nodes in each row")
+    parser.add_argument("--height", type=int, default=320, help="the number of nodes in each column")
+    parser.add_argument("--probability", "-p", type=float, default=0.8, help="the probability that each directed edge exists")
+    parser.add_argument("--seed", "-s", type=int, default=0, help="the random seed")
+    args = parser.parse_args()
+    with open(args.output, 'w') as f:
+        json.dump(generate_graph(args.width, args.height, args.probability, args.seed), f)
@@ -1,8 +1,8 @@
-from typing import Dict, Iterable, List
+from typing import Dict, Iterable, List, Optional, Tuple
 from dataclasses import dataclass
 import json
 
-from problem import Problem
+from problem import ReversibleProblem
 from mathutils import Point, euclidean_distance
 from helpers.utils import record_calls
 
@@ -19,19 +19,34 @@ class GraphNode:
     def __str__(self) -> str:
         return self.name
 
+# Builds the reverse adjacency where every node is mapped to the nodes that have an edge to it
+def reverse_adjacency_of(adjacency: Dict[GraphNode, List[GraphNode]]) -> Dict[GraphNode, List[GraphNode]]:
+    reverse: Dict[GraphNode, List[GraphNode]] = {node: [] for node in adjacency}
+    for node, adjacent in adjacency.items():
+        for next_node in adjacent:
+            reverse.setdefault(next_node, []).append(node)
+    return reverse
+
 # This is the implementation of the graph routing problem
-class GraphRoutingProblem(Problem[GraphNode, GraphNode]):
-    def __init__(self, start: GraphNode, goal: GraphNode, adjacency: Dict[GraphNode, List[GraphNode]]) -> None:
+# It is a reversible problem so it can also be solved by the bidirectional search functions
+class GraphRoutingProblem(ReversibleProblem[GraphNode, GraphNode]):
+    def __init__(self, start: GraphNode, goal: GraphNode, adjacency: Dict[GraphNode, List[GraphNode]],
+                 reverse_adjacency: Optional[Dict[GraphNode, List[GraphNode]]] = None) -> None:
         super().__init__()
         self.start = start
         self.goal = goal
         self.adjacency = adjacency
+        # The reverse adjacency is built if it is not given
+        self.reverse_adjacency = reverse_adjacency_of(adjacency) if reverse_adjacency is None else reverse_adjacency
     
     def get_initial_state(self) -> GraphNode:
         return self.start
     
     def is_goal(self, state: GraphNode) -> bool:
         return state == self.goal
+
+    def get_goal_state(self) -> GraphNode:
+        return self.goal
     
     # The actions for this problem are the neighboring nodes we can reach from the current node
     # We use @record_calls to track the arguments with which this function is called to retrieve the traversal order
@@ -43,6 +58,10 @@ class GraphRoutingProblem(Problem[GraphNode, GraphNode]):
     def get_successor(self, state: GraphNode, action: GraphNode) -> GraphNode:
         return action
     
+    # The predecessors of a node are the nodes that have an edge to it, and the action is the node itself
+    def get_predecessors(self, state: GraphNode) -> Iterable[Tuple[GraphNode, GraphNode]]:
+        return [(previous, state) for previous in self.reverse_adjacency.get(state, [])]
+
     # The cost of an action is the distance between the current node and the next node 
     def get_cost(self, state: GraphNode, action: GraphNode) -> float:
         return euclidean_distance(state.position, action.position)
@@ -54,13 +73,21 @@ class GraphRoutingProblem(Problem[GraphNode, GraphNode]):
         graph_def: Dict[str, Dict] = problem_def.get("graph", {})
         node_dict = {name: GraphNode(name, Point(*item.get("position", [0,0]))) for name, item in graph_def.items()}
         adjacency: Dict[GraphNode, List[GraphNode]] = {}
+        # The reverse adjacency is built in the same pass for the backward searches
+        reverse_adjacency: Dict[GraphNode, List[GraphNode]] = {node: [] for node in node_dict.values()}
         for name, item in graph_def.items():
             node = node_dict[name]
             adjacent = [node_dict[adjacent] for adjacent in sorted(item.get("adjacent", [])) if adjacent in node_dict]
             adjacency[node] = adjacent
+            for next_node in adjacent:
+                reverse_adjacency[next_node].append(node)
         start = node_dict[problem_def.get("start", "")]
         goal = node_dict[problem_def.get("goal", "")]
-        return GraphRoutingProblem(start, goal, adjacency)
+        return GraphRoutingProblem(start, goal, adjacency, reverse_adjacency)
 
 def graphrouting_heuristic(problem: GraphRoutingProblem, state: GraphNode) -> float:
-    return euclidean_distance(state.position, problem.goal.position)
\ No newline at end of file
+    return euclidean_distance(state.position, problem.goal.position)
+
+# This heuristic estimates the path cost from the start to the given node (used by the backward half of bidirectional A*)
+def graphrouting_reverse_heuristic(problem: GraphRoutingProblem, state: GraphNode) -> float:
+    return euclidean_distance(state.position, problem.start.position)
\ No newline at end of file
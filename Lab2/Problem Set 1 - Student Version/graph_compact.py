@@ -0,0 +1,248 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from array import array
+import json, math, os, struct, sys, tempfile
+
+from problem import ReversibleProblem
+from graph import GraphNode, GraphRoutingProblem
+from mathutils import Point
+from helpers.utils import track_call_count
+
+# This file contains a compact formulation of the graph routing problem for large graphs.
+# The nodes are numbered 0..N-1 in the order they appear in the file, so a state is just an integer node id.
+# The edges are stored in CSR (compressed sparse row) form:
+#   the edges leaving node 'i' are the edge ids offsets[i] .. offsets[i+1]-1,
+#   and the edge 'e' leads to the node targets[e] and costs weights[e].
+# An action is an edge id, so 'get_actions' returns a range and 'get_successor' and 'get_cost' are array lookups.
+# The edge weights (euclidean distances) are computed once when the graph is built instead of on every relaxation.
+# The arrays use the standard 'array' module, which stores the numbers unboxed (4 or 8 bytes each)
+# instead of a Python object per node or edge.
+# The edges of every node are sorted by the name of their target like in 'GraphRoutingProblem.from_file',
+# so the searches visit the nodes in the same order.
+
+# The header of the binary cache file: magic, version, byte order, node count, edge count, start id, goal id,
+# and the size and modification time (in nanoseconds) of the JSON file it was built from
+_HEADER = struct.Struct("<4sIcxxxqqqqqq")
+_MAGIC = b"CSRG"
+_VERSION = 2
+_BYTEORDER = b"L" if sys.byteorder == "little" else b"B"
+
+# The compact graph contains the node names and coordinates and the CSR edge arrays
+class CompactGraph:
+    __slots__ = ("names", "xs", "ys", "offsets", "targets", "weights", "sources",
+                 "reverse_offsets", "reverse_edges")
+
+    def __init__(self, names: List[str], xs: array, ys: array, offsets: array, targets: array, weights: array) -> None:
+        self.names = names
+        # The coordinates of every node
+        self.xs = xs
+        self.ys = ys
+        # The CSR arrays of the outgoing edges
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        # The source node of every edge and the CSR arrays of the incoming edges (as edge ids).
+        # They are only needed by the backward searches so they are built on first use.
+        self.sources: Optional[array] = None
+        self.reverse_offsets: Optional[array] = None
+        self.reverse_edges: Optional[array] = None
+
+    @property
+    def node_count(self) -> int:
+        return len(self.names)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)
+
+    # Builds the incoming edge arrays using a counting sort of the edges by their target
+    def build_reverse(self) -> None:
+        if self.reverse_edges is not None: return
+        offsets, targets = self.offsets, self.targets
+        sources = array('i', bytes(4 * len(targets)))
+        for node in range(self.node_count):
+            for edge in range(offsets[node], offsets[node + 1]):
+                sources[edge] = node
+        counts = [0] * (self.node_count + 1)
+        for target in targets:
+            counts[target + 1] += 1
+        for node in range(self.node_count):
+            counts[node + 1] += counts[node]
+        reverse_offsets = array('i', counts)
+        reverse_edges = array('i', bytes(4 * len(targets)))
+        for edge, target in enumerate(targets):
+            reverse_edges[counts[target]] = edge
+            counts[target] += 1
+        self.sources, self.reverse_offsets, self.reverse_edges = sources, reverse_offsets, reverse_edges
+
+    # Builds a compact graph from the "graph" object of the JSON format used by 'GraphRoutingProblem'
+    @staticmethod
+    def from_definition(graph_def: Dict[str, Dict]) -> 'CompactGraph':
+        names = list(graph_def)
+        index = {name: node for node, name in enumerate(names)}
+        xs, ys = array('d'), array('d')
+        for item in graph_def.values():
+            x, y = item.get("position", [0, 0])
+            xs.append(x)
+            ys.append(y)
+        offsets, targets, weights = array('i', [0]), array('i'), array('d')
+        for node, item in enumerate(graph_def.values()):
+            x, y = xs[node], ys[node]
+            for name in sorted(item.get("adjacent", [])):
+                target = index.get(name)
+                if target is None: continue
+                dx, dy = xs[target] - x, ys[target] - y
+                targets.append(target)
+                # The same formula as 'euclidean_distance' so the costs are identical
+                weights.append(math.sqrt(dx * dx + dy * dy))
+            offsets.append(len(targets))
+        return CompactGraph(names, xs, ys, offsets, targets, weights)
+
+# This is the implementation of the graph routing problem on node ids where the actions are edge ids
+class CompactGraphRoutingProblem(ReversibleProblem[int, int]):
+    def __init__(self, graph: CompactGraph, start: int, goal: int) -> None:
+        super().__init__()
+        self.graph = graph
+        self.start = start
+        self.goal = goal
+
+    def get_initial_state(self) -> int:
+        return self.start
+
+    def is_goal(self, state: int) -> bool:
+        return state == self.goal
+
+    def get_goal_state(self) -> int:
+        return self.goal
+
+    # The actions are the ids of the edges leaving the node
+    # We use @track_call_count to track the number of times this function was called to count the number of explored nodes
+    @track_call_count
+    def get_actions(self, state: int) -> Iterable[int]:
+        offsets = self.graph.offsets
+        return range(offsets[state], offsets[state + 1])
+
+    def get_successor(self, state: int, action: int) -> int:
+        return self.graph.targets[action]
+
+    # The predecessors of a node are the sources of its incoming edges, and the action is the edge id
+    def get_predecessors(self, state: int) -> Iterable[Tuple[int, int]]:
+        graph = self.graph
+        if graph.reverse_edges is None:
+            graph.build_reverse()
+        sources, reverse_offsets = graph.sources, graph.reverse_offsets
+        return [(sources[edge], edge) for edge in graph.reverse_edges[reverse_offsets[state]:reverse_offsets[state + 1]]]
+
+    # The cost of an action is the precomputed length of the edge
+    def get_cost(self, state: int, action: int) -> float:
+        return self.graph.weights[action]
+
+    # Returns the node id of the node with the given name
+    def node_id(self, name: str) -> int:
+        return self.graph.names.index(name)
+
+    # Converts a node id into the equivalent 'GraphNode'
+    def to_graph_node(self, state: int) -> GraphNode:
+        graph = self.graph
+        return GraphNode(graph.names[state], Point(_as_number(graph.xs[state]), _as_number(graph.ys[state])))
+
+    # Converts a solution (a list of edge ids) into the list of node names it visits
+    def solution_names(self, solution: List[int]) -> List[str]:
+        return [self.graph.names[self.graph.targets[edge]] for edge in solution]
+
+    # Writes the problem to a binary cache file which can be loaded without parsing the JSON file.
+    # The source is the (size, modification time) of the JSON file, which is used to detect stale caches.
+    def save(self, path: str, source: Tuple[int, int] = (0, 0)) -> None:
+        graph = self.graph
+        # The names are saved as a JSON list since a name may contain any character (including a newline)
+        names = json.dumps(graph.names).encode("utf-8")
+        # Write to a temporary file first so that a reader never sees a partially written cache.
+        # The temporary file has a unique name, so two processes can save the same cache at the same time.
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, _VERSION, _BYTEORDER, graph.node_count, graph.edge_count, self.start, self.goal, *source))
+                for values in (graph.offsets, graph.targets, graph.weights, graph.xs, graph.ys):
+                    values.tofile(f)
+                f.write(struct.pack("<q", len(names)))
+                f.write(names)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+
+    # Reads a problem from a binary cache file written by 'save'.
+    # If a source is given, None is returned when the file was built from a different version of the JSON file.
+    @staticmethod
+    def load(path: str, source: Optional[Tuple[int, int]] = None) -> Optional['CompactGraphRoutingProblem']:
+        with open(path, 'rb') as f:
+            magic, version, byteorder, node_count, edge_count, start, goal, *saved_source = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError(f"'{path}' is not a compact graph file (version {_VERSION})")
+            if source is not None and tuple(saved_source) != tuple(source):
+                return None
+            def read(typecode: str, count: int) -> array:
+                values = array(typecode)
+                values.fromfile(f, count)
+                if byteorder != _BYTEORDER:
+                    values.byteswap()
+                return values
+            offsets = read('i', node_count + 1)
+            targets = read('i', edge_count)
+            weights = read('d', edge_count)
+            xs = read('d', node_count)
+            ys = read('d', node_count)
+            size, = struct.unpack("<q", f.read(8))
+            names = json.loads(f.read(size).decode("utf-8"))
+        if len(names) != node_count:
+            raise ValueError(f"'{path}' is damaged: it has {len(names)} names for {node_count} nodes")
+        return CompactGraphRoutingProblem(CompactGraph(names, xs, ys, offsets, targets, weights), start, goal)
+
+    # Read a graph routing problem from a JSON file (in the same format as 'GraphRoutingProblem.from_file').
+    # If a cache path is given, the problem is loaded from it when it was built from the current JSON file,
+    # otherwise the JSON file is parsed and the cache is (re)written.
+    @staticmethod
+    def from_file(path: str, cache_path: Optional[str] = None) -> 'CompactGraphRoutingProblem':
+        stat = os.stat(path)
+        source = (stat.st_size, stat.st_mtime_ns)
+        if cache_path is not None and os.path.exists(cache_path):
+            try:
+                problem = CompactGraphRoutingProblem.load(cache_path, source)
+            except ValueError:
+                # The cache has an older format or it is damaged, so it is rewritten below
+                problem = None
+            if problem is not None:
+                return problem
+        with open(path, 'r') as f:
+            problem_def: Dict[str, Dict] = json.load(f)
+        graph = CompactGraph.from_definition(problem_def.get("graph", {}))
+        index = {name: node for node, name in enumerate(graph.names)}
+        problem = CompactGraphRoutingProblem(graph, index[problem_def.get("start", "")], index[problem_def.get("goal", "")])
+        if cache_path is not None:
+            problem.save(cache_path, source)
+        return problem
+
+    # Create a compact problem from an existing graph routing problem
+    @staticmethod
+    def from_problem(problem: GraphRoutingProblem) -> 'CompactGraphRoutingProblem':
+        graph_def = {
+            node.name: {"position": [node.position.x, node.position.y], "adjacent": [adjacent.name for adjacent in adjacent_nodes]}
+            for node, adjacent_nodes in problem.adjacency.items()
+        }
+        graph = CompactGraph.from_definition(graph_def)
+        index = {name: node for node, name in enumerate(graph.names)}
+        return CompactGraphRoutingProblem(graph, index[problem.start.name], index[problem.goal.name])
+
+# The coordinates are stored as floats, but the graph files use integer positions
+def _as_number(value: float):
+    return int(value) if value.is_integer() else value
+
+def compact_graphrouting_heuristic(problem: CompactGraphRoutingProblem, state: int) -> float:
+    graph, goal = problem.graph, problem.goal
+    dx, dy = graph.xs[state] - graph.xs[goal], graph.ys[state] - graph.ys[goal]
+    return math.sqrt(dx * dx + dy * dy)
+
+# This heuristic estimates the path cost from the start to the given node (used by the backward half of bidirectional A*)
+def compact_graphrouting_reverse_heuristic(problem: CompactGraphRoutingProblem, state: int) -> float:
+    graph, start = problem.graph, problem.start
+    dx, dy = graph.xs[state] - graph.xs[start], graph.ys[state] - graph.ys[start]
+    return math.sqrt(dx * dx + dy * dy)
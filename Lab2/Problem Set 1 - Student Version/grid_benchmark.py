@@ -0,0 +1,85 @@
+from typing import Callable, List, Tuple
+from collections import deque
+import argparse, time, tracemalloc
+
+from mathutils import Direction, Point, get_grid
+from sokoban import SokobanProblem
+
+# This script measures the time and the memory allocated per successor by the grid coordinate operations in 'mathutils.py':
+#   "construct": building a new point for every neighbour (what 'Point.__add__' used to do),
+#   "add": 'point + direction.to_vector()', which returns the interned point of the grid,
+#   "table": the neighbour table of the grid ('grid.neighbors[direction][point]').
+# Then it measures the successor generation of the sokoban problem ('get_actions' then 'get_successor' for every action)
+# on the states of a breadth first search of the given level.
+# The memory is the number of bytes that are still allocated after the calls (while the results are kept),
+# so an interned point only costs the reference to it.
+# Example:
+#   python grid_benchmark.py levels/level3.txt
+
+# Calls the function 'repeat' times and returns (nanoseconds per result, allocated bytes per result)
+def measure(function: Callable[[], list], repeat: int) -> Tuple[float, float]:
+    count = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        count += len(function())
+    elapsed = time.perf_counter() - start
+    # The allocations are measured in a separate call since tracing slows down the calls
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    results = function()
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return elapsed * 1e9 / count, allocated / len(results)
+
+# Measures the neighbours of every cell of a grid with each method
+def micro_benchmark(width: int, height: int, repeat: int) -> None:
+    grid = get_grid(width, height)
+    cells = [grid.point(x, y) for y in range(height) for x in range(width)]
+    directions = [(direction, direction.to_vector()) for direction in Direction]
+    neighbors = grid.neighbors
+    methods = {
+        "construct": lambda: [Point(cell.x + vector.x, cell.y + vector.y) for cell in cells for _, vector in directions],
+        "add": lambda: [cell + vector for cell in cells for _, vector in directions],
+        "table": lambda: [neighbors[direction][cell] for cell in cells for direction, _ in directions],
+    }
+    print(f"Neighbours of every cell of a {width}x{height} grid")
+    print(f"{'method':<12}{'ns/neighbour':>16}{'bytes/neighbour':>18}")
+    for name, method in methods.items():
+        nanoseconds, allocated = measure(method, repeat)
+        print(f"{name:<12}{nanoseconds:>16.1f}{allocated:>18.1f}")
+
+# Measures the successor generation of the sokoban problem on the first 'limit' states of a breadth first search
+def successor_benchmark(path: str, limit: int, repeat: int) -> None:
+    problem = SokobanProblem.from_file(path)
+    states = [problem.get_initial_state()]
+    reached = set(states)
+    queue = deque(states)
+    while queue and len(states) < limit:
+        state = queue.popleft()
+        for action in problem.get_actions(state):
+            next_state = problem.get_successor(state, action)
+            if next_state not in reached:
+                reached.add(next_state)
+                states.append(next_state)
+                queue.append(next_state)
+    get_actions, get_successor = problem.get_actions, problem.get_successor
+    def expand() -> List:
+        return [get_successor(state, action) for state in states for action in get_actions(state)]
+    nanoseconds, allocated = measure(expand, repeat)
+    print(f"Sokoban successors of {len(states)} states of {path}")
+    print(f"{'ns/successor':>16}{'bytes/successor':>18}")
+    print(f"{nanoseconds:>16.1f}{allocated:>18.1f}")
+
+def main(args: argparse.Namespace):
+    micro_benchmark(args.width, args.height, args.repeat)
+    print()
+    successor_benchmark(args.level, args.states, args.repeat)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the time and allocations per successor of the grid coordinates")
+    parser.add_argument("level", help="path to the sokoban level file")
+    parser.add_argument("--width", type=int, default=20, help="the width of the grid of the micro benchmark")
+    parser.add_argument("--height", type=int, default=20, help="the height of the grid of the micro benchmark")
+    parser.add_argument("--states", "-s", type=int, default=5000, help="the number of sokoban states to expand")
+    parser.add_argument("--repeat", "-r", type=int, default=20, help="the number of times every measurement is repeated")
+    main(parser.parse_args())
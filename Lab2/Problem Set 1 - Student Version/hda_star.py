@@ -0,0 +1,302 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass
+import argparse, glob, heapq, multiprocessing, queue, time
+
+from problem import HeuristicFunction, Problem, S, A, Solution
+
+# This file contains hash distributed A* (HDA*), a parallel A* where every worker process owns a partition of the state space.
+# A state belongs to the worker 'partition(state) % workers', which is the only one that stores its path cost,
+# its parent and its heuristic value, and the only one that expands it.
+# When a worker generates a successor that belongs to another worker, it sends it to the inbox (a queue) of that worker.
+#
+# Since the workers expand the nodes in parallel, the first goal found is not necessarily optimal.
+# The cost of the best goal found so far (the incumbent) is shared by all the workers: they never expand or send a node
+# whose f (for the owner) or g (for the sender) is not below it. The search ends when every worker is idle
+# (no node in its frontier has f below the incumbent) and no message is in flight. With an admissible heuristic,
+# no remaining node can lead to a cheaper goal at that point, so the incumbent is optimal.
+#
+# The termination is detected by the main process with the four counter method: every worker counts the node messages
+# it sent and the ones it received (and processed), and the search ended if every worker was idle in two consecutive
+# checks and the number of messages received in the first check equals the number sent in the second one.
+#
+# The problem, the heuristic and the states must be picklable, and the partition must give the same value in every process.
+# The default partition is 'hash', which is only consistent across processes if they are forked (or if PYTHONHASHSEED is set),
+# so the workers are forked when the platform supports it.
+# Example:
+#   python hda_star.py "levels/*.txt" --workers 1 2 4 --heuristic strong
+
+# The number of nodes that a worker expands before it sends its generated nodes and reads its inbox
+DEFAULT_BATCH_SIZE = 64
+
+# The statistics of a worker after the search
+@dataclass
+class WorkerStats:
+    expanded: int       # The number of expanded nodes
+    generated: int      # The number of generated successors (including those sent to the other workers)
+    stored: int         # The number of states owned by the worker
+    messages: int       # The number of node messages sent to the other workers
+
+def _get_context():
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+# Raises an error if a worker exited before the search ended
+def _check_workers(processes: List[multiprocessing.Process]) -> None:
+    for process in processes:
+        if process.exitcode is not None:
+            raise RuntimeError(f"An HDA* worker exited unexpectedly (exit code {process.exitcode})")
+
+# Returns the next message of the given kind from the results queue (the other messages are skipped)
+def _next_result(results: multiprocessing.Queue, processes: List[multiprocessing.Process], kind: str) -> tuple:
+    while True:
+        try:
+            message = results.get(timeout=0.1)
+        except queue.Empty:
+            _check_workers(processes)
+            continue
+        if message[0] == kind:
+            return message
+
+# The main loop of a worker. The messages in its inbox are:
+#   ("nodes", [(state, g, parent, action), ...]): the nodes generated by the other workers
+#   ("trace", state): a request for the parent of the state and the action that leads from it to the state
+#   ("stop",): the search ended, so the worker sends its statistics and exits
+# The worker sends ("goal", state, cost), ("trace", (parent, action)) and ("stats", index, WorkerStats) to the results queue.
+def _worker(index: int, problem: Problem[S, A], heuristic: HeuristicFunction, partition: Callable[[S], int], batch_size: int,
+            inboxes: List[multiprocessing.Queue], results: multiprocessing.Queue, incumbent, idle, sent, received):
+    workers = len(inboxes)
+    inbox = inboxes[index]
+    infinity = float('inf')
+    # The best known path cost of the owned states and the parent and action they are reached from
+    costs: Dict[S, float] = {}
+    parents: Dict[S, Tuple[Optional[S], Optional[A]]] = {}
+    # The frontier is a heap of (f, h, order, g, state). An entry is outdated if the state was reached with a lower cost since
+    frontier = []
+    order = 0
+    expanded = generated = messages = 0
+    outgoing: List[list] = [[] for _ in range(workers)]
+    bound = incumbent.value
+    get_successor, get_cost, is_goal = problem.get_successor, problem.get_cost, problem.is_goal
+
+    # Adds a node of an owned state if it reaches the state with a lower cost
+    def receive(state: S, g: float, parent: Optional[S], action: Optional[A]) -> None:
+        nonlocal order, bound
+        if g >= costs.get(state, infinity):
+            return
+        costs[state] = g
+        parents[state] = (parent, action)
+        if is_goal(state):
+            # A goal is never expanded since its successors cannot lead to a cheaper goal
+            with incumbent.get_lock():
+                if g < incumbent.value:
+                    incumbent.value = g
+                    results.put(("goal", state, g))
+                bound = incumbent.value
+            return
+        h = heuristic(problem, state)
+        if g + h < bound:
+            heapq.heappush(frontier, (g + h, h, order, g, state))
+            order += 1
+
+    while True:
+        # Read the inbox. If the worker has no work, it waits for a message.
+        block = not frontier or frontier[0][0] >= bound
+        while True:
+            try:
+                message = inbox.get(timeout=0.01) if block else inbox.get_nowait()
+            except queue.Empty:
+                break
+            block = False
+            kind = message[0]
+            if kind == "nodes":
+                # The worker is marked busy before the message is counted as received
+                idle[index] = 0
+                for node in message[1]:
+                    receive(*node)
+                received[index] += 1
+            elif kind == "trace":
+                results.put(("trace", parents.get(message[1])))
+            elif kind == "stop":
+                results.put(("stats", index, WorkerStats(expanded, generated, len(costs), messages)))
+                return
+
+        # Expand a batch of nodes
+        bound = incumbent.value
+        count = 0
+        while frontier and count < batch_size:
+            f, _, _, g, state = frontier[0]
+            if f >= bound:
+                # No node in the frontier can lead to a cheaper goal
+                frontier.clear()
+                break
+            heapq.heappop(frontier)
+            if g != costs[state]:
+                continue
+            count += 1
+            expanded += 1
+            for action in problem.get_actions(state):
+                next_state = get_successor(state, action)
+                next_cost = g + get_cost(state, action)
+                if next_cost >= bound:
+                    continue
+                generated += 1
+                owner = partition(next_state) % workers
+                if owner == index:
+                    receive(next_state, next_cost, state, action)
+                else:
+                    outgoing[owner].append((next_state, next_cost, state, action))
+
+        # Send the generated nodes. A message is counted as sent before it is put in the queue.
+        for owner, nodes in enumerate(outgoing):
+            if nodes:
+                sent[index] += 1
+                messages += 1
+                inboxes[owner].put(("nodes", nodes))
+                outgoing[owner] = []
+        if not frontier or frontier[0][0] >= incumbent.value:
+            idle[index] = 1
+
+# Searches for an optimal path from the initial state to a goal using 'workers' processes.
+# Returns None if there is no solution or if the timeout (in seconds) is reached.
+# If an 'info' dictionary is given, the statistics of the workers (a list of 'WorkerStats' by worker index)
+# are written to its "worker_stats" entry when they stop.
+def HashDistributedAStarSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction, workers: int = 2,
+                               partition: Callable[[S], int] = hash, batch_size: int = DEFAULT_BATCH_SIZE,
+                               timeout: Optional[float] = None, info: Optional[dict] = None) -> Solution:
+    if problem.is_goal(initial_state):
+        return []
+
+    context = _get_context()
+    inboxes = [context.Queue() for _ in range(workers)]
+    results = context.Queue()
+    incumbent = context.Value('d', float('inf'))
+    # Every counter is written by a single process, so they do not need a lock.
+    # The last sent counter belongs to the main process, which sends the initial node.
+    idle = context.Array('b', workers, lock=False)
+    sent = context.Array('q', workers + 1, lock=False)
+    received = context.Array('q', workers, lock=False)
+    processes = [
+        context.Process(target=_worker, args=(index, problem, heuristic, partition, batch_size, inboxes, results, incumbent, idle, sent, received), daemon=True)
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    # True once the workers were asked to stop (otherwise they are still busy and they are terminated at the end)
+    stopping = False
+    try:
+        sent[workers] += 1
+        inboxes[partition(initial_state) % workers].put(("nodes", [(initial_state, 0, None, None)]))
+
+        # Wait for the termination
+        previous_received = None
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            _check_workers(processes)
+            all_idle = all(idle)
+            total_received = sum(received)
+            total_sent = sum(sent)
+            if all_idle and previous_received == total_sent == total_received:
+                break
+            previous_received = total_received if all_idle else None
+            time.sleep(0.001)
+
+        cost = incumbent.value
+        if cost == float('inf'):
+            solution = None
+        else:
+            # Find the goal with the final incumbent cost (goals with higher costs may have been found before it)
+            message = _next_result(results, processes, "goal")
+            while message[2] != cost:
+                message = _next_result(results, processes, "goal")
+            goal = message[1]
+            # Follow the parents from the goal, asking the owner of every state for its parent
+            solution = []
+            state = goal
+            while True:
+                inboxes[partition(state) % workers].put(("trace", state))
+                parent, action = _next_result(results, processes, "trace")[1]
+                if parent is None:
+                    break
+                solution.append(action)
+                state = parent
+            solution.reverse()
+
+        # Stop the workers and collect their statistics
+        stopping = True
+        for inbox in inboxes:
+            inbox.put(("stop",))
+        stats: Dict[int, WorkerStats] = {}
+        while len(stats) < workers:
+            _, index, worker_stats = _next_result(results, processes, "stats")
+            stats[index] = worker_stats
+        if info is not None:
+            info["worker_stats"] = [stats[index] for index in range(workers)]
+        return solution
+    finally:
+        # After a timeout (or an error), the workers are still searching, so they are terminated right away instead of waiting for them.
+        # The messages that they did not read are dropped.
+        if not stopping:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for inbox in inboxes:
+                inbox.cancel_join_thread()
+        for process in processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+# Compares A* with HDA* using 1..N workers on a set of sokoban levels
+def main(args: argparse.Namespace):
+    from sokoban import SokobanProblem
+    import sokoban_heuristic
+    from search import AStarSearch
+    heuristic = getattr(sokoban_heuristic, f"{args.heuristic}_heuristic")
+    paths: List[str] = sorted(path for pattern in args.levels for path in glob.glob(pattern))
+    if not paths:
+        print("No levels matched the given patterns")
+        return
+    header = f"{'level':<24}{'search':<12}{'cost':>8}{'expanded':>12}{'time (s)':>12}{'speedup':>10}"
+    print(header)
+    print('-' * len(header))
+    for path in paths:
+        problem = SokobanProblem.from_file(path)
+        # Count the expansions of A* by wrapping 'get_actions' on this problem instance only
+        get_actions = problem.get_actions
+        expanded = 0
+        def counted_get_actions(state):
+            nonlocal expanded
+            expanded += 1
+            return get_actions(state)
+        problem.get_actions = counted_get_actions
+        start = time.perf_counter()
+        solution = AStarSearch(problem, problem.get_initial_state(), heuristic)
+        baseline = time.perf_counter() - start
+        problem.get_actions = get_actions
+        cost = "-" if solution is None else len(solution)
+        print(f"{path:<24}{'astar':<12}{cost:>8}{expanded:>12}{baseline:>12.3f}{1:>10.2f}")
+        for workers in args.workers:
+            problem = SokobanProblem.from_file(path)
+            info = {}
+            start = time.perf_counter()
+            solution = HashDistributedAStarSearch(problem, problem.get_initial_state(), heuristic, workers, timeout=args.timeout, info=info)
+            elapsed = time.perf_counter() - start
+            expanded = sum(stats.expanded for stats in info.get("worker_stats", []))
+            cost = "-" if solution is None else len(solution)
+            print(f"{path:<24}{f'hda*({workers})':<12}{cost:>8}{expanded:>12}{elapsed:>12.3f}{baseline / elapsed:>10.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the scaling of hash distributed A* on sokoban levels")
+    parser.add_argument("levels", nargs="+", help="glob patterns for the level files")
+    parser.add_argument("--workers", "-w", type=int, nargs="+", default=[1, 2, 4],
+                        help="the numbers of workers to try")
+    parser.add_argument("--heuristic", "-hf", default="strong", choices=["zero", "weak", "strong"],
+                        help="the heuristic used by the searches")
+    parser.add_argument("--timeout", "-t", type=float, default=None,
+                        help="the time limit (in seconds) for each HDA* run")
+    main(parser.parse_args())
@@ -0,0 +1,290 @@
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from dataclasses import asdict, dataclass, field
+from collections import deque
+import argparse, glob, heapq, json, math, multiprocessing, random, time
+
+from problem import HeuristicFunction, Problem, S, A
+from search_benchmark import get_heuristic, load_problem
+
+# This script audits a heuristic offline instead of wrapping 'get_successor' during the search
+# (as 'test_heuristic_consistency' in 'helpers/heuristic_checks.py' does, which evaluates the heuristic twice on every successor).
+# It collects a set of reachable edges (state, action, next state) of a level with a budget on the expanded states:
+#   "bfs": the edges of the first 'budget' states expanded in breadth first order,
+#   "walk": the edges of the states visited by random walks from the initial state (to reach deeper states with the same budget).
+# Then it evaluates the heuristic once per state (in parallel processes) and checks:
+#   consistency: h(state) - h(next state) <= cost(state, action) on every collected edge,
+#   admissibility: h(state) <= the exact cost to the nearest goal.
+# If the breadth first enumeration reached every reachable state, the exact costs of all the states come from a backward
+# uniform cost search over the collected edges (a breadth first search when all the actions cost 1). Otherwise, the exact
+# costs are computed for a sample of the states by a uniform cost search from each of them (in parallel), and the states
+# whose search exceeds its budget are reported as unknown.
+# Example:
+#   python heuristic_audit.py "levels/*.txt" --heuristics weak strong --budget 20000 --workers 4 --output audit.json
+
+# A state where the heuristic violates consistency or admissibility.
+# For a consistency violation, 'bound' is cost(state, action) + h(next state); for an admissibility violation, it is the exact cost.
+@dataclass
+class Violation:
+    kind: str                       # "consistency" or "admissibility"
+    state: str
+    heuristic: float
+    bound: float
+    action: Optional[str] = None
+    next_state: Optional[str] = None
+    next_heuristic: Optional[float] = None
+    cost: Optional[float] = None
+
+    # How much the heuristic exceeds its bound
+    @property
+    def excess(self) -> float:
+        return self.heuristic - self.bound
+
+    def describe(self) -> str:
+        if self.kind == "admissibility":
+            return f"State (heuristic = {self.heuristic}, exact cost = {self.bound}):\n{self.state}\n"
+        message = f"State (heuristic = {self.heuristic}):\n{self.state}\n"
+        message += f"Action: {self.action} (cost = {self.cost})\n"
+        message += f"Next State (heuristic = {self.next_heuristic}):\n{self.next_state}\n"
+        message += f"h(state) - h(next state) = {self.heuristic - self.next_heuristic} > {self.cost} (action cost)\n"
+        return message
+
+@dataclass
+class AuditReport:
+    level: str
+    heuristic: str
+    mode: str
+    states: int = 0                 # The number of states whose heuristic was evaluated
+    expanded: int = 0               # The number of states whose edges were collected
+    edges: int = 0
+    complete: bool = False          # True if every reachable state was expanded (so every exact cost is known)
+    exact_checked: int = 0          # The number of states compared with their exact cost
+    exact_unknown: int = 0          # The sampled states whose exact cost search exceeded its budget
+    consistency_violations: int = 0
+    admissibility_violations: int = 0
+    max_excess: float = 0           # The largest amount by which the heuristic exceeded a bound
+    elapsed: float = 0
+    violations: List[Violation] = field(default_factory=list)   # The first reported violations of each kind
+
+    @property
+    def passed(self) -> bool:
+        return self.consistency_violations == 0 and self.admissibility_violations == 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        values = asdict(self)
+        values["passed"] = self.passed
+        return values
+
+# Collects the edges (state index, action, next state index, cost) reachable from the initial state.
+# Returns the list of states, the edges, the indices of the expanded states and whether every reachable state was expanded.
+def collect_edges(problem: Problem[S, A], budget: int, mode: str = "bfs", depth: int = 100,
+                  seed: int = 0) -> Tuple[List[S], List[Tuple[int, A, int, float]], List[int], bool]:
+    initial_state = problem.get_initial_state()
+    states: List[S] = [initial_state]
+    indices: Dict[S, int] = {initial_state: 0}
+    edges: List[Tuple[int, A, int, float]] = []
+    # The successor indices of every expanded state
+    expanded: Dict[int, List[int]] = {}
+    def expand(index: int) -> List[int]:
+        state = states[index]
+        successors = expanded[index] = []
+        if problem.is_goal(state):
+            return successors
+        for action in problem.get_actions(state):
+            next_state = problem.get_successor(state, action)
+            next_index = indices.get(next_state)
+            if next_index is None:
+                next_index = indices[next_state] = len(states)
+                states.append(next_state)
+            edges.append((index, action, next_index, problem.get_cost(state, action)))
+            successors.append(next_index)
+        return successors
+    if mode == "bfs":
+        queue = deque([0])
+        while queue and len(expanded) < budget:
+            # The states added by the expansion are the new ones, so they are the ones to enqueue
+            first_new = len(states)
+            expand(queue.popleft())
+            queue.extend(range(first_new, len(states)))
+        return states, edges, list(expanded), not queue
+    if mode == "walk":
+        rng = random.Random(seed)
+        steps = 0
+        while steps < budget:
+            index = 0
+            for _ in range(depth):
+                steps += 1
+                # A state that was already expanded is not expanded again, but the walk can still go through it
+                successors = expanded[index] if index in expanded else expand(index)
+                if not successors or steps >= budget:
+                    break
+                index = rng.choice(successors)
+            if len(expanded) == len(states):
+                # Every collected state was expanded, so the walks cannot find new states
+                return states, edges, list(expanded), True
+        return states, edges, list(expanded), False
+    raise ValueError(f"Unknown audit mode '{mode}'")
+
+# Returns the exact cost from every state to the nearest goal using a uniform cost search backwards over the collected edges
+# (infinity for the states that cannot reach a goal). It is only exact if every reachable state was expanded.
+def backward_costs(problem: Problem[S, A], states: List[S], edges: List[Tuple[int, A, int, float]]) -> List[float]:
+    predecessors: List[List[Tuple[int, float]]] = [[] for _ in states]
+    for index, _, next_index, cost in edges:
+        predecessors[next_index].append((index, cost))
+    costs = [math.inf] * len(states)
+    frontier = []
+    for index, state in enumerate(states):
+        if problem.is_goal(state):
+            costs[index] = 0
+            frontier.append((0, index))
+    heapq.heapify(frontier)
+    while frontier:
+        cost, index = heapq.heappop(frontier)
+        if cost > costs[index]:
+            continue
+        for previous, step in predecessors[index]:
+            if cost + step < costs[previous]:
+                costs[previous] = cost + step
+                heapq.heappush(frontier, (cost + step, previous))
+    return costs
+
+# Returns the exact cost from the state to the nearest goal using a uniform cost search that expands at most 'budget' states.
+# It returns infinity if no goal is reachable and None if the budget was exceeded before the cost was known.
+def exact_cost(problem: Problem[S, A], state: S, budget: int) -> Optional[float]:
+    costs = {state: 0}
+    frontier = [(0, 0, state)]
+    counter = 1     # Breaks the ties between equal costs, since the states are not comparable
+    expanded = 0
+    while frontier:
+        cost, _, state = heapq.heappop(frontier)
+        if cost > costs[state]:
+            continue
+        if problem.is_goal(state):
+            return cost
+        if expanded >= budget:
+            return None
+        expanded += 1
+        for action in problem.get_actions(state):
+            next_state = problem.get_successor(state, action)
+            next_cost = cost + problem.get_cost(state, action)
+            if next_cost < costs.get(next_state, math.inf):
+                costs[next_state] = next_cost
+                heapq.heappush(frontier, (next_cost, counter, next_state))
+                counter += 1
+    return math.inf
+
+# The problem, heuristic and states of the running audit. They are set before the workers are forked,
+# so the workers inherit them and only the state indices and the results go through the pipes.
+_AUDIT: Dict[str, Any] = {}
+
+def _heuristic_value(index: int) -> float:
+    return _AUDIT["heuristic"](_AUDIT["problem"], _AUDIT["states"][index])
+
+def _exact_cost(index: int) -> Optional[float]:
+    return exact_cost(_AUDIT["problem"], _AUDIT["states"][index], _AUDIT["exact_budget"])
+
+# Applies the function to every index in 'workers' forked processes (or in this process if there is one worker
+# or if the platform cannot fork, since the problem and the heuristic are not always picklable)
+def _parallel_map(function: Callable[[int], Any], indices: Sequence[int], workers: int) -> List[Any]:
+    if workers <= 1 or len(indices) < 2 * workers or "fork" not in multiprocessing.get_all_start_methods():
+        return [function(index) for index in indices]
+    with multiprocessing.get_context("fork").Pool(workers) as pool:
+        return pool.map(function, indices, chunksize=max(1, len(indices) // (4 * workers)))
+
+# Audits the heuristic on the reachable edges of the problem (see the description at the top of the file).
+# 'samples' is the number of states compared with their exact cost when the enumeration is not complete,
+# and 'exact_budget' is the number of states that each of these exact cost searches may expand.
+def audit(problem: Problem[S, A], heuristic: HeuristicFunction, budget: int = 10000, mode: str = "bfs",
+          samples: int = 50, exact_budget: int = 100000, depth: int = 100, workers: int = 1, seed: int = 0,
+          max_reported: int = 5, level: str = "", heuristic_name: str = "") -> AuditReport:
+    start = time.perf_counter()
+    report = AuditReport(level, heuristic_name, mode)
+    states, edges, expanded, report.complete = collect_edges(problem, budget, mode, depth, seed)
+    report.states, report.expanded, report.edges = len(states), len(expanded), len(edges)
+    _AUDIT.update(problem=problem, heuristic=heuristic, states=states, exact_budget=exact_budget)
+    try:
+        values = _parallel_map(_heuristic_value, range(len(states)), workers)
+        reported = {"consistency": 0, "admissibility": 0}
+        def record(violation: Violation) -> None:
+            report.max_excess = max(report.max_excess, violation.excess)
+            if reported[violation.kind] < max_reported:
+                reported[violation.kind] += 1
+                report.violations.append(violation)
+        for index, action, next_index, cost in edges:
+            h, next_h = values[index], values[next_index]
+            # A small tolerance avoids reporting the rounding errors of the heuristics that sum floats
+            if h - next_h > cost + 1e-9:
+                report.consistency_violations += 1
+                record(Violation("consistency", str(states[index]), h, cost + next_h, str(action), str(states[next_index]), next_h, cost))
+        if report.complete:
+            checked = list(range(len(states)))
+            costs = backward_costs(problem, states, edges)
+        else:
+            # The initial state is always checked, the other samples are chosen among the expanded states
+            rng = random.Random(seed)
+            candidates = [index for index in expanded if index != 0]
+            checked = [0] + rng.sample(candidates, min(samples - 1, len(candidates))) if samples > 0 else []
+            costs = dict(zip(checked, _parallel_map(_exact_cost, checked, workers)))
+        for index in checked:
+            exact = costs[index]
+            if exact is None:
+                report.exact_unknown += 1
+                continue
+            report.exact_checked += 1
+            if values[index] > exact + 1e-9:
+                report.admissibility_violations += 1
+                record(Violation("admissibility", str(states[index]), values[index], exact))
+    finally:
+        _AUDIT.clear()
+    report.elapsed = time.perf_counter() - start
+    return report
+
+def main(args: argparse.Namespace):
+    paths: List[str] = sorted(path for pattern in args.levels for path in glob.glob(pattern))
+    if not paths:
+        print("No levels matched the given patterns")
+        return
+    header = f"{'level':<24}{'heuristic':<10}{'states':>9}{'edges':>10}{'exact':>8}{'unknown':>9}{'inconsistent':>14}{'inadmissible':>14}{'time (s)':>10}"
+    print(header)
+    print('-' * len(header))
+    reports: List[AuditReport] = []
+    for path in paths:
+        for name in args.heuristics:
+            problem = load_problem(args.problem, path)
+            report = audit(problem, get_heuristic(args.problem, name), args.budget, args.mode, args.samples, args.exact_budget,
+                           args.depth, args.workers, args.seed, args.report, path, name)
+            reports.append(report)
+            print(f"{path:<24}{name:<10}{report.states:>9}{report.edges:>10}{report.exact_checked:>8}{report.exact_unknown:>9}"
+                  f"{report.consistency_violations:>14}{report.admissibility_violations:>14}{report.elapsed:>10.2f}")
+    for report in reports:
+        if report.violations:
+            print(f"\n{report.level} ({report.heuristic}): the largest excess is {report.max_excess}")
+            for violation in report.violations:
+                print(f"[{violation.kind}] " + violation.describe())
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump([report.to_dict() for report in reports], f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the consistency and admissibility of heuristics on the reachable edges of levels")
+    parser.add_argument("levels", nargs="+", help="glob patterns for the level files")
+    parser.add_argument("--problem", "-p", default="sokoban", choices=["sokoban", "sokoban-packed", "sokoban-push", "parking", "graph", "graph-compact"],
+                        help="the type of the problems stored in the level files")
+    parser.add_argument("--heuristics", "-hf", nargs="+", default=["weak", "strong"],
+                        help="the heuristics to audit")
+    parser.add_argument("--mode", "-m", default="bfs", choices=["bfs", "walk"],
+                        help="collect the edges of a breadth first enumeration or of random walks")
+    parser.add_argument("--budget", "-b", type=int, default=10000,
+                        help="the number of states to expand (bfs) or the number of walk steps (walk)")
+    parser.add_argument("--depth", "-d", type=int, default=100,
+                        help="the maximum length of a random walk")
+    parser.add_argument("--samples", "-n", type=int, default=50,
+                        help="the number of states compared with their exact cost when the enumeration is not complete")
+    parser.add_argument("--exact-budget", "-e", type=int, default=100000,
+                        help="the number of states each exact cost search may expand")
+    parser.add_argument("--workers", "-w", type=int, default=multiprocessing.cpu_count(),
+                        help="the number of processes that evaluate the heuristic and the exact costs")
+    parser.add_argument("--seed", type=int, default=0, help="the seed of the random walks and samples")
+    parser.add_argument("--report", "-r", type=int, default=5,
+                        help="the number of violations of each kind to print for every level and heuristic")
+    parser.add_argument("--output", "-o", default=None, help="a JSON file to write the reports to")
+    main(parser.parse_args())
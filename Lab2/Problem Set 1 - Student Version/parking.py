@@ -1,132 +1,152 @@
-from typing import Any, Dict, Set, Tuple, List
+from typing import Dict, Optional, Set, Tuple, List
 from problem import Problem
 from mathutils import Direction, Point
-from helpers.utils import NotImplemented
-
-#TODO: (Optional) Instead of Any, you can define a type for the parking state
-ParkingState = Tuple[Point]
+from zobrist import zobrist_keys
+from level_cache import LevelReader, LevelWriter, load_level
+
+# The passages of the parking lot are numbered in row-major order, so the state stores:
+#   the cell index of every car (state.cars[i] is the cell of car 'i'),
+#   an integer bitmask where bit 'c' is set if cell 'c' is occupied by a car,
+#   and the number of cars that are in their own parking slot.
+# The bitmask and the counter are updated incrementally by 'get_successor',
+# so checking if a cell is free is a single bit test and 'is_goal' is a single comparison.
+# Two states are equal if all the cars are at the same cells (the other fields follow from the car cells).
+class ParkingState:
+    __slots__ = ("cars", "occupied", "in_place")
+
+    def __init__(self, cars: Tuple[int, ...], occupied: int, in_place: int) -> None:
+        self.cars = cars
+        self.occupied = occupied
+        self.in_place = in_place
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ParkingState):
+            return NotImplemented
+        return self.cars == other.cars
+
+    def __hash__(self) -> int:
+        return hash(self.cars)
+
+    def __repr__(self) -> str:
+        return f"ParkingState(cars={self.cars})"
+
+# A parking state that also carries its Zobrist key (see 'ParkingProblem.enable_zobrist'), which is used as its hash
+# instead of hashing the car tuple. The equality is inherited, so two states are still only equal if their cars are at the same cells.
+class ZobristParkingState(ParkingState):
+    __slots__ = ("zobrist",)
+
+    def __init__(self, cars: Tuple[int, ...], occupied: int, in_place: int, zobrist: int) -> None:
+        super().__init__(cars, occupied, in_place)
+        self.zobrist = zobrist
+
+    def __hash__(self) -> int:
+        return self.zobrist
 
 # An action of the parking problem is a tuple containing an index 'i' and a direction 'd' where car 'i' should move in the direction 'd'.
 ParkingAction = Tuple[int, Direction]
 
+# The directions in the order used by the neighbour table (which is the order of the enum)
+_DIRECTIONS = list(Direction)
+
 # This is the implementation of the parking problem
 class ParkingProblem(Problem[ParkingState, ParkingAction]):
     passages: Set[Point]    # A set of points which indicate where a car can be (in other words, every position except walls).
-    cars: Tuple[Point]      # A tuple of points where state[i] is the position of car 'i'. 
+    cars: Tuple[Point]      # A tuple of points where cars[i] is the initial position of car 'i'.
     slots: Dict[Point, int] # A dictionary which indicate the index of the parking slot (if it is 'i' then it is the lot of car 'i') for every position.
                             # if a position does not contain a parking slot, it will not be in this dictionary.
     width: int              # The width of the parking lot.
     height: int             # The height of the parking lot.
+    # The following tables are computed once from the fields above (see 'build_tables')
+    cells: List[Point]                  # The passages sorted in row-major order
+    index: Dict[Point, int]             # The index of every passage
+    neighbors: List[Tuple[int, ...]]    # For every cell, the index of the neighbouring cell in each direction (or -1 for a wall)
+    cell_slots: List[int]               # For every cell, the index of its parking slot (or -1 if it is not a slot)
+    # If enabled (see 'enable_zobrist'), zobrist[i][c] is the key of car 'i' at cell 'c' and the states carry a Zobrist key
+    zobrist: Optional[List[List[int]]] = None
+
+    # Enables Zobrist hashing: every (car, cell) pair gets a random 64-bit key
+    # and the initial state (then every successor) becomes a 'ZobristParkingState'
+    def enable_zobrist(self, seed: int = 0) -> None:
+        count = len(self.cells)
+        keys = zobrist_keys(len(self.cars) * count, seed)
+        self.zobrist = [keys[car * count:(car + 1) * count] for car in range(len(self.cars))]
+
+    # Numbers the passages and builds the neighbour and slot tables
+    def build_tables(self) -> None:
+        self.cells = sorted(self.passages, key=lambda point: (point.y, point.x))
+        self.index = {point: index for index, point in enumerate(self.cells)}
+        self.neighbors = [
+            tuple(self.index.get(point + direction.to_vector(), -1) for direction in _DIRECTIONS)
+            for point in self.cells
+        ]
+        self.cell_slots = [self.slots.get(point, -1) for point in self.cells]
 
     # This function should return the initial state
     def get_initial_state(self) -> ParkingState:
-        #TODO: ADD YOUR CODE HERE
-        # NotImplemented()
-        # Retrieves the initial state of the parking system.
-        return self.cars
+        cars = tuple(self.index[point] for point in self.cars)
+        occupied = 0
+        for cell in cars:
+            occupied |= 1 << cell
+        in_place = sum(1 for car, cell in enumerate(cars) if self.cell_slots[cell] == car)
+        if self.zobrist is None:
+            return ParkingState(cars, occupied, in_place)
+        key = 0
+        for car, cell in enumerate(cars):
+            key ^= self.zobrist[car][cell]
+        return ZobristParkingState(cars, occupied, in_place, key)
     
     # This function should return True if the given state is a goal. Otherwise, it should return False.
     def is_goal(self, state: ParkingState) -> bool:
-        #TODO: ADD YOUR CODE HERE
-        # NotImplemented()
-        for point in state:
-            # Iterate through each point in the given state.
-            
-            if point in self.slots:
-                # Check if the point is present in the parking slots.
-                
-                if self.slots[point] != state.index(point):
-                    # Check if the index of the point in the state matches
-                    # the expected index stored in the parking slots.
-                    
-                    return False
-            else:
-                # If the point is not present in the parking slots, it's not a goal state.
-                return False
-
-        # If all points pass the conditions, the state is considered a goal state.
-        return True
+        # The state is a goal if every car is in its own parking slot
+        return state.in_place == len(state.cars)
+
     # This function returns a list of all the possible actions that can be applied to the given state
     def get_actions(self, state: ParkingState) -> List[ParkingAction]:
-        #TODO: ADD YOUR CODE HERE
-        # NotImplemented()
-        # Initialize an empty list to store possible actions.
+        neighbors, occupied = self.neighbors, state.occupied
         possible_actions = []
-
-        # Iterate through each point in the given state.
-        for point in state:
-            # Iterate through each possible direction (assuming 'Direction' is an Enum).
-            for direction in Direction:
-                # Calculate the new point based on the current point and direction.
-                new_point = point + direction.to_vector()
-
-                # Check if the new point is within the boundaries of the parking area,
-                # is part of the passages, and is not already present in the current state.
-                if (
-                    0 <= new_point.x < self.width
-                    and 0 <= new_point.y < self.height
-                    and new_point in self.passages
-                    and new_point not in state
-                ):
-                    # If all conditions are met, add the action as a (index, direction) tuple.
-                    possible_actions.append((state.index(point), direction))
-
-        # Return the list of possible actions.
+        # A car can move in a direction if the neighbouring cell is a passage that is not occupied by another car.
+        for car, cell in enumerate(state.cars):
+            for direction, next_cell in zip(_DIRECTIONS, neighbors[cell]):
+                if next_cell >= 0 and not occupied >> next_cell & 1:
+                    possible_actions.append((car, direction))
         return possible_actions
     
     # This function returns a new state which is the result of applying the given action to the given state
     def get_successor(self, state: ParkingState, action: ParkingAction) -> ParkingState:
-        #TODO: ADD YOUR CODE HERE
-        # NotImplemented()
-        # Unpack the action tuple into index and direction.
-        index, direction = action
-
-        # Initialize a new list to represent the successor state.
-        new_state = []
-
-        # Get the current point at the specified index in the current state.
-        current_point = state[index]
-
-        # Calculate the new point based on the current point and direction.
-        new_point = current_point + direction.to_vector()
-
-        # Update the point in the state at the specified index with the new point.
-        new_state.insert(index, new_point)
-
-        # Iterate through the rest of the state and insert points accordingly.
-        for i in range(len(state)):
-            if i != index:
-                new_state.insert(i, state[i])
-
-        # Return the successor state after applying the action.
-        return new_state
+        car, direction = action
+        cell = state.cars[car]
+        next_cell = self.neighbors[cell][direction]
+        if next_cell < 0:
+            # If the car moves into a wall, then this action is wrong
+            raise Exception(f"Invalid action {action} in state: {state}")
+        cars = list(state.cars)
+        cars[car] = next_cell
+        # Update the occupancy bitmask and the number of cars in their slots with the move of this car only
+        occupied = state.occupied ^ (1 << cell) ^ (1 << next_cell)
+        cell_slots = self.cell_slots
+        in_place = state.in_place - (cell_slots[cell] == car) + (cell_slots[next_cell] == car)
+        if self.zobrist is None:
+            return ParkingState(tuple(cars), occupied, in_place)
+        keys = self.zobrist[car]
+        return ZobristParkingState(tuple(cars), occupied, in_place, state.zobrist ^ keys[cell] ^ keys[next_cell])
             
     # This function returns the cost of applying the given action to the given state
     def get_cost(self, state: ParkingState, action: ParkingAction) -> float:
-        #TODO: ADD YOUR CODE HERE
-        # Initialize the cost variable.
-        cost = 0
-
-        # Unpack the action tuple into index and direction.
-        index, direction = action
-
-        # Get the current point at the specified index in the current state.
-        current_point = state[index]
-
-        # Calculate the new point based on the current point and direction.
-        new_point = current_point + direction.to_vector()
-
-        # Check if the new point corresponds to a parking slot and is not the expected slot.
-        if new_point in self.slots and self.slots[new_point] != index:
-            # If true, add a high cost (e.g., 100) to discourage undesired movements.
+        car, direction = action
+        next_cell = self.neighbors[state.cars[car]][direction]
+        # Add a cost based on the index of the car (the cars with a lower index are more expensive to move).
+        cost = 26 - car
+        # Moving into the parking slot of another car has a high cost (100) to discourage it.
+        slot = self.cell_slots[next_cell]
+        if slot >= 0 and slot != car:
             cost += 100
+        return cost
 
-        # Add a cost based on the index to encourage reaching the goal quickly.
-        cost += 26 - index
+    # Returns the position of every car in the given state
+    def positions(self, state: ParkingState) -> Tuple[Point, ...]:
+        return tuple(self.cells[cell] for cell in state.cars)
 
-        # Return the calculated cost for the given action.
-        return cost
-     # Read a parking problem from text containing a grid of tiles
+    # Read a parking problem from text containing a grid of tiles
     @staticmethod
     def from_text(text: str) -> 'ParkingProblem':
         passages =  set()
@@ -149,12 +169,41 @@ class ParkingProblem(Problem[ParkingState, ParkingAction]):
         problem.slots = {position:index for index, position in slots.items()}
         problem.width = width
         problem.height = height
+        problem.build_tables()
+        return problem
+
+    # Returns the compiled fields of the problem (see 'level_cache.py'): the size, the bitmap of the passages,
+    # the cell index of every car, the cell index of every parking slot (in the order of 'slots') and the neighbour table
+    def compile(self) -> bytes:
+        width, height = self.width, self.height
+        return LevelWriter().integers((width, height), "H").points(self.passages, width, height) \
+            .integers([point.y * width + point.x for point in self.cars]) \
+            .integers(list(self.slots.values())).integers([point.y * width + point.x for point in self.slots]) \
+            .integers([neighbor for neighbors in self.neighbors for neighbor in neighbors], "h").to_bytes()
+
+    # Rebuilds a parking problem from its compiled fields. The sets and dictionaries are filled in the same order as 'from_text',
+    # and the tables of 'build_tables' are read instead of being computed (the bitmap lists the passages in row-major order).
+    @staticmethod
+    def from_compiled(reader: LevelReader) -> 'ParkingProblem':
+        width, height = reader.integers("H")
+        cells = reader.points(width, height)
+        cars, slot_indices, slot_cells, neighbors = reader.integers(), reader.integers(), reader.integers(), reader.integers("h")
+        problem = ParkingProblem()
+        problem.passages = set(cells)
+        problem.cars = tuple(Point(cell % width, cell // width) for cell in cars)
+        problem.slots = {Point(cell % width, cell // width): index for index, cell in zip(slot_indices, slot_cells)}
+        problem.width = width
+        problem.height = height
+        problem.cells = cells
+        problem.index = {point: index for index, point in enumerate(cells)}
+        directions = len(_DIRECTIONS)
+        problem.neighbors = [neighbors[start:start + directions] for start in range(0, len(neighbors), directions)]
+        problem.cell_slots = [problem.slots.get(point, -1) for point in cells]
         return problem
 
-    # Read a parking problem from file containing a grid of tiles
+    # Read a parking problem from file containing a grid of tiles (through the compiled level cache)
     @staticmethod
     def from_file(path: str) -> 'ParkingProblem':
-        with open(path, 'r') as f:
-            return ParkingProblem.from_text(f.read())
-    
+        return load_level(path, "parking", ParkingProblem.from_text, ParkingProblem.compile, ParkingProblem.from_compiled)
+
 # print(ParkingProblem.from_file('parks/park1.txt'))
\ No newline at end of file
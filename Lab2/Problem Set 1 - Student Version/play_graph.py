@@ -1,12 +1,16 @@
 import time
 from graph import GraphRoutingProblem, GraphNode, graphrouting_heuristic
 from agents import HumanAgent, UninformedSearchAgent, InformedSearchAgent
+from policy_store import PolicyStore
 from helpers.utils import fetch_recorded_calls
+from functools import partial
 import argparse, os, json
 
 # Create an agent based on the user selections
 def create_agent(args: argparse.Namespace):
     agent_type: str = args.agent
+    # The search agents reuse the solutions saved in the policy store (if one is requested)
+    store = None if args.policy_store is None else PolicyStore(args.policy_store)
     if agent_type == "human":
         # This function reads the action from the user (human)
         def graph_user_action(problem: GraphRoutingProblem, state: GraphNode) -> GraphNode:
@@ -28,19 +32,25 @@ def create_agent(args: argparse.Namespace):
         return HumanAgent(graph_user_action)
     if agent_type == "bfs":
         from search import BreadthFirstSearch
-        return UninformedSearchAgent(BreadthFirstSearch)
+        return UninformedSearchAgent(BreadthFirstSearch, store)
     if agent_type == "dfs":
         from search import DepthFirstSearch
-        return UninformedSearchAgent(DepthFirstSearch)
+        return UninformedSearchAgent(DepthFirstSearch, store)
     if agent_type == "ucs":
         from search import UniformCostSearch
-        return UninformedSearchAgent(UniformCostSearch)
+        return UninformedSearchAgent(UniformCostSearch, store)
     if agent_type == "astar":
         from search import AStarSearch
-        return InformedSearchAgent(AStarSearch, graphrouting_heuristic)
+        return InformedSearchAgent(AStarSearch, graphrouting_heuristic, store=store)
     if agent_type == "gbfs":
         from search import BestFirstSearch
-        return InformedSearchAgent(BestFirstSearch, graphrouting_heuristic)
+        return InformedSearchAgent(BestFirstSearch, graphrouting_heuristic, store=store)
+    if agent_type == "idastar":
+        from search import IterativeDeepeningAStar
+        return InformedSearchAgent(IterativeDeepeningAStar, graphrouting_heuristic, store=store)
+    if agent_type == "smastar":
+        from search import MemoryBoundedAStarSearch
+        return InformedSearchAgent(partial(MemoryBoundedAStarSearch, node_budget=args.budget), graphrouting_heuristic, store=store)
     print(f"Requested Agent '{agent_type}' is invalid")
     exit(-1)
 
@@ -100,8 +110,12 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Play Graph as Human or AI")
     parser.add_argument("graph", help="path to the graph to play")
     parser.add_argument("--agent", "-a", default="human",
-                        choices=['human', 'bfs', 'dfs', 'ucs', 'astar', 'gbfs'],
+                        choices=['human', 'bfs', 'dfs', 'ucs', 'astar', 'gbfs', 'idastar', 'smastar'],
                         help="the agent that will play the game")
+    parser.add_argument("--budget", "-b", type=int, default=100_000,
+                        help="the maximum number of nodes stored by the memory-bounded A* (smastar)")
+    parser.add_argument("--policy-store", "-ps", default=None,
+                        help="a folder where the solutions are saved and reused by the search agents in later runs")
 
     args = parser.parse_args()
     try:
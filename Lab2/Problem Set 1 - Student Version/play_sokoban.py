@@ -1,9 +1,10 @@
-from typing import List
+from typing import List, Optional
 from sokoban import SokobanProblem, Direction, SokobanState, SokobanTile
 from agents import HumanAgent, UninformedSearchAgent, InformedSearchAgent
+from policy_store import PolicyStore
 from helpers.utils import fetch_tracked_call_count
 from helpers.heuristic_checks import test_heuristic_consistency
-from functools import lru_cache
+from functools import lru_cache, partial
 import argparse, time
 
 def colored_sokoban(level: str):
@@ -18,21 +19,41 @@ def colored_sokoban(level: str):
     return level
 
 # Return the heuristic selected by the user
-def get_heuristic(name: str):
+def get_heuristic(name: str, packed: bool = False):
     if name == "zero":
         return lambda *_: 0
+    if packed:
+        # The heuristics are written for 'SokobanState' so they are wrapped to unpack the state first
+        from sokoban_packed import unpacked_heuristic
+        return unpacked_heuristic(get_heuristic(name))
     if name == "weak":
         from sokoban_heuristic import weak_heuristic
         return weak_heuristic
     if name == "strong":
         from sokoban_heuristic import strong_heuristic
         return strong_heuristic
+    if name == "pdb":
+        from sokoban_pdb import pdb_heuristic
+        return pdb_heuristic
+    if name == "pdb-max":
+        from sokoban_pdb import pdb_max_heuristic
+        return pdb_max_heuristic
     print(f"Requested Heuristic '{name}' is invalid")
     exit(-1)
 
+# Return the problem class used for the search (the compact one if requested by the user)
+def get_problem_class(packed: bool = False):
+    if packed:
+        from sokoban_packed import PackedSokobanProblem
+        return PackedSokobanProblem
+    return SokobanProblem
+
 # Create an agent based on the user selections
-def create_agent(args: argparse.Namespace):
+# The searches that report more information (such as the peak number of stored nodes) write it into 'info'
+def create_agent(args: argparse.Namespace, info: Optional[dict] = None):
     agent_type: str = args.agent
+    # The search agents reuse the solutions saved in the policy store (if one is requested)
+    store = None if args.policy_store is None else PolicyStore(args.policy_store)
     if agent_type == "human":
         # This function reads the action from the user (human)
         def sokoban_user_action(problem: SokobanProblem, state: SokobanState) -> Direction:
@@ -52,29 +73,35 @@ def create_agent(args: argparse.Namespace):
         return HumanAgent(sokoban_user_action)
     if agent_type == "bfs":
         from search import BreadthFirstSearch
-        return UninformedSearchAgent(BreadthFirstSearch)
+        return UninformedSearchAgent(BreadthFirstSearch, store)
     if agent_type == "dfs":
         from search import DepthFirstSearch
-        return UninformedSearchAgent(DepthFirstSearch)
+        return UninformedSearchAgent(DepthFirstSearch, store)
     if agent_type == "ucs":
         from search import UniformCostSearch
-        return UninformedSearchAgent(UniformCostSearch)
-    if agent_type == "astar":
-        from search import AStarSearch
-        # We cache the heuristic calls to speed up the search process if the heuristic is not fast
-        heuristic = lru_cache(2**16)(get_heuristic(args.heuristic))
-        # If desired by the user, we track every transition and check for the heuristic consistency for each transition
-        if args.checks:
-            SokobanProblem.get_successor = test_heuristic_consistency(heuristic)(SokobanProblem.get_successor)
-        return InformedSearchAgent(AStarSearch, heuristic)
-    if agent_type == "gbfs":
-        from search import BestFirstSearch
+        return UninformedSearchAgent(UniformCostSearch, store)
+    if agent_type in ("astar", "gbfs", "idastar", "smastar", "wastar", "arastar", "beam"):
+        import search
+        search_fn = {
+            "astar": search.AStarSearch,
+            "gbfs": search.BestFirstSearch,
+            "idastar": partial(search.IterativeDeepeningAStar, info=info),
+            "smastar": partial(search.MemoryBoundedAStarSearch, node_budget=args.budget, info=info),
+            "wastar": partial(search.WeightedAStarSearch, weight=args.weight),
+            "arastar": partial(search.AnytimeRepairingAStarSearch, initial_weight=args.weight, info=info),
+            "beam": partial(search.BeamSearch, width=args.width),
+        }[agent_type]
+        # IDA* and SMA* cannot be stopped at a deadline
+        if args.time_budget is not None and agent_type in ("idastar", "smastar"):
+            print(f"Requested Agent '{agent_type}' does not support a time budget")
+            exit(-1)
         # We cache the heuristic calls to speed up the search process if the heuristic is not fast
-        heuristic = lru_cache(2**16)(get_heuristic(args.heuristic))
+        heuristic = lru_cache(2**16)(get_heuristic(args.heuristic, args.packed))
         # If desired by the user, we track every transition and check for the heuristic consistency for each transition
         if args.checks:
-            SokobanProblem.get_successor = test_heuristic_consistency(heuristic)(SokobanProblem.get_successor)
-        return InformedSearchAgent(BestFirstSearch, heuristic)
+            problem_class = get_problem_class(args.packed)
+            problem_class.get_successor = test_heuristic_consistency(heuristic)(problem_class.get_successor)
+        return InformedSearchAgent(search_fn, heuristic, args.time_budget, store)
     print(f"Requested Agent '{agent_type}' is invalid")
     exit(-1)
 
@@ -82,16 +109,25 @@ def main(args: argparse.Namespace):
     state_printer = lambda state: print(state)
     if args.ansicolors: state_printer = lambda state: print(colored_sokoban(str(state)))
     start = time.time() # Track run time
-    problem = SokobanProblem.from_file(args.level) # create the problem
+    problem = get_problem_class(args.packed).from_file(args.level) # create the problem
+    problem.prune_deadlocks = args.deadlocks # skip the pushes that lead to deadlocks if requested
     state = problem.get_initial_state() # Get the initial state
     print("Initial State:")
     state_printer(state)
-    agent = create_agent(args)
+    info = {} # This will store the information reported by the search
+    agent = create_agent(args, info)
+    # The function whose calls are counted as explored nodes
+    counted_function = type(problem).get_actions
+    if args.push and not isinstance(agent, HumanAgent):
+        # Search over crate pushes instead of player steps, then expand the pushes into steps
+        from sokoban_push import SokobanPushAgent, SokobanPushProblem
+        agent = SokobanPushAgent(agent.search_fn, getattr(agent, "heuristic", None), args.deadlocks, getattr(agent, "time_budget", None))
+        counted_function = SokobanPushProblem.get_actions
     step = 0 # This will store the current step
     total_explored_nodes = 0 # This will store the number of traversed nodes during search
     unsolvable = False # This will store whether the problem is unsolvable or not
     while not problem.is_goal(state):
-        fetch_tracked_call_count(SokobanProblem.is_goal) # Clear the call counter
+        fetch_tracked_call_count(counted_function) # Clear the call counter
         action = agent.act(problem, state) # Request an action from the agent
         # If no solution was found, break
         if action is None:
@@ -99,7 +135,7 @@ def main(args: argparse.Namespace):
             unsolvable = True
             break
         # Get the number of traversed nodes
-        total_explored_nodes += fetch_tracked_call_count(SokobanProblem.is_goal)
+        total_explored_nodes += fetch_tracked_call_count(counted_function)
         # Apply the action to the state
         state = problem.get_successor(state, action)
         step += 1
@@ -117,6 +153,12 @@ def main(args: argparse.Namespace):
     # This was a search agent, display the number of traversed nodes
     if not isinstance(agent, HumanAgent):
         print(f"Search explored {total_explored_nodes} nodes")
+        # The memory-bounded searches also report the largest number of nodes they stored at the same time
+        if "peak_nodes" in info:
+            print(f"Search stored at most {info['peak_nodes']} nodes")
+        # ARA* reports the suboptimality bound of the solution it returned
+        if "bound" in info:
+            print(f"Solution cost is at most {info['bound']:.3f} times the optimal cost")
     # Finally print the elapsed time for the whole process
     print(f"Elapsed time: {time.time() - start} seconds")
 
@@ -126,13 +168,30 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Play Sokoban as Human or AI")
     parser.add_argument("level", help="path to the sokoban level to play")
     parser.add_argument("--agent", "-a", default="human",
-                        choices=['human', 'bfs', 'dfs', 'ucs', 'astar', 'gbfs'],
+                        choices=['human', 'bfs', 'dfs', 'ucs', 'astar', 'gbfs', 'idastar', 'smastar', 'wastar', 'arastar', 'beam'],
                         help="the agent that will play the game")
+    parser.add_argument("--budget", "-b", type=int, default=100_000,
+                        help="the maximum number of nodes stored by the memory-bounded A* (smastar)")
+    parser.add_argument("--weight", "-w", type=float, default=2.0,
+                        help="the heuristic weight of weighted A* (wastar) and the initial weight of ARA* (arastar)")
+    parser.add_argument("--width", "-bw", type=int, default=100,
+                        help="the number of nodes kept in each layer by beam search (beam)")
+    parser.add_argument("--time-budget", "-tb", type=float, default=None,
+                        help="the number of seconds the informed search agents can search before returning their best plan")
     parser.add_argument("--heuristic", '-hf', default="zero",
-                        choices=["zero", "weak", "strong"],
-                        help="choose the heuristic to use with A* or Greedy Best First Search")
+                        choices=["zero", "weak", "strong", "pdb", "pdb-max"],
+                        help="choose the heuristic to use with the informed search agents")
     parser.add_argument("--checks", "-c", action='store_true', default=False,
                         help="Enable consistency checks for the heuristic")
+    formulation = parser.add_mutually_exclusive_group()
+    formulation.add_argument("--packed", "-p", action="store_true", default=False,
+                        help="Search over the compact (bit-packed) state encoding")
+    formulation.add_argument("--push", "-pu", action="store_true", default=False,
+                        help="Search over crate pushes (minimizes the number of pushes instead of steps)")
+    parser.add_argument("--deadlocks", "-dl", action="store_true", default=False,
+                        help="Prune the pushes that lead to deadlocks (dead squares and frozen crates)")
+    parser.add_argument("--policy-store", "-ps", default=None,
+                        help="a folder where the solutions are saved and reused by the search agents in later runs")
     parser.add_argument("--ansicolors", "-ac", action="store_true",
                         help="Print the level on the console with ANSI colors (only works on some terminals)")
 
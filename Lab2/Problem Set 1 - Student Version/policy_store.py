@@ -0,0 +1,222 @@
+from typing import Any, Callable, List, Optional
+from collections import OrderedDict
+from functools import partial
+import hashlib, json, os, tempfile
+
+from mathutils import Direction, Point, intern_point
+from problem import HeuristicFunction, Problem, S, A, Solution
+
+# This file contains an on-disk store for the solutions found by the search agents, so that a level that was solved
+# before (by any process) is not searched again.
+# Every solution is stored in its own file whose name is a key computed from:
+#   a canonical description of the problem and the state the search started from,
+#   and the names of the search function and the heuristic.
+# A file is written to a temporary file first then renamed, so the readers (including other processes) never see a partial file.
+# The files are only read when they are requested, and the store keeps at most 'max_entries' files:
+# the modification time of a file is updated whenever it is read, and the least recently used files are deleted first.
+# The solutions are saved as JSON (see 'encode_action'), so reading a file from a shared folder never runs any code.
+
+# The default maximum number of solutions in a store
+DEFAULT_MAX_ENTRIES = 1024
+# The default maximum number of solutions that a store keeps in memory
+DEFAULT_MAX_CACHED = 128
+
+class PolicyStore:
+    def __init__(self, directory: str, max_entries: int = DEFAULT_MAX_ENTRIES, max_cached: int = DEFAULT_MAX_CACHED) -> None:
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_cached = max_cached
+        # The solutions most recently read or written by this process (the least recently used one is dropped first)
+        self.solutions: OrderedDict = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    # Returns the stored solution for the given key or None if there is none (or if its file cannot be read)
+    def get(self, key: str) -> Solution:
+        solution = self.solutions.get(key)
+        if solution is not None:
+            self.solutions.move_to_end(key)
+            return solution
+        path = self.path(key)
+        try:
+            with open(path, 'r') as f:
+                solution = [decode_action(action) for action in json.load(f)]
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+        # Mark the file as recently used (this fails on a shared store if the file belongs to another user, which is fine)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.remember(key, solution)
+        return solution
+
+    # Stores the solution for the given key, then deletes the least recently used files if the store is full.
+    # If the store can not be written (for example, a read-only folder), the solution is only kept in memory.
+    def put(self, key: str, solution: List) -> None:
+        text = json.dumps([encode_action(action) for action in solution])
+        self.remember(key, solution)
+        try:
+            descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(descriptor, 'w') as f:
+                f.write(text)
+            os.replace(temporary_path, self.path(key))
+        except OSError:
+            try:
+                os.unlink(temporary_path)
+            except OSError:
+                pass
+            return
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+        self.evict()
+
+    # Forgets the solution for the given key and deletes its file (if it can)
+    def discard(self, key: str) -> None:
+        self.solutions.pop(key, None)
+        try:
+            os.unlink(self.path(key))
+        except OSError:
+            pass
+
+    # Keeps the solution in memory, dropping the least recently used one if there are more than 'max_cached'
+    def remember(self, key: str, solution: List) -> None:
+        self.solutions[key] = solution
+        self.solutions.move_to_end(key)
+        if len(self.solutions) > self.max_cached:
+            self.solutions.popitem(last=False)
+
+    # Deletes the least recently used files until the store has at most 'max_entries' files
+    def evict(self) -> None:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    entries.append((entry.stat().st_mtime_ns, entry.path))
+                except FileNotFoundError:
+                    # Another process deleted it
+                    continue
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def __len__(self) -> int:
+        return sum(1 for name in os.listdir(self.directory) if name.endswith(".json"))
+
+# Converts an action to a JSON value. The actions of the supported problems (see 'describe') are
+# directions (sokoban), tuples of a car index and a direction (parking) and graph nodes (graph routing).
+def encode_action(action: Any) -> Any:
+    from graph import GraphNode
+    if isinstance(action, Direction):
+        return {"direction": int(action)}
+    if isinstance(action, Point):
+        return {"point": [action.x, action.y]}
+    if isinstance(action, GraphNode):
+        return {"node": action.name, "position": [action.position.x, action.position.y]}
+    if isinstance(action, tuple):
+        return [encode_action(item) for item in action]
+    if isinstance(action, (bool, int, float, str)) or action is None:
+        return action
+    raise TypeError(f"Actions of type '{type(action).__name__}' can not be stored")
+
+# Converts a JSON value written by 'encode_action' back to the action
+def decode_action(value: Any) -> Any:
+    from graph import GraphNode
+    if isinstance(value, list):
+        return tuple(decode_action(item) for item in value)
+    if isinstance(value, dict):
+        if "direction" in value:
+            return Direction(value["direction"])
+        if "point" in value:
+            return intern_point(*value["point"])
+        return GraphNode(value["node"], intern_point(*value["position"]))
+    return value
+
+# Returns a canonical description of the problem and the state as a JSON compatible value,
+# or None if the problem type is not supported (then its solutions are not stored).
+# Only the three base problems are supported: 'SokobanProblem', 'ParkingProblem' and 'GraphRoutingProblem'.
+# Their subclasses and the other problems (such as the packed or push-level sokoban problems) are never stored,
+# since their states and actions differ from the base problem and a stored solution would be replayed with the wrong actions.
+def describe(problem: Problem[S, A], state: S) -> Any:
+    from sokoban import SokobanProblem
+    from parking import ParkingProblem
+    from graph import GraphRoutingProblem
+    if type(problem) is SokobanProblem:
+        # The text of the state contains the whole layout, the player and the crates
+        return {"sokoban": str(state), "prune_deadlocks": bool(getattr(problem, "prune_deadlocks", False))}
+    if type(problem) is ParkingProblem:
+        return {
+            "parking": [problem.width, problem.height],
+            "passages": sorted((point.x, point.y) for point in problem.passages),
+            "slots": sorted((point.x, point.y, index) for point, index in problem.slots.items()),
+            # The car cells are indices of the passages in row-major order, so they do not depend on the order of the sets
+            "cars": list(state.cars),
+        }
+    if type(problem) is GraphRoutingProblem:
+        return {
+            "graph": sorted(
+                (node.name, node.position.x, node.position.y, sorted(adjacent.name for adjacent in adjacent_nodes))
+                for node, adjacent_nodes in problem.adjacency.items()
+            ),
+            "goal": problem.goal.name,
+            "state": state.name,
+        }
+    return None
+
+# The arguments of the search functions that only collect information about the search (they do not change the solution)
+REPORTING_ARGUMENTS = ("info", "stats")
+
+# Returns a name that identifies a function (including the arguments fixed by 'functools.partial', except the reporting arguments)
+def function_name(function: Optional[Callable]) -> Optional[str]:
+    if function is None:
+        return None
+    if isinstance(function, partial):
+        arguments = ", ".join(f"{name}={value!r}" for name, value in sorted(function.keywords.items()) if name not in REPORTING_ARGUMENTS)
+        return f"{function_name(function.func)}({arguments})" if arguments else function_name(function.func)
+    return f"{getattr(function, '__module__', '')}.{getattr(function, '__qualname__', repr(function))}"
+
+# Returns the key of the solution of the given search from the given state, or None if the problem type is not supported
+def policy_key(problem: Problem[S, A], state: S, search_fn: Callable, heuristic: Optional[HeuristicFunction] = None) -> Optional[str]:
+    description = describe(problem, state)
+    if description is None:
+        return None
+    text = json.dumps([type(problem).__name__, description, function_name(search_fn), function_name(heuristic)])
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# Returns True if following the solution from the state ends in a goal.
+# Every action is checked before it is applied, so a stale or damaged solution returns False instead of raising.
+def reaches_goal(problem: Problem[S, A], state: S, solution: List[A]) -> bool:
+    for action in solution:
+        if action not in problem.get_actions(state):
+            return False
+        state = problem.get_successor(state, action)
+    return problem.is_goal(state)
+
+# Returns the stored solution of the search if there is one, otherwise calls 'search' and stores the solution it returns.
+# If 'save' is False, the new solution is not stored (for example, if the search was stopped at a deadline).
+def stored_search(store: Optional[PolicyStore], problem: Problem[S, A], state: S, search_fn: Callable,
+                  heuristic: Optional[HeuristicFunction], search: Callable[[], Solution], save: bool = True) -> Solution:
+    key = None if store is None else policy_key(problem, state, search_fn, heuristic)
+    if key is None:
+        return search()
+    solution = store.get(key)
+    if solution is not None:
+        if reaches_goal(problem, state, solution):
+            return solution
+        # The stored solution does not solve this problem, so it is deleted and the problem is searched again
+        store.discard(key)
+    solution = search()
+    if solution is not None and save:
+        store.put(key, solution)
+    return solution
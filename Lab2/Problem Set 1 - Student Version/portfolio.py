@@ -0,0 +1,211 @@
+from typing import Callable, Dict, List, Optional
+from dataclasses import dataclass
+from collections import deque
+import argparse, multiprocessing, os, queue, time
+
+from problem import HeuristicFunction, Problem, S, A, Solution
+
+# This file contains a portfolio solver: it runs several searches (or the same search with different heuristics)
+# on the same problem in parallel processes, returns the first valid solution and stops the other searches.
+# This is useful when we do not know which search will finish first on a hard level, since it uses all the cores.
+# Every member runs in its own process, so the problem, the search functions and the heuristics must be picklable
+# on the platforms that do not support 'fork' (module level functions are).
+# Example:
+#   python portfolio.py levels/level4.txt --members bfs astar:weak astar:strong gbfs:strong
+
+# A member of the portfolio is a search function and the heuristic it uses (None for the uninformed searches)
+@dataclass
+class PortfolioMember:
+    name: str
+    search_fn: Callable[..., Solution]
+    heuristic: Optional[HeuristicFunction] = None
+
+# The report of a member after the portfolio finished. The status is one of:
+#   "solved": it returned the winning solution
+#   "no solution": it finished without finding a solution
+#   "invalid": it returned a solution that does not reach a goal
+#   "error": it raised an exception or its process crashed
+#   "cancelled": it was stopped since another member found a solution
+#   "timeout": it was stopped since the time limit was reached
+#   "not started": the portfolio finished before a worker was free to run it
+@dataclass
+class MemberReport:
+    name: str
+    status: str = "not started"
+    expanded: int = 0           # The number of calls to 'get_actions'
+    elapsed: float = 0.0        # The wall time of the member in seconds
+    length: Optional[int] = None
+    cost: Optional[float] = None
+    error: Optional[str] = None
+
+@dataclass
+class PortfolioResult:
+    solution: Optional[Solution]
+    winner: Optional[str]
+    reports: List[MemberReport]
+    elapsed: float
+
+# The members update their shared expansion counter once every this many expansions (and when they finish),
+# so that the counter does not slow down the search and the cancelled members still report their progress
+_COUNTER_FLUSH_INTERVAL = 1024
+
+# Follows the solution from the initial state and returns its cost, or None if it uses an invalid action or does not end in a goal
+def solution_cost(problem: Problem[S, A], initial_state: S, solution: Solution) -> Optional[float]:
+    state, cost = initial_state, 0
+    for action in solution:
+        if action not in problem.get_actions(state):
+            return None
+        cost += problem.get_cost(state, action)
+        state = problem.get_successor(state, action)
+    return cost if problem.is_goal(state) else None
+
+# Runs a member in a child process and sends (index, kind, solution or error, elapsed time) through the results queue
+def _run_member(problem: Problem[S, A], initial_state: S, member: PortfolioMember, index: int, counter, results: multiprocessing.Queue):
+    # Count the expanded nodes by wrapping 'get_actions' on this problem instance only
+    get_actions = problem.get_actions
+    expanded = 0
+    def counted_get_actions(state):
+        nonlocal expanded
+        expanded += 1
+        if expanded % _COUNTER_FLUSH_INTERVAL == 0:
+            counter.value = expanded
+        return get_actions(state)
+    problem.get_actions = counted_get_actions
+    start = time.perf_counter()
+    try:
+        if member.heuristic is None:
+            solution = member.search_fn(problem, initial_state)
+        else:
+            solution = member.search_fn(problem, initial_state, member.heuristic)
+    except Exception as error:
+        counter.value = expanded
+        results.put((index, "error", repr(error), time.perf_counter() - start))
+        return
+    counter.value = expanded
+    results.put((index, "done", solution, time.perf_counter() - start))
+
+# Runs the members on the problem with at most 'workers' processes at the same time (by default, one per core)
+# and returns the first valid solution. If a timeout (in seconds) is given, the remaining members are stopped when it is reached.
+def solve_portfolio(problem: Problem[S, A], members: List[PortfolioMember], initial_state: Optional[S] = None,
+                    workers: Optional[int] = None, timeout: Optional[float] = None) -> PortfolioResult:
+    if initial_state is None:
+        initial_state = problem.get_initial_state()
+    if workers is None:
+        workers = os.cpu_count() or 1
+    context = multiprocessing.get_context()
+    results = context.Queue()
+    reports = [MemberReport(member.name) for member in members]
+    # The counters are written by a single process each, so they do not need a lock
+    counters = [context.Value('q', 0, lock=False) for _ in members]
+    pending = deque(range(len(members)))
+    running: Dict[int, multiprocessing.Process] = {}
+    started: Dict[int, float] = {}
+
+    start = time.perf_counter()
+    deadline = None if timeout is None else start + timeout
+    solution, winner = None, None
+    try:
+        while solution is None and (pending or running):
+            # Start the next members while there are free workers
+            while pending and len(running) < workers:
+                index = pending.popleft()
+                process = context.Process(target=_run_member, args=(problem, initial_state, members[index], index, counters[index], results), daemon=True)
+                process.start()
+                running[index] = process
+                started[index] = time.perf_counter()
+            # Wait for a result, but wake up regularly to detect the members whose process died without sending one
+            wait = 0.1 if deadline is None else min(0.1, deadline - time.perf_counter())
+            if wait <= 0:
+                break
+            try:
+                index, kind, value, elapsed = results.get(timeout=wait)
+            except queue.Empty:
+                for index, process in list(running.items()):
+                    if process.exitcode not in (None, 0):
+                        del running[index]
+                        report = reports[index]
+                        report.status, report.error = "error", f"exit code {process.exitcode}"
+                        report.elapsed, report.expanded = time.perf_counter() - started[index], counters[index].value
+                continue
+            running.pop(index).join()
+            report = reports[index]
+            report.elapsed, report.expanded = elapsed, counters[index].value
+            if kind == "error":
+                report.status, report.error = "error", value
+            elif value is None:
+                report.status = "no solution"
+            else:
+                cost = solution_cost(problem, initial_state, value)
+                if cost is None:
+                    report.status = "invalid"
+                else:
+                    report.status, report.length, report.cost = "solved", len(value), cost
+                    solution, winner = value, members[index].name
+    finally:
+        # Stop the members that are still running
+        now = time.perf_counter()
+        for index, process in running.items():
+            process.terminate()
+            process.join()
+            report = reports[index]
+            report.status = "timeout" if solution is None else "cancelled"
+            report.elapsed, report.expanded = now - started[index], counters[index].value
+    return PortfolioResult(solution, winner, reports, time.perf_counter() - start)
+
+# The members used when none are given on the command line
+DEFAULT_MEMBERS = {
+    "sokoban": ["bfs", "astar:weak", "astar:strong", "gbfs:strong"],
+    "sokoban-packed": ["bfs", "astar:weak", "astar:strong", "gbfs:strong"],
+    "sokoban-push": ["bfs", "astar:weak", "astar:strong", "gbfs:strong"],
+    "parking": ["bfs", "ucs", "dfs"],
+    "graph": ["ucs", "astar:euclidean", "gbfs:euclidean"],
+    "graph-compact": ["ucs", "astar:euclidean", "gbfs:euclidean"],
+}
+
+# Create a member from a description "algorithm" or "algorithm:heuristic" (the algorithm and heuristic names of 'search_benchmark.py').
+# The informed searches use the zero heuristic if no heuristic is given.
+def parse_member(problem_type: str, description: str) -> PortfolioMember:
+    from search_benchmark import get_heuristic, get_search_function
+    algorithm, _, heuristic_name = description.partition(":")
+    if algorithm == "biastar":
+        raise ValueError("Bidirectional A* needs a reverse heuristic and cannot be used in a portfolio")
+    search_fn, informed = get_search_function(algorithm)
+    heuristic = get_heuristic(problem_type, heuristic_name or "zero") if informed else None
+    return PortfolioMember(description, search_fn, heuristic)
+
+def main(args: argparse.Namespace):
+    from search_benchmark import load_problem
+    problem = load_problem(args.problem, args.level)
+    if args.deadlocks:
+        problem.prune_deadlocks = True
+    members = [parse_member(args.problem, description) for description in (args.members or DEFAULT_MEMBERS[args.problem])]
+    result = solve_portfolio(problem, members, workers=args.workers, timeout=args.timeout)
+    header = f"{'member':<20}{'status':<14}{'length':>8}{'cost':>10}{'expanded':>12}{'time (s)':>12}"
+    print(header)
+    print('-' * len(header))
+    for report in result.reports:
+        length = "-" if report.length is None else report.length
+        cost = "-" if report.cost is None else f"{report.cost:g}"
+        print(f"{report.name:<20}{report.status:<14}{length:>8}{cost:>10}{report.expanded:>12}{report.elapsed:>12.3f}")
+        if report.error is not None:
+            print(f"    {report.error}")
+    print('-' * len(header))
+    if result.solution is None:
+        print(f"No solution was found ({result.elapsed:.3f} seconds)")
+    else:
+        print(f"'{result.winner}' found a solution of length {len(result.solution)} in {result.elapsed:.3f} seconds")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve a problem with a portfolio of searches running in parallel")
+    parser.add_argument("level", help="path to the problem file")
+    parser.add_argument("--problem", "-p", default="sokoban", choices=list(DEFAULT_MEMBERS),
+                        help="the type of the problem stored in the file")
+    parser.add_argument("--members", "-m", nargs="+", default=None,
+                        help="the members as 'algorithm' or 'algorithm:heuristic' (for example: bfs astar:strong)")
+    parser.add_argument("--workers", "-w", type=int, default=None,
+                        help="the maximum number of members running at the same time (default: the number of cores)")
+    parser.add_argument("--timeout", "-t", type=float, default=None,
+                        help="the time limit (in seconds) for the whole portfolio")
+    parser.add_argument("--deadlocks", "-dl", action="store_true", default=False,
+                        help="prune the pushes that lead to deadlocks (sokoban only)")
+    main(parser.parse_args())
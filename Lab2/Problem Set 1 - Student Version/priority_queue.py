@@ -0,0 +1,154 @@
+from typing import Any, Dict, Generic, Hashable, Iterable, List, Tuple, TypeVar
+from collections import deque
+from heapq import heappop, heappush
+
+# K is the type of the keys stored in the queue (for the searches, these are the states)
+K = TypeVar("K", bound=Hashable)
+
+# This file contains an indexed priority queue which is used as the frontier of the cost-based and informed searches.
+# Every key is stored at most once and the queue keeps a map from each key to its live heap entry,
+# so membership checks are O(1), and push and decrease-key are O(log m) where m is the number of entries in the heap.
+# Since a decreased or removed key leaves a stale entry behind (see below), m counts the stale entries as well as the n live keys,
+# and a pop is O(log m) for every entry it removes (the stale ones it skips, then the live one).
+# Ties between equal priorities are broken by insertion order: first in, first out by default,
+# or last in, first out if the queue is created with 'lifo=True'.
+# A key whose priority is decreased counts as newly inserted.
+# In the LIFO mode, pushing a key again with an equal priority also replaces it, since the newer entry wins the tie.
+#
+# The heap is handled by 'heapq' and holds plain tuples (priority, order, key, item), and the map points to the same tuples,
+# so a push only allocates the heap entry. A decreased or removed key leaves its old entry in the heap,
+# which is skipped when it reaches the top since it is no longer the entry of its key in the map.
+
+# The fields of the heap entries (the lists of 'InsertionOrderQueue' use the same layout)
+_PRIORITY, _ORDER, _KEY, _ITEM = range(4)
+
+# This marks an entry that was replaced by a newer entry (only used by 'InsertionOrderQueue')
+_REMOVED = object()
+
+class IndexedPriorityQueue(Generic[K]):
+    def __init__(self, lifo: bool = False) -> None:
+        self.lifo = lifo
+        self._heap: List[tuple] = []
+        # This maps every key in the queue to its live entry
+        self._index: Dict[K, tuple] = {}
+        # A counter used to break ties in insertion order (it counts down in the LIFO mode)
+        self._counter = 0
+        self._step = -1 if lifo else 1
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __bool__(self) -> bool:
+        return bool(self._index)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._index
+
+    # Returns the keys in the queue (in no particular order)
+    def keys(self) -> Iterable[K]:
+        return self._index.keys()
+
+    # Returns the priority of the given key or the default if the key is not in the queue
+    def get_priority(self, key: K, default: Any = None) -> Any:
+        entry = self._index.get(key)
+        return default if entry is None else entry[_PRIORITY]
+
+    # Returns the item stored with the given key or the default if the key is not in the queue
+    def get_item(self, key: K, default: Any = None) -> Any:
+        entry = self._index.get(key)
+        return default if entry is None else entry[_ITEM]
+
+    # Inserts the key with the given priority and item.
+    # If the key is already in the queue, its priority and item are replaced only if the new priority is strictly lower
+    # (or equal in the LIFO mode).
+    # Returns True if the queue was changed, otherwise it returns False.
+    def push(self, key: K, priority: Any, item: Any = None) -> bool:
+        index = self._index
+        entry = index.get(key)
+        if entry is not None and not (priority < entry[_PRIORITY] or (self.lifo and priority == entry[_PRIORITY])):
+            return False
+        order = self._counter
+        self._counter = order + self._step
+        entry = index[key] = (priority, order, key, item)
+        heappush(self._heap, entry)
+        return True
+
+    # Removes the entry with the lowest priority and returns it as a tuple (key, priority, item)
+    def pop(self) -> Tuple[K, Any, Any]:
+        heap, index = self._heap, self._index
+        while heap:
+            priority, _, key, item = entry = heappop(heap)
+            if index.get(key) is entry:
+                del index[key]
+                return key, priority, item
+        raise IndexError("pop from an empty priority queue")
+
+    # Returns the entry with the lowest priority as a tuple (key, priority, item) without removing it
+    def peek(self) -> Tuple[K, Any, Any]:
+        heap, index = self._heap, self._index
+        while heap and index.get(heap[0][_KEY]) is not heap[0]:
+            heappop(heap)
+        if not heap:
+            raise IndexError("peek from an empty priority queue")
+        priority, _, key, item = heap[0]
+        return key, priority, item
+
+    # Removes the given key from the queue (if it exists) and returns its item
+    def remove(self, key: K, default: Any = None) -> Any:
+        entry = self._index.pop(key, None)
+        return default if entry is None else entry[_ITEM]
+
+# This queue has the same interface as 'IndexedPriorityQueue', but it ignores the priorities
+# and pops the keys in insertion order (FIFO, or LIFO if it is created with 'lifo=True').
+# It is only equivalent to the priority queue when all the priorities are equal (like in BFS and DFS),
+# where it avoids the cost of maintaining a heap.
+# Like the priority queue, every key is stored at most once. In the LIFO mode, pushing a key again moves it to the top
+# (its old entry is left behind and skipped when it is popped).
+class InsertionOrderQueue(Generic[K]):
+    def __init__(self, lifo: bool = False) -> None:
+        self.lifo = lifo
+        self._entries: deque = deque()
+        # This maps every key to its live entry
+        self._index: Dict[K, list] = {}
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __bool__(self) -> bool:
+        return bool(self._index)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._index
+
+    def get_priority(self, key: K, default: Any = None) -> Any:
+        entry = self._index.get(key)
+        return default if entry is None else entry[_PRIORITY]
+
+    def get_item(self, key: K, default: Any = None) -> Any:
+        entry = self._index.get(key)
+        return default if entry is None else entry[_ITEM]
+
+    # Inserts the key with the given priority and item. If the key is already in the queue,
+    # it is replaced (and moved to the top) in the LIFO mode, otherwise nothing happens.
+    # Returns True if the queue was changed, otherwise it returns False.
+    def push(self, key: K, priority: Any, item: Any = None) -> bool:
+        entry = self._index.get(key)
+        if entry is not None:
+            if not self.lifo:
+                return False
+            entry[_KEY] = _REMOVED
+        entry = [priority, None, key, item]
+        self._index[key] = entry
+        self._entries.append(entry)
+        return True
+
+    # Removes the next entry and returns it as a tuple (key, priority, item)
+    def pop(self) -> Tuple[K, Any, Any]:
+        entries = self._entries
+        take = entries.pop if self.lifo else entries.popleft
+        while entries:
+            entry = take()
+            if entry[_KEY] is not _REMOVED:
+                del self._index[entry[_KEY]]
+                return entry[_KEY], entry[_PRIORITY], entry[_ITEM]
+        raise IndexError("pop from an empty queue")
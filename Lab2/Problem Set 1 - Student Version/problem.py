@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Callable, Generic, Iterable, List, TypeVar, Union
+from typing import Callable, Generic, Iterable, List, Tuple, TypeVar, Union
 from helpers.utils import CacheContainer, with_cache
 
 # S and A are used for generic typing where S represents the state type and A represents the action type
@@ -34,6 +34,20 @@ class Problem(ABC, Generic[S, A], CacheContainer):
     def get_cost(self, state: S, action: A) -> float:
         return 1.0
 
+# ReversibleProblem is a problem with a single known goal state that can also be searched backward from the goal
+# It is needed by the bidirectional search functions
+class ReversibleProblem(Problem[S, A]):
+    # This function returns the goal state
+    @abstractmethod
+    def get_goal_state(self) -> S:
+        pass
+
+    # Given a state, this function returns all the pairs (previous state, action)
+    # where applying the action to the previous state leads to the given state
+    @abstractmethod
+    def get_predecessors(self, state: S) -> Iterable[Tuple[S, A]]:
+        pass
+
 # These are type aliases for:
 # A solution which is a list of actions (or None if no solution is found)
 Solution = Union[List[A], None]
@@ -1,7 +1,13 @@
-from problem import HeuristicFunction, Problem, S, A, Solution
+from problem import HeuristicFunction, Problem, ReversibleProblem, S, A, Solution
+from typing import Callable, Dict, Iterator, Optional, Tuple
+from itertools import chain
 from collections import deque
+import heapq, time
 from helpers.utils import NotImplemented
-import queue
+from priority_queue import IndexedPriorityQueue
+from search_nodes import SearchNodeStore
+from search_stats import SearchStatistics, collects_statistics
+from best_first import Frontier, GenericBestFirstSearch, TieBreaking, astar_priority, constant_priority, cost_priority, heuristic_priority, weighted_priority
 #TODO: Import any modules you want to use
 
 # All search functions take a problem and a state
@@ -12,269 +18,671 @@ import queue
 # 1. A list of actions which represent the path from the initial state to the final state
 # 2. None if there is no solution
 
-def BreadthFirstSearch(problem: Problem[S, A], initial_state: S) -> Solution:
-    #TODO: ADD YOUR CODE HERE
-    # NotImplemented()
-    # Check if the initial state is already a goal state.
-    if problem.is_goal(initial_state):
-        return []  # The initial state is the goal state
-
-    # Initialize the frontier with a deque and a set for efficient state checks.
-    frontier = deque()
-    frontier_set = set()  # Use a set to efficiently check if a state is in the frontier
+# Instead of carrying a copy of its path, every node is an index into a shared 'SearchNodeStore'
+# which remembers the parent, the action and (when needed) the path cost of each node.
+# The path is only rebuilt when a goal is found.
 
-    # Add the initial state and an empty path to the frontier.
-    frontier.append((initial_state, []))
-    frontier_set.add(initial_state)
+# BFS, DFS, UCS, A* and Greedy Best First Search are all instances of the generic best first search in 'best_first.py'
+# which only differ in their priority function, tie breaking and goal test.
 
-    # Initialize a set to keep track of explored states.
-    explored = set()
-
-    # Continue the search until the frontier is empty.
-    while frontier:
-        # Dequeue the current state and path from the frontier.
-        current_state, path = frontier.popleft()
-        # Remove the state from the set when dequeued to maintain frontier_set integrity.
-        frontier_set.remove(current_state)
-        # Add the current state to the set of explored states.
-        explored.add(current_state)
-
-        # Generate successor states for the current state using available actions.
-        for action in problem.get_actions(current_state):
-            next_state = problem.get_successor(current_state, action)
-
-            # Check if the next state is not in explored or in the frontier set.
-            if next_state not in explored and next_state not in frontier_set:
-                # Create a new path by appending the current action to the existing path.
-                new_path = path + [action]
-
-                # Check if the next state is a goal state.
-                if problem.is_goal(next_state):
-                    return new_path  # Return the solution path.
-                else:
-                    # Add the next state and its path to the frontier and set.
-                    frontier.append((next_state, new_path))
-                    frontier_set.add(next_state)  # Add the next state to the set.
+# Every search function also accepts an optional 'stats' argument: a 'SearchStatistics' object (see 'search_stats.py')
+# which is filled in with the number of expanded and generated nodes, the peak sizes and the time spent in the problem and the heuristic.
 
-def DepthFirstSearch(problem: Problem[S, A], initial_state: S) -> Solution:
+def BreadthFirstSearch(problem: Problem[S, A], initial_state: S, stats: Optional[SearchStatistics] = None) -> Solution:
     #TODO: ADD YOUR CODE HERE
     # NotImplemented()
-    # Initialize the frontier with the initial state and an empty path.
-    frontier = [(initial_state, [])]  # Stack to store (state, path) pairs
-
-    # Initialize a set to keep track of explored states.
-    explored = set()
-
-    # Continue the search until the frontier is empty.
-    while frontier:
-        # Pop the last state and path from the frontier (depth-first behavior).
-        current_state, path = frontier.pop()
-
-        # Check if the current state is a goal state.
-        if problem.is_goal(current_state):
-            return path  # Return the solution path.
-
-        # Skip to the next iteration if the current state has already been explored.
-        if current_state in explored:
-            continue
-
-        # Mark the current state as explored.
-        explored.add(current_state)
-
-        # Generate successor states for the current state using available actions.
-        for action in problem.get_actions(current_state):
-            next_state = problem.get_successor(current_state, action)
+    # All the nodes have the same priority so they are expanded in FIFO order (a queue).
+    # The goal test is applied when a node is generated since the first path found to a state is the shortest one.
+    return GenericBestFirstSearch(problem, initial_state, constant_priority,
+                                  goal_on_generation=True, track_costs=False, frontier_type=Frontier.INSERTION_ORDER, stats=stats)
 
-            # Create a new path by appending the current action to the existing path.
-            new_path = path + [action]
-
-            # Add the next state and its path to the frontier for further exploration.
-            frontier.append((next_state, new_path))
-
-    # Return None if the search concludes without finding a solution.
-    return None
-
-def UniformCostSearch(problem: Problem[S, A], initial_state: S) -> Solution:
+def DepthFirstSearch(problem: Problem[S, A], initial_state: S, stats: Optional[SearchStatistics] = None) -> Solution:
     #TODO: ADD YOUR CODE HERE
     # NotImplemented()
-     # Use a Priority Queue to prioritize nodes based on cost.
-    frontier = queue.PriorityQueue()
-
-    # Initialize a set to keep track of explored states.
-    explored = set()
-
-    # Initialize the tie-breaker for nodes with equal cost.
-    current_tie_breaker = 0
-
-    # Create the initial node with cost, tie-breaker, state, and an empty path.
-    initial_node = (0, current_tie_breaker, initial_state, [])
-    frontier.put(initial_node)
-
-    # Continue the search until the frontier is empty.
-    while frontier.queue:
-        # Check if the frontier is empty, indicating that no solution exists.
-        if not frontier:
-            return None
-
-        # Retrieve the node with the lowest cost from the frontier.
-        current_cost, _, current_state, path = frontier.get()
-
-        # Check if the current state is a goal state.
-        if problem.is_goal(current_state):
-            return path  # Return the solution path.
-
-        # Skip to the next iteration if the current state has already been explored.
-        if current_state in explored:
-            continue
-
-        # Mark the current state as explored.
-        explored.add(current_state)
-
-        # Generate successor states for the current state using available actions.
-        for action in problem.get_actions(current_state):
-            next_state = problem.get_successor(current_state, action)
-            new_cost = current_cost + problem.get_cost(current_state, action)
-            new_path = path + [action]
-            current_tie_breaker += 1  # Increment the tie-breaker
-
-            # Check if the next state is not in explored or in the frontier.
-            if next_state not in explored:
-                if next_state not in frontier.queue:    
-                    # If not in frontier, add the node to the priority queue.
-                    frontier.put((new_cost, current_tie_breaker, next_state, new_path))
-                else:
-                    # If in frontier, update the node with lower cost.
-                    for i, node in enumerate(frontier.queue):
-                        if node[2] == next_state:
-                            if new_cost < node[0]:
-                                # Replace the old node with the new node in the frontier.
-                                del frontier.queue[i]
-                                frontier.put((new_cost, current_tie_breaker, next_state, new_path))
-                                break
-
-    # If no solution is found, return None.
-    return None
+    # All the nodes have the same priority so they are expanded in LIFO order (a stack).
+    # A state that is generated again while it is in the frontier moves to the top with its new path.
+    return GenericBestFirstSearch(problem, initial_state, constant_priority,
+                                  tie_breaking=TieBreaking.LIFO, track_costs=False, frontier_type=Frontier.INSERTION_ORDER, stats=stats)
 
-def AStarSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction) -> Solution:
+def UniformCostSearch(problem: Problem[S, A], initial_state: S, stats: Optional[SearchStatistics] = None) -> Solution:
     #TODO: ADD YOUR CODE HERE
     # NotImplemented()
-    # Create a priority queue (frontier) to store nodes, prioritized by the sum of cost and heuristic estimate.
-    frontier = queue.PriorityQueue()
+    # The nodes are expanded in the order of their path cost (ties are broken in FIFO order).
+    return GenericBestFirstSearch(problem, initial_state, cost_priority, stats=stats)
 
-    # Set to keep track of explored states.
+def AStarSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction, deadline: Optional[float] = None,
+                stats: Optional[SearchStatistics] = None) -> Solution:
+    #TODO: ADD YOUR CODE HERE
+    # NotImplemented()
+    # The nodes are expanded in the order of their path cost plus their heuristic (ties are broken in FIFO order).
+    return GenericBestFirstSearch(problem, initial_state, astar_priority, heuristic, deadline=deadline, stats=stats)
+
+# The searches below give up optimality to find a solution faster. Like A*, they accept a deadline (a 'time.monotonic()' value):
+# weighted A* and beam search return None if they did not find a solution before it,
+# while ARA* returns the best solution it found so far.
+
+# The default weight of the heuristic in weighted A*
+DEFAULT_WEIGHT = 2.0
+
+# Weighted A* expands the nodes in the order of g + weight * h.
+# With an admissible heuristic, the solution costs at most 'weight' times the optimal cost.
+def WeightedAStarSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction,
+                        weight: float = DEFAULT_WEIGHT, deadline: Optional[float] = None,
+                        stats: Optional[SearchStatistics] = None) -> Solution:
+    return GenericBestFirstSearch(problem, initial_state, weighted_priority(weight), heuristic, deadline=deadline, stats=stats)
+
+# The default weights of ARA*: the first search uses the initial weight, and every following search
+# lowers the weight by the step until it reaches 1 (plain A*)
+DEFAULT_INITIAL_WEIGHT = 3.0
+DEFAULT_WEIGHT_STEP = 0.5
+
+# Anytime repairing A* (ARA*) runs a series of weighted A* searches with decreasing weights.
+# Instead of starting over, every search reuses the path costs found by the previous ones:
+# only the states whose path cost improved since they were last expanded (the inconsistent states) are expanded again.
+# This generator yields a tuple (solution, cost, bound) after every search, where every solution is cheaper than the previous one
+# and its cost is at most 'bound' times the optimal cost (with an admissible heuristic).
+# The last solution (with a weight of 1) is optimal if the heuristic is consistent.
+def anytime_repairing_astar(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction,
+                            initial_weight: float = DEFAULT_INITIAL_WEIGHT, weight_step: float = DEFAULT_WEIGHT_STEP,
+                            deadline: Optional[float] = None,
+                            stats: Optional[SearchStatistics] = None) -> Iterator[Tuple[Solution, float, float]]:
+    if problem.is_goal(initial_state):
+        yield [], 0, 1
+        return
+    if stats is not None:
+        problem, heuristic = stats.instrument(problem, heuristic, lambda: len(frontier), lambda: len(explored), lambda: len(costs) - 1)
+
+    # The heuristic values are stored since the priorities are recomputed whenever the weight changes
+    heuristic_values: Dict[S, float] = {}
+    def h(state: S) -> float:
+        value = heuristic_values.get(state)
+        if value is None:
+            value = heuristic_values[state] = heuristic(problem, state)
+        return value
+
+    # The best known path cost of every reached state and the state and action that it is reached from
+    costs: Dict[S, float] = {initial_state: 0}
+    parents: Dict[S, Tuple[S, A]] = {}
+    # The cheapest goal found so far
+    goal, goal_cost = None, float('inf')
+
+    weight = initial_weight
+    frontier = IndexedPriorityQueue()
+    frontier.push(initial_state, weight * h(initial_state))
     explored = set()
+    # The states whose path cost improved after they were expanded in the current search
+    inconsistent = set()
+
+    while True:
+        # Expand the states until none of them can lead to a goal cheaper than the current one (according to the weighted priority)
+        while frontier and frontier.peek()[1] < goal_cost:
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            state, _, _ = frontier.pop()
+            explored.add(state)
+            cost = costs[state]
+            for action in problem.get_actions(state):
+                next_state = problem.get_successor(state, action)
+                next_cost = cost + problem.get_cost(state, action)
+                if next_cost >= costs.get(next_state, float('inf')):
+                    continue
+                costs[next_state] = next_cost
+                parents[next_state] = (state, action)
+                if next_cost < goal_cost and problem.is_goal(next_state):
+                    goal, goal_cost = next_state, next_cost
+                if next_state in explored:
+                    inconsistent.add(next_state)
+                else:
+                    frontier.push(next_state, next_cost + weight * h(next_state))
+
+        # If no goal was found, there is no solution.
+        if goal is None:
+            return
+        path = []
+        state = goal
+        while state in parents:
+            state, action = parents[state]
+            path.append(action)
+        path.reverse()
+        # The optimal cost is at least the lowest g + h among the states that can still be expanded
+        lower_bound = min((costs[state] + h(state) for state in chain(frontier.keys(), inconsistent)), default=goal_cost)
+        bound = min(weight, goal_cost / lower_bound) if lower_bound > 0 else weight
+        yield path, goal_cost, max(bound, 1)
+
+        if weight <= 1:
+            return
+        # Lower the weight, then start the next search from the frontier and the inconsistent states
+        weight = max(1, weight - weight_step)
+        states = list(chain(frontier.keys(), inconsistent))
+        frontier = IndexedPriorityQueue()
+        for state in states:
+            frontier.push(state, costs[state] + weight * h(state))
+        explored.clear()
+        inconsistent.clear()
+
+# Runs ARA* and returns the last (best) solution it found before the deadline (or None if it did not find any).
+# If an 'info' dictionary is given, the suboptimality bound of the returned solution is written to its "bound" entry
+# (it is infinite if no solution was found).
+@collects_statistics
+def AnytimeRepairingAStarSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction,
+                                deadline: Optional[float] = None,
+                                initial_weight: float = DEFAULT_INITIAL_WEIGHT, weight_step: float = DEFAULT_WEIGHT_STEP,
+                                info: Optional[dict] = None, stats: Optional[SearchStatistics] = None) -> Solution:
+    solution, bound = None, float('inf')
+    for solution, _, bound in anytime_repairing_astar(problem, initial_state, heuristic, initial_weight, weight_step, deadline, stats):
+        if info is not None:
+            info["bound"] = bound
+    if info is not None:
+        info["bound"] = bound
+    return solution
+
+# The default number of nodes that beam search keeps in each layer
+DEFAULT_BEAM_WIDTH = 100
+
+# Beam search is a breadth first search that only keeps the 'width' most promising nodes (with the lowest g + h) of every layer,
+# so its memory and time per layer are bounded, but it may miss the solution (or only find an expensive one).
+# A node is a pair (parent node, action), so the pruned candidates and the paths that only lead to them are freed with their layer.
+# Only the states that entered the beam are remembered (at most 'width' per layer): such a state is only generated again
+# if it is reached with a lower path cost, while a pruned state may be generated again by a later layer.
+# The goal test is applied on generation.
+@collects_statistics
+def BeamSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction,
+               width: int = DEFAULT_BEAM_WIDTH, deadline: Optional[float] = None,
+               stats: Optional[SearchStatistics] = None) -> Solution:
+    if problem.is_goal(initial_state):
+        return []
+
+    # The path cost of every state that entered the beam
+    costs: Dict[S, float] = {initial_state: 0}
+    # The layer is a list of (state, path cost, node) where the root node is None
+    layer = [(initial_state, 0, None)]
+    # The number of nodes created so far (it also orders the candidates by generation)
+    created = 0
+    # The frontier of beam search is the current layer and the candidates of the next one
+    if stats is not None:
+        problem, heuristic = stats.instrument(problem, heuristic, lambda: len(layer) + len(candidates), None, lambda: created)
+    while layer:
+        # The successors of the layer, where every state maps to (g + h, order, g, node) of its cheapest node
+        candidates: Dict[S, Tuple[float, int, float, tuple]] = {}
+        for state, cost, node in layer:
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            for action in problem.get_actions(state):
+                next_state = problem.get_successor(state, action)
+                next_cost = cost + problem.get_cost(state, action)
+                if next_cost >= costs.get(next_state, float('inf')):
+                    continue
+                candidate = candidates.get(next_state)
+                if candidate is not None and next_cost >= candidate[2]:
+                    continue
+                next_node = (node, action)
+                created += 1
+                if problem.is_goal(next_state):
+                    return _beam_path(next_node)
+                candidates[next_state] = (next_cost + heuristic(problem, next_state), created, next_cost, next_node)
+        # Keep the most promising successors (ties are broken by the order of generation)
+        best = heapq.nsmallest(width, candidates.items(), key=lambda item: item[1][:2])
+        layer = []
+        for state, (f, _, cost, node) in best:
+            if f == float('inf'):
+                continue
+            costs[state] = cost
+            layer.append((state, cost, node))
+    return None
 
-    # Counter for tie-breaking when nodes have equal priority.
-    current_tie_breaker = 0
-
-    # Create the initial node using the sum of cost and heuristic estimate of the initial state.
-    initial_node = (0 + heuristic(problem, initial_state), current_tie_breaker, initial_state, [], 0, heuristic(problem, initial_state))
-
-    # Enqueue the initial node into the frontier.
-    frontier.put(initial_node)
-
-    # While the frontier is not empty:
-    while frontier.queue:
-        # If the frontier is empty, return None as no solution is found.
-        if not frontier:
+# Returns the actions from the root to a node of beam search
+def _beam_path(node: tuple) -> Solution:
+    path = []
+    while node is not None:
+        node, action = node
+        path.append(action)
+    path.reverse()
+    return path
+
+# The memory-bounded search functions below trade time for memory: they store far fewer nodes than A*
+# but may generate the same node many times. If an 'info' dictionary is given, the largest number of nodes
+# that were stored at the same time is written to its "peak_nodes" entry.
+
+# Iterative deepening A* runs a series of depth first searches, each one limited to the nodes whose f = g + h
+# does not exceed a bound. The first bound is h of the initial state and every following bound is the smallest f
+# that exceeded the previous one, so the first goal found is optimal if the heuristic is admissible.
+# Only the current path is stored (and the remaining actions of each node on it).
+# States are not remembered between paths, so the only duplicate check is against the states on the current path.
+@collects_statistics
+def IterativeDeepeningAStar(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction,
+                            info: Optional[dict] = None, stats: Optional[SearchStatistics] = None) -> Solution:
+    peak_nodes = 1
+    if info is not None:
+        info["peak_nodes"] = peak_nodes
+    # Check if the initial state is already a goal state.
+    if problem.is_goal(initial_state):
+        return []
+    # The frontier of IDA* is the current path (it has no explored set, and the duplicates are not counted)
+    if stats is not None:
+        problem, heuristic = stats.instrument(problem, heuristic, lambda: len(states))
+
+    bound = heuristic(problem, initial_state)
+    while True:
+        # The smallest f that exceeded the bound in this iteration
+        next_bound = float('inf')
+        # The current path: its states, their path costs, the actions that lead to them
+        # and an iterator over the remaining actions of each state.
+        states, costs, path = [initial_state], [0], []
+        on_path = {initial_state}
+        remaining = [iter(problem.get_actions(initial_state))]
+        while remaining:
+            action = next(remaining[-1], _EXHAUSTED)
+            # If all the actions of the last state were tried, backtrack.
+            if action is _EXHAUSTED:
+                remaining.pop()
+                on_path.remove(states.pop())
+                costs.pop()
+                if path: path.pop()
+                continue
+            state = states[-1]
+            next_state = problem.get_successor(state, action)
+            # Skip the states that would make a cycle.
+            if next_state in on_path:
+                continue
+            cost = costs[-1] + problem.get_cost(state, action)
+            f = cost + heuristic(problem, next_state)
+            # Skip the states beyond the bound, but remember the smallest f among them for the next iteration.
+            if f > bound:
+                if f < next_bound: next_bound = f
+                continue
+            if problem.is_goal(next_state):
+                path.append(action)
+                return path
+            # Go deeper.
+            states.append(next_state)
+            costs.append(cost)
+            path.append(action)
+            on_path.add(next_state)
+            remaining.append(iter(problem.get_actions(next_state)))
+            if len(states) > peak_nodes:
+                peak_nodes = len(states)
+                if info is not None:
+                    info["peak_nodes"] = peak_nodes
+        # If no state exceeded the bound, the whole (cycle free) search space was searched without finding a goal.
+        if next_bound == float('inf'):
             return None
-
-        # Dequeue a node from the frontier with the lowest priority.
-        _, _, current_state, path, cost, _ = frontier.get()
-
-        # If the current state is a goal state, return the solution path.
-        if problem.is_goal(current_state):
+        bound = next_bound
+
+# Marks the end of an actions iterator
+_EXHAUSTED = object()
+
+# The default number of nodes that the memory-bounded A* can store at the same time
+DEFAULT_NODE_BUDGET = 100_000
+
+# A node of the memory-bounded A* search tree
+class _BoundedNode:
+    __slots__ = ("state", "parent", "action", "index", "cost", "f", "depth", "actions", "next", "children", "forgotten", "in_open", "version")
+
+    def __init__(self, state, parent: Optional['_BoundedNode'], action, index: int, cost: float, f: float, depth: int) -> None:
+        self.state = state
+        self.parent = parent
+        # The action that leads from the parent to this node and its index in the parent's actions
+        self.action = action
+        self.index = index
+        self.cost = cost
+        self.f = f
+        self.depth = depth
+        # The actions of the state (listed when the node is first expanded)
+        # and the index of the next action whose successor was never generated
+        self.actions: Optional[list] = None
+        self.next = 0
+        # The stored children and the f of the children that were removed to free memory (both by action index)
+        self.children: Dict[int, '_BoundedNode'] = {}
+        self.forgotten: Dict[int, float] = {}
+        self.in_open = False
+        # Incremented whenever the node changes so that the outdated heap entries can be skipped
+        self.version = 0
+
+# Simplified memory-bounded A* (SMA*) stores at most 'node_budget' nodes.
+# It works like A*, except that the successors are generated one at a time, and when the memory is full,
+# the leaf with the highest f (the shallowest among ties) is removed and its parent remembers its f,
+# so the subtree is only generated again once it is the most promising part of the search.
+# The f of a node is raised to the lowest f among its successors once they were all generated,
+# so the removed subtrees still guide the search.
+# A successor whose state is already stored with a lower or equal path cost is a dead end,
+# since every path through it can be done at a lower or equal cost through the stored node.
+# The solution is optimal if the heuristic is admissible and the optimal path fits in the budget
+# (it must have fewer than 'node_budget' actions), otherwise the best solution that fits is returned.
+@collects_statistics
+def MemoryBoundedAStarSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction,
+                             node_budget: int = DEFAULT_NODE_BUDGET, info: Optional[dict] = None,
+                             stats: Optional[SearchStatistics] = None) -> Solution:
+    # The open nodes are kept in two heaps of (possibly outdated) entries:
+    #   'best' to find the node with the lowest f (the deepest among ties),
+    #   'worst' to find the leaf with the highest f (the shallowest among ties).
+    best, worst = [], []
+    order = 0
+    stored = 1
+    peak_nodes = 1
+    if info is not None:
+        info["peak_nodes"] = peak_nodes
+    # The stored node with the lowest path cost for every stored state
+    nodes: Dict[S, _BoundedNode] = {}
+    # The frontier of SMA* is the set of stored nodes (nodes are forgotten, so the duplicates are not counted)
+    if stats is not None:
+        problem, heuristic = stats.instrument(problem, heuristic, lambda: stored)
+
+    # Adds the node to the open nodes, or updates its entries if it changed
+    def open_node(node: _BoundedNode) -> None:
+        nonlocal order
+        node.in_open = True
+        node.version += 1
+        order += 1
+        heapq.heappush(best, (node.f, -node.depth, order, node.version, node))
+        heapq.heappush(worst, (-node.f, node.depth, order, node.version, node))
+
+    def close_node(node: _BoundedNode) -> None:
+        node.in_open = False
+        node.version += 1
+
+    # Once all the successors of a node were generated, its f is the lowest f among them.
+    # The change is propagated to the ancestors.
+    def back_up(node: _BoundedNode) -> None:
+        while node is not None and node.actions is not None and node.next == len(node.actions):
+            values = [child.f for child in node.children.values()]
+            values.extend(node.forgotten.values())
+            f = min(values, default=float('inf'))
+            if f <= node.f:
+                return
+            node.f = f
+            if node.in_open:
+                open_node(node)
+            node = node.parent
+
+    # Removes the leaf with the highest f (other than the given node) from the memory
+    def forget_worst_leaf(keep: _BoundedNode) -> bool:
+        nonlocal stored
+        kept = None
+        while worst:
+            entry = heapq.heappop(worst)
+            node = entry[4]
+            if not node.in_open or entry[3] != node.version or node.children or node.parent is None:
+                continue
+            if node is keep:
+                kept = entry
+                continue
+            if kept is not None:
+                heapq.heappush(worst, kept)
+            close_node(node)
+            parent = node.parent
+            del parent.children[node.index]
+            parent.forgotten[node.index] = node.f
+            if nodes.get(node.state) is node:
+                del nodes[node.state]
+            # The parent has a successor to generate again, so it is open (and it may have become a leaf).
+            open_node(parent)
+            stored -= 1
+            return True
+        if kept is not None:
+            heapq.heappush(worst, kept)
+        return False
+
+    root = _BoundedNode(initial_state, None, None, -1, 0, heuristic(problem, initial_state), 0)
+    nodes[initial_state] = root
+    open_node(root)
+
+    while best:
+        f, _, _, version, node = best[0]
+        if not node.in_open or version != node.version:
+            heapq.heappop(best)
+            continue
+        # If the most promising node can not lead to a goal, there is no solution within the budget.
+        if f == float('inf'):
+            return None
+        if problem.is_goal(node.state):
+            path = []
+            while node.parent is not None:
+                path.append(node.action)
+                node = node.parent
+            path.reverse()
             return path
 
-        # If the current state has already been explored, skip to the next iteration.
-        if current_state in explored:
-            continue
+        if node.actions is None:
+            node.actions = list(problem.get_actions(node.state))
+        # Pick the next successor to generate: the first one that was never generated,
+        # otherwise the forgotten one with the lowest f.
+        if node.next < len(node.actions):
+            index = node.next
+            node.next += 1
+            remembered = float('-inf')
+        else:
+            candidates = [index for index, value in node.forgotten.items() if value != float('inf')]
+            if not candidates:
+                # Every successor is either stored or a dead end (or there are none), so the f of the node is final.
+                # A node without stored children stays open with an infinite f so that it is the first to be removed.
+                back_up(node)
+                if node.children:
+                    close_node(node)
+                continue
+            index = min(candidates, key=node.forgotten.get)
+            remembered = node.forgotten.pop(index)
+
+        action = node.actions[index]
+        next_state = problem.get_successor(node.state, action)
+        cost = node.cost + problem.get_cost(node.state, action)
+        duplicate = nodes.get(next_state)
+        if duplicate is not None and duplicate.cost <= cost:
+            # The state is already stored with a lower or equal path cost (this includes cycles), so this successor is a dead end.
+            node.forgotten[index] = float('inf')
+        else:
+            depth = node.depth + 1
+            if depth >= node_budget - 1 and not problem.is_goal(next_state):
+                # The path can not be extended any further without exceeding the budget
+                child_f = float('inf')
+            else:
+                # The f of a node is never lower than the f of its parent or the f it had before it was forgotten
+                child_f = max(cost + heuristic(problem, next_state), node.f, remembered)
+            # Free a node if the memory is full
+            # (this only fails if the whole memory is taken by the path to this node, so the successor can not be stored at all)
+            if stored >= node_budget and not forget_worst_leaf(node):
+                node.forgotten[index] = float('inf')
+                continue
+            child = _BoundedNode(next_state, node, action, index, cost, child_f, depth)
+            node.children[index] = child
+            nodes[next_state] = child
+            stored += 1
+            if stored > peak_nodes:
+                peak_nodes = stored
+                if info is not None:
+                    info["peak_nodes"] = peak_nodes
+            open_node(child)
+
+        back_up(node)
+        # The node stays open while it has successors that are not stored.
+        if node.in_open and node.children and node.next == len(node.actions) and all(value == float('inf') for value in node.forgotten.values()):
+            close_node(node)
+        # Rebuild the heaps when most of their entries are outdated
+        if len(best) > 4 * stored + 64:
+            entries = [entry for entry in best if entry[4].in_open and entry[3] == entry[4].version]
+            heapq.heapify(entries)
+            best[:] = entries
+            entries = [entry for entry in worst if entry[4].in_open and entry[3] == entry[4].version]
+            heapq.heapify(entries)
+            worst[:] = entries
 
-        # Add the current state to the explored set.
-        explored.add(current_state)
-
-        # Explore the neighbors of the current state:
-        for action in problem.get_actions(current_state):
-            next_state = problem.get_successor(current_state, action)
-            new_cost = cost + problem.get_cost(current_state, action)
-            new_heuristic = heuristic(problem, next_state)
-            new_path = path + [action]
-            current_tie_breaker += 1
-
-            # If a neighbor is not in the explored set or the frontier, enqueue it with its priority.
-            if next_state not in explored:
-                if next_state not in frontier.queue:   
-                    frontier.put((new_cost + new_heuristic, current_tie_breaker, next_state, new_path, new_cost, new_heuristic))
-                # If a neighbor is in the frontier but has a lower priority, update the frontier with the new priority.
-                else:
-                    for i, (priority, _, state, _, _, _) in enumerate(frontier.queue):
-                        if state == next_state:
-                            if new_cost + new_heuristic < priority:
-                                del frontier.queue[i]
-                                frontier.put((new_cost + new_heuristic, current_tie_breaker, next_state, new_path, new_cost, new_heuristic))
-                                break
-
-    # If no solution is found, return None.
     return None
 
-
-def BestFirstSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction) -> Solution:
+def BestFirstSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction, deadline: Optional[float] = None,
+                    stats: Optional[SearchStatistics] = None) -> Solution:
     #TODO: ADD YOUR CODE HERE
     # NotImplemented()
-    # Create a priority queue (frontier) to store nodes, prioritized by heuristic estimate.
-    frontier = queue.PriorityQueue()
-
-    # Set to keep track of explored states.
-    explored = set()
+    # The nodes are expanded in the order of their heuristic (ties are broken in FIFO order).
+    # The path costs are not needed since they do not affect the order.
+    return GenericBestFirstSearch(problem, initial_state, heuristic_priority, heuristic, track_costs=False, deadline=deadline, stats=stats)
 
-    # Counter for tie-breaking when nodes have equal heuristic estimates.
-    current_tie_breaker = 0
-
-    # Create the initial node using the heuristic estimate of the initial state.
-    initial_node = (heuristic(problem, initial_state), current_tie_breaker, initial_state, [])
-
-    # Enqueue the initial node into the frontier.
-    frontier.put(initial_node)
-
-    # While the frontier is not empty:
-    while frontier.queue:
-        # If the frontier is empty, return None as no solution is found.
-        if not frontier:
-            return None
 
-        # Dequeue a node from the frontier with the lowest heuristic estimate.
-        _, _, current_state, path = frontier.get()
+# The bidirectional search functions search forward from the initial state and backward from the goal state at the same time,
+# and they stop once the two searches meet. They need a 'ReversibleProblem' which can list the predecessors of a state.
+# In the backward node store, the parent of a node is the next node on the way to the goal
+# and its action leads from the node's state to its parent's state,
+# so the path from a backward node to the goal is its solution reversed.
 
-        # If the current state is a goal state, return the solution path.
-        if problem.is_goal(current_state):
-            return path
+# Returns the path through the given forward node followed by the path from the given backward node to the goal
+def _join_paths(forward_nodes: SearchNodeStore, forward_node: int, backward_nodes: SearchNodeStore, backward_node: int) -> Solution:
+    backward_path = backward_nodes.solution(backward_node)
+    backward_path.reverse()
+    return forward_nodes.solution(forward_node) + backward_path
 
-        # If the current state has already been explored, skip to the next iteration.
-        if current_state in explored:
-            continue
+@collects_statistics
+def BidirectionalBreadthFirstSearch(problem: ReversibleProblem[S, A], initial_state: S, stats: Optional[SearchStatistics] = None) -> Solution:
+    # Check if the initial state is already a goal state.
+    if problem.is_goal(initial_state):
+        return []
+
+    # Each side has a node store, a dictionary from every reached state to its node and the last layer of reached states.
+    forward_nodes, backward_nodes = SearchNodeStore(), SearchNodeStore()
+    goal_state = problem.get_goal_state()
+    forward_reached = {initial_state: forward_nodes.add_root()}
+    backward_reached = {goal_state: backward_nodes.add_root()}
+    forward_layer, backward_layer = [initial_state], [goal_state]
+    if stats is not None:
+        problem, _ = stats.instrument(problem, None, lambda: len(forward_layer) + len(backward_layer),
+                                      lambda: len(forward_reached) + len(backward_reached), lambda: len(forward_nodes) + len(backward_nodes) - 2)
+
+    # Expand a whole layer of the side with the smaller layer until the two sides meet.
+    # Since no meeting was found before the current layer, the first meeting is a shortest path.
+    while forward_layer and backward_layer:
+        next_layer = []
+        if len(forward_layer) <= len(backward_layer):
+            for state in forward_layer:
+                node = forward_reached[state]
+                for action in problem.get_actions(state):
+                    next_state = problem.get_successor(state, action)
+                    if next_state in forward_reached:
+                        continue
+                    next_node = forward_nodes.add(node, action)
+                    forward_reached[next_state] = next_node
+                    # Check if the backward search already reached this state.
+                    if next_state in backward_reached:
+                        return _join_paths(forward_nodes, next_node, backward_nodes, backward_reached[next_state])
+                    next_layer.append(next_state)
+            forward_layer = next_layer
+        else:
+            for state in backward_layer:
+                node = backward_reached[state]
+                for previous_state, action in problem.get_predecessors(state):
+                    if previous_state in backward_reached:
+                        continue
+                    previous_node = backward_nodes.add(node, action)
+                    backward_reached[previous_state] = previous_node
+                    # Check if the forward search already reached this state.
+                    if previous_state in forward_reached:
+                        return _join_paths(forward_nodes, forward_reached[previous_state], backward_nodes, previous_node)
+                    next_layer.append(previous_state)
+            backward_layer = next_layer
+
+    # If one side runs out of states, there is no solution.
+    return None
 
-        # Add the current state to the explored set.
-        explored.add(current_state)
-
-        # Explore the neighbors of the current state:
-        for action in problem.get_actions(current_state):
-            next_state = problem.get_successor(current_state, action)
-            new_heuristic = heuristic(problem, next_state)
-            new_path = path + [action]
-            current_tie_breaker += 1
-
-            # If a neighbor is not in the explored set or the frontier, enqueue it with its path and heuristic estimate.
-            if next_state not in explored:
-                if next_state not in frontier.queue:  
-                    frontier.put((new_heuristic, current_tie_breaker, next_state, new_path))
-                # If a neighbor is in the frontier but has a lower heuristic estimate, update the frontier with the new estimate.
-                else:
-                    for i, (heuristic__, _, state, _, _, _) in enumerate(frontier.queue):
-                        if state == next_state:
-                            if new_heuristic < heuristic__:
-                                del frontier.queue[i]
-                                frontier.put((new_heuristic, current_tie_breaker, next_state, new_path))
-                                break
-
-    # If no solution is found, return None.
-    return None
\ No newline at end of file
+# One side of a bidirectional best first search
+# The priority of a state is its path cost plus its potential (if a potential function is given)
+class _SearchSide:
+    def __init__(self, root: S, potential: Optional[Callable[[S], float]]) -> None:
+        self.potential = potential
+        self.frontier = IndexedPriorityQueue()
+        self.nodes = SearchNodeStore()
+        # The best known path cost and the node of every reached state
+        self.costs: Dict[S, float] = {root: 0}
+        self.reached: Dict[S, int] = {root: self.nodes.add_root()}
+        self.explored = set()
+        self.frontier.push(root, self.priority(root, 0), self.reached[root])
+
+    def priority(self, state: S, cost: float) -> float:
+        return cost if self.potential is None else cost + self.potential(state)
+
+    # Records that 'state' can be reached from the node 'parent' with the given action and path cost.
+    # Returns True if this is better than the previously known path to the state.
+    def relax(self, state: S, parent: int, action: A, cost: float) -> bool:
+        if state in self.explored or cost >= self.costs.get(state, float('inf')):
+            return False
+        node = self.nodes.add(parent, action)
+        self.costs[state] = cost
+        self.reached[state] = node
+        self.frontier.push(state, self.priority(state, cost), node)
+        return True
+
+# A bidirectional search where each side is a uniform cost search on costs adjusted by the given potentials.
+# The search stops when the lowest priorities of the two sides add up to at least the cost of the best path found so far,
+# since no path through an unexplored state can be cheaper. This holds as long as the forward potential is consistent
+# and the backward potential is its negation.
+@collects_statistics
+def _BidirectionalBestFirstSearch(problem: ReversibleProblem[S, A], initial_state: S,
+                                  forward_potential: Optional[Callable[[S], float]],
+                                  backward_potential: Optional[Callable[[S], float]],
+                                  stats: Optional[SearchStatistics] = None) -> Solution:
+    # Check if the initial state is already a goal state.
+    if problem.is_goal(initial_state):
+        return []
+
+    forward = _SearchSide(initial_state, forward_potential)
+    backward = _SearchSide(problem.get_goal_state(), backward_potential)
+    if stats is not None:
+        problem, _ = stats.instrument(problem, None, lambda: len(forward.frontier) + len(backward.frontier),
+                                      lambda: len(forward.explored) + len(backward.explored), lambda: len(forward.nodes) + len(backward.nodes) - 2)
+
+    # The cost of the best path found so far and the forward and backward nodes where it meets
+    best_cost, meeting = float('inf'), None
+
+    while forward.frontier and backward.frontier:
+        _, forward_top, _ = forward.frontier.peek()
+        _, backward_top, _ = backward.frontier.peek()
+        # Stop when no unexplored path can be better than the best path found so far.
+        if best_cost <= forward_top + backward_top:
+            break
+
+        # Expand the side with the smaller frontier.
+        if len(forward.frontier) <= len(backward.frontier):
+            state, _, node = forward.frontier.pop()
+            forward.explored.add(state)
+            cost = forward.costs[state]
+            for action in problem.get_actions(state):
+                next_state = problem.get_successor(state, action)
+                next_cost = cost + problem.get_cost(state, action)
+                if forward.relax(next_state, node, action, next_cost) and next_state in backward.costs:
+                    # A new path through this state was found.
+                    total = next_cost + backward.costs[next_state]
+                    if total < best_cost:
+                        best_cost, meeting = total, (forward.reached[next_state], backward.reached[next_state])
+        else:
+            state, _, node = backward.frontier.pop()
+            backward.explored.add(state)
+            cost = backward.costs[state]
+            for previous_state, action in problem.get_predecessors(state):
+                previous_cost = cost + problem.get_cost(previous_state, action)
+                if backward.relax(previous_state, node, action, previous_cost) and previous_state in forward.costs:
+                    # A new path through this state was found.
+                    total = previous_cost + forward.costs[previous_state]
+                    if total < best_cost:
+                        best_cost, meeting = total, (forward.reached[previous_state], backward.reached[previous_state])
+
+    # If no path was found, there is no solution.
+    if meeting is None:
+        return None
+    return _join_paths(forward.nodes, meeting[0], backward.nodes, meeting[1])
+
+# Bidirectional Dijkstra: uniform cost search from both sides
+def BidirectionalUniformCostSearch(problem: ReversibleProblem[S, A], initial_state: S, stats: Optional[SearchStatistics] = None) -> Solution:
+    return _BidirectionalBestFirstSearch(problem, initial_state, None, None, stats=stats)
+
+# Bidirectional A*: the heuristic estimates the cost to the goal and the reverse heuristic estimates the cost from the initial state.
+# Both sides use the average of the two estimates as their potential ((h - reverse h) / 2 forward, and its negation backward),
+# which is consistent whenever both heuristics are consistent, so the returned path is optimal.
+# If no reverse heuristic is given, it is taken to be 0.
+def BidirectionalAStarSearch(problem: ReversibleProblem[S, A], initial_state: S, heuristic: HeuristicFunction,
+                             reverse_heuristic: Optional[HeuristicFunction] = None,
+                             stats: Optional[SearchStatistics] = None) -> Solution:
+    if reverse_heuristic is None:
+        reverse_heuristic = lambda *_: 0
+    # The potentials call the heuristics directly, so they are timed here
+    if stats is not None:
+        heuristic, reverse_heuristic = stats.timed_heuristic(problem, heuristic), stats.timed_heuristic(problem, reverse_heuristic)
+    def forward_potential(state: S) -> float:
+        return (heuristic(problem, state) - reverse_heuristic(problem, state)) / 2
+    def backward_potential(state: S) -> float:
+        return -forward_potential(state)
+    return _BidirectionalBestFirstSearch(problem, initial_state, forward_potential, backward_potential, stats=stats)
@@ -0,0 +1,191 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from problem import HeuristicFunction, Problem
+from search_stats import SearchStatistics
+import argparse, glob, json, multiprocessing, time
+
+# This script measures the throughput of the search functions (expanded nodes per second) on a set of levels.
+# Every run happens in a separate process so that a slow run can be stopped when it exceeds the time limit.
+# With '--stats', the detailed statistics of every run (see 'search_stats.py') are also written to a JSON lines file.
+# Example:
+#   python search_benchmark.py "levels/*.txt" --algorithms ucs astar gbfs --heuristic strong --stats stats.jsonl
+
+# Read a problem of the requested type from a file
+def load_problem(problem_type: str, path: str) -> Problem:
+    if problem_type == "sokoban":
+        from sokoban import SokobanProblem
+        return SokobanProblem.from_file(path)
+    if problem_type == "sokoban-packed":
+        from sokoban_packed import PackedSokobanProblem
+        return PackedSokobanProblem.from_file(path)
+    if problem_type == "sokoban-push":
+        from sokoban_push import SokobanPushProblem
+        return SokobanPushProblem.from_file(path)
+    if problem_type == "parking":
+        from parking import ParkingProblem
+        return ParkingProblem.from_file(path)
+    if problem_type == "graph":
+        from graph import GraphRoutingProblem
+        return GraphRoutingProblem.from_file(path)
+    if problem_type == "graph-compact":
+        from graph_compact import CompactGraphRoutingProblem
+        return CompactGraphRoutingProblem.from_file(path)
+    raise ValueError(f"Unknown problem type '{problem_type}'")
+
+# Return the heuristic with the given name for the given problem type
+def get_heuristic(problem_type: str, name: str) -> HeuristicFunction:
+    if name == "zero":
+        return lambda *_: 0
+    if problem_type in ("sokoban", "sokoban-push") and name in ("pdb", "pdb-max"):
+        import sokoban_pdb
+        return getattr(sokoban_pdb, f"{name.replace('-', '_')}_heuristic")
+    if problem_type in ("sokoban", "sokoban-push"):
+        import sokoban_heuristic
+        return getattr(sokoban_heuristic, f"{name}_heuristic")
+    if problem_type == "sokoban-packed":
+        import sokoban_heuristic
+        from sokoban_packed import unpacked_heuristic
+        return unpacked_heuristic(getattr(sokoban_heuristic, f"{name}_heuristic"))
+    if problem_type == "graph":
+        from graph import graphrouting_heuristic
+        return graphrouting_heuristic
+    if problem_type == "graph-compact":
+        from graph_compact import compact_graphrouting_heuristic
+        return compact_graphrouting_heuristic
+    raise ValueError(f"Heuristic '{name}' is not available for '{problem_type}'")
+
+# Return the reverse heuristic (an estimate of the cost from the initial state) used by the backward half of bidirectional A*
+def get_reverse_heuristic(problem_type: str, name: str) -> HeuristicFunction:
+    if name != "zero" and problem_type == "graph":
+        from graph import graphrouting_reverse_heuristic
+        return graphrouting_reverse_heuristic
+    if name != "zero" and problem_type == "graph-compact":
+        from graph_compact import compact_graphrouting_reverse_heuristic
+        return compact_graphrouting_reverse_heuristic
+    return lambda *_: 0
+
+# Return the search function with the given name and whether it needs a heuristic
+def get_search_function(name: str) -> Tuple[Callable, bool]:
+    import search, external_bfs
+    functions = {
+        "bfs": (search.BreadthFirstSearch, False),
+        "dfs": (search.DepthFirstSearch, False),
+        "ucs": (search.UniformCostSearch, False),
+        "astar": (search.AStarSearch, True),
+        "gbfs": (search.BestFirstSearch, True),
+        "idastar": (search.IterativeDeepeningAStar, True),
+        "smastar": (search.MemoryBoundedAStarSearch, True),
+        "wastar": (search.WeightedAStarSearch, True),
+        "arastar": (search.AnytimeRepairingAStarSearch, True),
+        "beam": (search.BeamSearch, True),
+        "bibfs": (search.BidirectionalBreadthFirstSearch, False),
+        "biucs": (search.BidirectionalUniformCostSearch, False),
+        "biastar": (search.BidirectionalAStarSearch, True),
+        "extbfs": (external_bfs.ExternalBreadthFirstSearch, False),
+    }
+    if name not in functions:
+        raise ValueError(f"Unknown search algorithm '{name}'")
+    return functions[name]
+
+# Run a single search in this process and return (problem, solution, expanded nodes, elapsed time).
+# If a 'SearchStatistics' object is given, the search also fills it in.
+def run_search(problem_type: str, path: str, algorithm: str, heuristic_name: str, prune_deadlocks: bool = False,
+               stats: Optional[SearchStatistics] = None) -> Tuple[Problem, Optional[list], int, float]:
+    problem = load_problem(problem_type, path)
+    if prune_deadlocks:
+        problem.prune_deadlocks = True
+    search_fn, informed = get_search_function(algorithm)
+    # Count the expanded nodes by wrapping 'get_actions' on this problem instance only
+    get_actions = problem.get_actions
+    expanded = 0
+    def counted_get_actions(state):
+        nonlocal expanded
+        expanded += 1
+        return get_actions(state)
+    problem.get_actions = counted_get_actions
+    # The backward half of the bidirectional searches expands the nodes using 'get_predecessors'
+    if hasattr(problem, "get_predecessors"):
+        get_predecessors = problem.get_predecessors
+        def counted_get_predecessors(state):
+            nonlocal expanded
+            expanded += 1
+            return get_predecessors(state)
+        problem.get_predecessors = counted_get_predecessors
+    initial_state = problem.get_initial_state()
+    # The statistics are only passed when they are requested
+    options = {} if stats is None else {"stats": stats}
+    start = time.perf_counter()
+    if algorithm == "biastar":
+        heuristic, reverse_heuristic = get_heuristic(problem_type, heuristic_name), get_reverse_heuristic(problem_type, heuristic_name)
+        solution = search_fn(problem, initial_state, heuristic, reverse_heuristic, **options)
+    elif informed:
+        solution = search_fn(problem, initial_state, get_heuristic(problem_type, heuristic_name), **options)
+    else:
+        solution = search_fn(problem, initial_state, **options)
+    elapsed = time.perf_counter() - start
+    return problem, solution, expanded, elapsed
+
+# Run a single search and send (solution length, expanded nodes, elapsed time, statistics) through the queue.
+# The statistics are a dictionary if they were requested, otherwise None.
+def _run(problem_type: str, path: str, algorithm: str, heuristic_name: str, prune_deadlocks: bool, collect_stats: bool, queue: multiprocessing.Queue):
+    stats = SearchStatistics() if collect_stats else None
+    _, solution, expanded, elapsed = run_search(problem_type, path, algorithm, heuristic_name, prune_deadlocks, stats)
+    queue.put((None if solution is None else len(solution), expanded, elapsed, None if stats is None else stats.to_dict()))
+
+# Run a single search in a child process and return its results or None if it exceeded the time limit
+def benchmark(problem_type: str, path: str, algorithm: str, heuristic_name: str, timeout: float, prune_deadlocks: bool = False,
+              collect_stats: bool = False) -> Optional[Tuple[Optional[int], int, float, Optional[dict]]]:
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run, args=(problem_type, path, algorithm, heuristic_name, prune_deadlocks, collect_stats, queue), daemon=True)
+    process.start()
+    process.join(timeout)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+        return None
+    return None if queue.empty() else queue.get()
+
+def main(args: argparse.Namespace):
+    paths: List[str] = sorted(path for pattern in args.levels for path in glob.glob(pattern))
+    if not paths:
+        print("No levels matched the given patterns")
+        return
+    header = f"{'level':<24}{'algorithm':<10}{'length':>8}{'expanded':>12}{'time (s)':>12}{'nodes/s':>12}"
+    print(header)
+    print('-' * len(header))
+    totals: Dict[str, Tuple[int, float]] = {}
+    stats_file = None if args.stats is None else open(args.stats, 'w')
+    for path in paths:
+        for algorithm in args.algorithms:
+            result = benchmark(args.problem, path, algorithm, args.heuristic, args.timeout, args.deadlocks, stats_file is not None)
+            if result is None:
+                print(f"{path:<24}{algorithm:<10}{'timeout':>8}")
+                continue
+            length, expanded, elapsed, stats = result
+            if stats_file is not None:
+                stats_file.write(json.dumps({"level": path, "algorithm": algorithm, "heuristic": args.heuristic, "length": length, **stats}) + "\n")
+            length = "-" if length is None else length
+            print(f"{path:<24}{algorithm:<10}{length:>8}{expanded:>12}{elapsed:>12.3f}{expanded/max(elapsed, 1e-9):>12.0f}")
+            total_expanded, total_elapsed = totals.get(algorithm, (0, 0.0))
+            totals[algorithm] = (total_expanded + expanded, total_elapsed + elapsed)
+    if stats_file is not None:
+        stats_file.close()
+    print('-' * len(header))
+    for algorithm, (expanded, elapsed) in totals.items():
+        print(f"{'total':<24}{algorithm:<10}{'':>8}{expanded:>12}{elapsed:>12.3f}{expanded/max(elapsed, 1e-9):>12.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the throughput of the search algorithms")
+    parser.add_argument("levels", nargs="+", help="glob patterns for the level files")
+    parser.add_argument("--problem", "-p", default="sokoban", choices=["sokoban", "sokoban-packed", "sokoban-push", "parking", "graph", "graph-compact"],
+                        help="the type of the problems stored in the level files")
+    parser.add_argument("--algorithms", "-a", nargs="+", default=["ucs", "astar", "gbfs"],
+                        help="the search algorithms to benchmark")
+    parser.add_argument("--heuristic", "-hf", default="strong",
+                        help="the heuristic used by the informed search algorithms")
+    parser.add_argument("--timeout", "-t", type=float, default=60,
+                        help="the time limit (in seconds) for each run")
+    parser.add_argument("--deadlocks", "-dl", action="store_true", default=False,
+                        help="prune the pushes that lead to deadlocks (sokoban only)")
+    parser.add_argument("--stats", "-s", default=None,
+                        help="a JSON lines file to write the detailed statistics of every run to")
+    main(parser.parse_args())
@@ -0,0 +1,139 @@
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+from dataclasses import asdict, dataclass
+from functools import wraps
+import json, time
+
+from problem import HeuristicFunction, Problem, S, A
+
+# This file contains the statistics that the search functions in 'search.py' fill in when they receive a 'stats' argument.
+# When no statistics object is given, the search runs exactly as before: the counting and timing happen in wrappers
+# around the problem methods and the heuristic, which are only installed when statistics are requested.
+# The same object can be given to several searches (for example, every step of an agent) and the values accumulate.
+# Example:
+#   stats = SearchStatistics()
+#   AStarSearch(problem, problem.get_initial_state(), strong_heuristic, stats=stats)
+#   print(stats.to_json(indent=2))
+
+@dataclass
+class SearchStatistics:
+    expanded: int = 0               # The number of expanded nodes (calls to 'get_actions' or 'get_predecessors')
+    generated: int = 0              # The number of generated successors (or predecessors)
+    duplicates: int = 0             # The generated successors that were not stored as new nodes (already explored or no better than a known path)
+    peak_frontier: int = 0          # The largest number of nodes in the frontier when a node was expanded
+    peak_closed: int = 0            # The largest number of explored states when a node was expanded
+    actions_time: float = 0         # The time (in seconds) spent in 'get_actions' and 'get_predecessors'
+    successor_time: float = 0       # The time spent in 'get_successor'
+    heuristic_time: float = 0       # The time spent in the heuristic
+    elapsed: float = 0              # The total time of the searches
+
+    # The expanded nodes per second
+    @property
+    def throughput(self) -> float:
+        return self.expanded / self.elapsed if self.elapsed > 0 else 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        values = asdict(self)
+        values["throughput"] = self.throughput
+        return values
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.to_dict(), **kwargs)
+
+    # Returns the heuristic wrapped to measure its time (or None if there is no heuristic).
+    # The wrapper calls the heuristic with the original problem, so it can be given an instrumented problem.
+    def timed_heuristic(self, problem: Problem[S, A], heuristic: Optional[HeuristicFunction]) -> Optional[HeuristicFunction]:
+        if heuristic is None:
+            return None
+        clock = time.perf_counter
+        def timed(_, state: S) -> float:
+            start = clock()
+            value = heuristic(problem, state)
+            self.heuristic_time += clock() - start
+            return value
+        return timed
+
+    # Returns the problem and the heuristic wrapped to fill in these statistics.
+    # The sizes of the search data structures are read when a node is expanded:
+    #   'frontier_size' and 'closed_size' return the current sizes of the frontier and the explored set,
+    #   'stored_size' returns the number of nodes stored by the search (other than the roots), which gives the duplicates at the end.
+    def instrument(self, problem: Problem[S, A], heuristic: Optional[HeuristicFunction] = None,
+                   frontier_size: Optional[Callable[[], int]] = None, closed_size: Optional[Callable[[], int]] = None,
+                   stored_size: Optional[Callable[[], int]] = None) -> Tuple[Problem[S, A], Optional[HeuristicFunction]]:
+        self._stored_sizes.append(stored_size)
+        return InstrumentedProblem(self, problem, frontier_size, closed_size), self.timed_heuristic(problem, heuristic)
+
+    # Called by 'collects_statistics' when a search ends
+    def finish(self, elapsed: float, generated: int) -> None:
+        self.elapsed += elapsed
+        stored = sum(size() for size in self._stored_sizes if size is not None)
+        if any(size is not None for size in self._stored_sizes):
+            self.duplicates += max(0, self.generated - generated - stored)
+        self._stored_sizes.clear()
+
+    def __post_init__(self) -> None:
+        # The stored node counters of the running search (they are not part of the statistics)
+        self._stored_sizes = []
+
+# A problem that forwards every call to another problem, but counts and measures the calls to
+# 'get_actions', 'get_successor' and 'get_predecessors' in the given statistics.
+class InstrumentedProblem:
+    def __init__(self, stats: SearchStatistics, problem: Problem[S, A],
+                 frontier_size: Optional[Callable[[], int]], closed_size: Optional[Callable[[], int]]) -> None:
+        self.stats = stats
+        self.problem = problem
+        self.frontier_size = frontier_size
+        self.closed_size = closed_size
+
+    # Every other attribute is read from the original problem
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.problem, name)
+
+    # Updates the peak sizes of the search data structures
+    def _sample(self) -> None:
+        stats = self.stats
+        if self.frontier_size is not None:
+            stats.peak_frontier = max(stats.peak_frontier, self.frontier_size())
+        if self.closed_size is not None:
+            stats.peak_closed = max(stats.peak_closed, self.closed_size())
+
+    def get_actions(self, state: S) -> Iterable[A]:
+        stats = self.stats
+        stats.expanded += 1
+        self._sample()
+        start = time.perf_counter()
+        actions = self.problem.get_actions(state)
+        stats.actions_time += time.perf_counter() - start
+        return actions
+
+    def get_successor(self, state: S, action: A) -> S:
+        stats = self.stats
+        stats.generated += 1
+        start = time.perf_counter()
+        next_state = self.problem.get_successor(state, action)
+        stats.successor_time += time.perf_counter() - start
+        return next_state
+
+    def get_predecessors(self, state: S) -> Iterable[Tuple[S, A]]:
+        stats = self.stats
+        stats.expanded += 1
+        self._sample()
+        start = time.perf_counter()
+        predecessors = list(self.problem.get_predecessors(state))
+        stats.actions_time += time.perf_counter() - start
+        stats.generated += len(predecessors)
+        return predecessors
+
+# A decorator for the search functions that accept a 'stats' argument.
+# Without statistics, the search function is called directly. Otherwise, the search is timed and the statistics are completed when it ends.
+def collects_statistics(search_fn: Callable) -> Callable:
+    @wraps(search_fn)
+    def search(*args, stats: Optional[SearchStatistics] = None, **kwargs):
+        if stats is None:
+            return search_fn(*args, **kwargs)
+        generated = stats.generated
+        start = time.perf_counter()
+        try:
+            return search_fn(*args, stats=stats, **kwargs)
+        finally:
+            stats.finish(time.perf_counter() - start, generated)
+    return search
@@ -1,9 +1,13 @@
 from dataclasses import dataclass
-from typing import FrozenSet, Iterable
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
 from enum import Enum
+import weakref
 
-from mathutils import Direction, Point
+from mathutils import Direction, Point, get_grid
 from problem import Problem
+from sokoban_deadlock import DeadlockDetector
+from zobrist import zobrist_keys
+from level_cache import LevelReader, LevelWriter, load_level
 from helpers.utils import track_call_count
 
 # This file contains the definition for the Sokoban problem
@@ -28,12 +32,29 @@ class SokobanTile(str, Enum):
 #   The walkable area (locations without walls) and the locations of the goals
 @dataclass(eq=False, frozen=True)
 class SokobanLayout:
-    __slots__ = ("width", "height", "walkable", "goals")
+    __slots__ = ("width", "height", "walkable", "goals", "__weakref__")
     width: int
     height: int
     walkable: FrozenSet[Point]
     goals: FrozenSet[Point]
 
+    # Since the states compare their layouts by identity, a process keeps a single layout object for every level
+    # and an unpickled layout is replaced by the equal layout that already exists in the process.
+    # This allows the states to be sent between processes (by the parallel searches) and still compare equal.
+    def __post_init__(self):
+        _LAYOUTS.setdefault((self.width, self.height, self.walkable, self.goals), self)
+
+    def __reduce__(self):
+        return (_shared_layout, (self.width, self.height, self.walkable, self.goals))
+
+# The layouts alive in this process (by their content). The references are weak, so a layout is dropped from the registry
+# once no problem or state uses it, and loading many levels does not keep all of them in memory.
+_LAYOUTS: 'weakref.WeakValueDictionary[Tuple[int, int, FrozenSet[Point], FrozenSet[Point]], SokobanLayout]' = weakref.WeakValueDictionary()
+
+# Returns the layout with the given content, creating it if it does not exist in this process
+def _shared_layout(width: int, height: int, walkable: FrozenSet[Point], goals: FrozenSet[Point]) -> SokobanLayout:
+    return _LAYOUTS.get((width, height, walkable, goals)) or SokobanLayout(width, height, walkable, goals)
+
 # For the sokoban state, we use dataclass with frozen=True to automatically implement:
 #   the constructor, the == operator, the hash function and to make the class immutable
 # Now it can be added to sets and used as keys in dictionaries
@@ -60,6 +81,26 @@ class SokobanState:
             return SokobanTile.EMPTY
         return '\n'.join(''.join(position_to_str(Point(x, y)) for x in range(self.layout.width)) for y in range(self.layout.height))
 
+    # The states are pickled as their fields since a frozen dataclass with slots cannot restore its fields by assignment
+    def __reduce__(self):
+        return (SokobanState, (self.layout, self.player, self.crates))
+
+# A sokoban state that also carries its Zobrist key (see 'SokobanProblem.enable_zobrist'), which is used as its hash
+# instead of hashing the crate set. The equality is inherited, so two states are still only equal if they have the same content.
+@dataclass(frozen=True, eq=False)
+class ZobristSokobanState(SokobanState):
+    __slots__ = ("zobrist",)
+    zobrist: int
+
+    def __hash__(self) -> int:
+        return self.zobrist
+
+    def __reduce__(self):
+        return (ZobristSokobanState, (self.layout, self.player, self.crates, self.zobrist))
+
+# The Zobrist keys of a layout: the key of the player and the key of a crate at every walkable cell
+ZobristKeys = Tuple[Dict[Point, int], Dict[Point, int]]
+
 # This is a list of all the possible actions for the sokoban agent
 AllSokobanActions = [
     Direction.RIGHT,
@@ -73,6 +114,26 @@ class SokobanProblem(Problem[SokobanState, Direction]):
     # The problem will contain the sokoban layout and the inital state
     layout: SokobanLayout
     initial_state: SokobanState
+    # If enabled, get_actions will not return pushes that lead to a deadlock (see sokoban_deadlock.py)
+    prune_deadlocks: bool = False
+    # If enabled (see 'enable_zobrist'), the states carry a Zobrist key that get_successor updates incrementally
+    zobrist: Optional[ZobristKeys] = None
+
+    # Enables Zobrist hashing: every player and crate cell gets a random 64-bit key
+    # and the initial state (then every successor) becomes a 'ZobristSokobanState'
+    def enable_zobrist(self, seed: int = 0) -> None:
+        cells = sorted(self.layout.walkable, key=lambda point: (point.y, point.x))
+        keys = zobrist_keys(2 * len(cells), seed)
+        self.zobrist = (dict(zip(cells, keys)), dict(zip(cells, keys[len(cells):])))
+        self.initial_state = self.zobrist_state(self.initial_state)
+
+    # Returns the given state with its Zobrist key computed from scratch (Zobrist hashing must be enabled)
+    def zobrist_state(self, state: SokobanState) -> ZobristSokobanState:
+        player_keys, crate_keys = self.zobrist
+        key = player_keys[state.player]
+        for crate in state.crates:
+            key ^= crate_keys[crate]
+        return ZobristSokobanState(state.layout, state.player, state.crates, key)
 
     def get_initial_state(self) -> SokobanState:
         return self.initial_state
@@ -84,33 +145,55 @@ class SokobanProblem(Problem[SokobanState, Direction]):
     @track_call_count
     def get_actions(self, state: SokobanState) -> Iterable[Direction]:
         actions = []
+        # The neighbours are read from the neighbour tables of the layout's grid
+        neighbors = get_grid(self.layout.width, self.layout.height).neighbors
         for direction in Direction:
-            position = state.player + direction.to_vector()
+            position = neighbors[direction][state.player]
             # Disallow walking into walls
             if position not in self.layout.walkable: continue
             # Check if walking into a crate
             if position in state.crates:
                 # make sure that the crate is not pushed into a wall or another crate
-                crate_position = position + direction.to_vector()
+                crate_position = neighbors[direction][position]
                 if crate_position not in self.layout.walkable or crate_position in state.crates:
                     continue
+                # If deadlock pruning is enabled, make sure that the push does not lead to a deadlock
+                if self.prune_deadlocks:
+                    crates = state.crates.symmetric_difference({position, crate_position})
+                    if self.deadlock_detector().is_deadlock(crates, crate_position):
+                        continue
             actions.append(direction)
         return actions
 
+    # Returns the deadlock detector of this problem's layout (it is created once and stored in the cache)
+    def deadlock_detector(self) -> DeadlockDetector:
+        detector = self.cache().get("deadlock_detector")
+        if detector is None:
+            detector = self.cache()["deadlock_detector"] = DeadlockDetector(self.layout)
+        return detector
+
     def get_successor(self, state: SokobanState, action: Direction) -> SokobanState:
-        player = state.player + action.to_vector()
+        neighbors = get_grid(self.layout.width, self.layout.height).neighbors[action]
+        player = neighbors[state.player]
         crates = state.crates
         if player not in self.layout.walkable:
             # If we try to walk into a wall, then this action is wrong
             raise Exception(f"Invalid action {action} in state:" + "\n" + str(state))
         if player in crates:
-            crate_position = player + action.to_vector()
+            crate_position = neighbors[player]
             if crate_position not in self.layout.walkable or crate_position in crates:
                 # If we try to push a crate into a wall or another crate, then this action is wrong
                 raise Exception(f"Invalid action {action} in state:" + "\n" + str(state))
             # If we walk to a crate, we push it
             crates = crates.symmetric_difference({player,crate_position})
-        return SokobanState(state.layout, player, crates)
+        if self.zobrist is None:
+            return SokobanState(state.layout, player, crates)
+        # Update the Zobrist key with the moves of the player and the pushed crate only
+        player_keys, crate_keys = self.zobrist
+        key = state.zobrist ^ player_keys[state.player] ^ player_keys[player]
+        if crates is not state.crates:
+            key ^= crate_keys[player] ^ crate_keys[crate_position]
+        return ZobristSokobanState(state.layout, player, crates, key)
 
     def get_cost(self, state: SokobanState, action: Direction) -> float:
         # All actions have the same cost
@@ -123,29 +206,52 @@ class SokobanProblem(Problem[SokobanState, Direction]):
         player: Point = None
         lines = [line for line in (line.strip() for line in text.splitlines()) if line]
         width, height = max(len(line) for line in lines), len(lines)
+        # The points are the interned points of the level's grid
+        grid = get_grid(width, height)
         for y, line in enumerate(lines):
             for x, char in enumerate(line):
                 if char != SokobanTile.WALL:
-                    walkable.add(Point(x, y))
+                    point = grid.point(x, y)
+                    walkable.add(point)
                     if char == SokobanTile.PLAYER:
-                        player = Point(x, y)
+                        player = point
                     elif char == SokobanTile.CRATE:
-                        crates.add(Point(x, y))
+                        crates.add(point)
                     elif char == SokobanTile.GOAL:
-                        goals.add(Point(x, y))
+                        goals.add(point)
                     if char == SokobanTile.PLAYER_ON_GOAL:
-                        player = Point(x, y)
-                        goals.add(Point(x, y))
+                        player = point
+                        goals.add(point)
                     elif char == SokobanTile.CRATE_ON_GOAL:
-                        crates.add(Point(x, y))
-                        goals.add(Point(x, y))
+                        crates.add(point)
+                        goals.add(point)
         problem = SokobanProblem()
-        problem.layout = SokobanLayout(width, height, frozenset(walkable), frozenset(goals))
+        problem.layout = _shared_layout(width, height, frozenset(walkable), frozenset(goals))
         problem.initial_state = SokobanState(problem.layout, player, frozenset(crates))
         return problem
 
-    # Read a sokoban problem from file containing a grid of tiles
+    # Returns the compiled fields of the problem (see 'level_cache.py'):
+    # the size, the bitmaps of the walkable cells, the goals and the crates, and the cell index of the player
+    def compile(self) -> bytes:
+        layout = self.layout
+        width, height = layout.width, layout.height
+        state = self.initial_state
+        return LevelWriter().integers((width, height), "H") \
+            .points(layout.walkable, width, height).points(layout.goals, width, height).points(state.crates, width, height) \
+            .integers((state.player.y * width + state.player.x,)).to_bytes()
+
+    # Rebuilds a sokoban problem from its compiled fields. The sets are filled in the same order as 'from_text'.
+    @staticmethod
+    def from_compiled(reader: LevelReader) -> 'SokobanProblem':
+        width, height = reader.integers("H")
+        walkable, goals, crates = reader.points(width, height), reader.points(width, height), reader.points(width, height)
+        player, = reader.integers()
+        problem = SokobanProblem()
+        problem.layout = _shared_layout(width, height, frozenset(set(walkable)), frozenset(set(goals)))
+        problem.initial_state = SokobanState(problem.layout, get_grid(width, height).point(player % width, player // width), frozenset(set(crates)))
+        return problem
+
+    # Read a sokoban problem from file containing a grid of tiles (through the compiled level cache)
     @staticmethod
     def from_file(path: str) -> 'SokobanProblem':
-        with open(path, 'r') as f:
-            return SokobanProblem.from_text(f.read())
\ No newline at end of file
+        return load_level(path, "sokoban", SokobanProblem.from_text, SokobanProblem.compile, SokobanProblem.from_compiled)
\ No newline at end of file
@@ -0,0 +1,82 @@
+from typing import FrozenSet, Set
+from collections import deque
+
+from mathutils import Direction, Point
+
+# This file contains the deadlock analysis for the Sokoban problem.
+# A deadlock is a state from which the goal can never be reached, so the search can safely skip it.
+# Two kinds of deadlocks are detected:
+#   1. Dead squares: cells from which a crate can never be pushed to any goal, even if it was the only crate in the level.
+#      These are found once per layout by pulling a crate backward from every goal;
+#      every cell that is never reached by a pull is dead.
+#   2. Frozen crates: a crate that can no longer move along either axis because it is blocked by walls,
+#      by dead squares on both sides or by other frozen crates. If any crate in such a group is not on a goal,
+#      the level can not be solved anymore. This is checked at runtime for the crate that was just pushed.
+
+# The vectors of the two axes, each given as a pair of opposite directions
+_AXES = [
+    (Direction.LEFT.to_vector(), Direction.RIGHT.to_vector()),
+    (Direction.UP.to_vector(), Direction.DOWN.to_vector()),
+]
+
+# Returns the cells from which a single crate can never be pushed to a goal.
+# A crate at 'position' can be pulled in a direction if the player can stand on the next cell
+# and step back to the cell after it, so both cells must be walkable.
+def compute_dead_squares(walkable: FrozenSet[Point], goals: FrozenSet[Point]) -> FrozenSet[Point]:
+    live: Set[Point] = set(goals)
+    frontier = deque(goals)
+    while frontier:
+        position = frontier.popleft()
+        for direction in Direction:
+            vector = direction.to_vector()
+            next_position = position + vector
+            if next_position in live: continue
+            if next_position in walkable and next_position + vector in walkable:
+                live.add(next_position)
+                frontier.append(next_position)
+    return frozenset(walkable - live)
+
+# The deadlock detector stores the layout analysis and answers whether a push leads to a deadlock
+class DeadlockDetector:
+    def __init__(self, layout: 'SokobanLayout') -> None:
+        self.walkable = layout.walkable
+        self.goals = layout.goals
+        self.dead_squares = compute_dead_squares(layout.walkable, layout.goals)
+
+    # Returns True if the state with the given crates is a deadlock,
+    # given that the crate at 'moved_crate' is the only crate that was moved since the last check.
+    def is_deadlock(self, crates: FrozenSet[Point], moved_crate: Point) -> bool:
+        if moved_crate in self.dead_squares:
+            return True
+        frozen: Set[Point] = set()
+        if not self._is_frozen(crates, moved_crate, frozen):
+            return False
+        # A group of frozen crates is only a deadlock if one of them is not on a goal
+        return not frozen.issubset(self.goals)
+
+    # Checks if the crate at the given position can not move along either axis.
+    # The crates visited during the check are added to 'frozen' and treated as walls to stop the recursion.
+    def _is_frozen(self, crates: FrozenSet[Point], position: Point, frozen: Set[Point]) -> bool:
+        frozen.add(position)
+        for backward, forward in _AXES:
+            if not self._is_blocked(crates, position + backward, position + forward, frozen):
+                return False
+        return True
+
+    # Checks if a crate between the two given cells can not move along their axis
+    def _is_blocked(self, crates: FrozenSet[Point], before: Point, after: Point, frozen: Set[Point]) -> bool:
+        walkable = self.walkable
+        # Blocked by a wall (or by a crate that is already assumed to be frozen) on either side
+        if before not in walkable or after not in walkable or before in frozen or after in frozen:
+            return True
+        # Pushing the crate along this axis would put it on a dead square in both directions
+        if before in self.dead_squares and after in self.dead_squares:
+            return True
+        # Blocked by another crate that is frozen itself
+        for neighbor in (before, after):
+            if neighbor in crates:
+                group = set(frozen)
+                if self._is_frozen(crates, neighbor, group):
+                    frozen.update(group)
+                    return True
+        return False
@@ -8,9 +8,160 @@ def weak_heuristic(problem: SokobanProblem, state: SokobanState):
     return min(manhattan_distance(state.player, crate) for crate in state.crates) - 1
 
 #TODO: Import any modules and write any functions you want to use
+from typing import Dict, FrozenSet, List, Sequence, Tuple
+from collections import OrderedDict, deque
+from mathutils import Direction, DistanceOracle, Point
+from sokoban import SokobanLayout
+from sokoban_push import SokobanPushProblem
 
+# The strong heuristic is computed by a heuristic engine which is built once per problem and stored in its cache.
+# The engine precomputes, for every goal, the minimum number of pushes needed to move a single crate
+# from every cell to that goal (taking walls into account but ignoring the other crates).
+# These are found by pulling a crate backward from the goal with a breadth first search over the walkable cells.
+# For a set of crates, the heuristic is the cost of the minimum-cost assignment of crates to distinct goals
+# (solved with the Hungarian algorithm), which is a lower bound on the number of pushes.
+# Since the assignment cost only depends on the crates, it is stored in a bounded LRU cache keyed by the crate set.
+
+# The maximum number of crate sets stored in the assignment cache of each engine
+ASSIGNMENT_CACHE_SIZE = 2**16
+
+# Returns, for every walkable cell, the minimum number of pushes needed to move a single crate from it to the given goal.
+# Cells from which the goal can not be reached are not included.
+def push_distances_to(layout: SokobanLayout, goal: Point) -> Dict[Point, int]:
+    distances = {goal: 0}
+    frontier = deque([goal])
+    while frontier:
+        position = frontier.popleft()
+        for direction in Direction:
+            vector = direction.to_vector()
+            # A crate can be pulled from 'position' to 'previous' if the player can stand on 'previous' and step back once more
+            previous = position + vector
+            if previous in distances: continue
+            if previous in layout.walkable and previous + vector in layout.walkable:
+                distances[previous] = distances[position] + 1
+                frontier.append(previous)
+    return distances
+
+# Returns the cost of the minimum-cost assignment of every row to a distinct column using the Hungarian algorithm.
+# The number of rows must not exceed the number of columns. If no assignment with a finite cost exists, it returns infinity.
+def min_cost_assignment(costs: Sequence[Sequence[float]]) -> float:
+    rows = len(costs)
+    if rows == 0:
+        return 0
+    columns = len(costs[0])
+    if rows > columns:
+        return float('inf')
+    INF = float('inf')
+    # The row and column potentials, the row matched to each column, and the previous column on the augmenting path
+    # (index 0 is a dummy column used as the start of every augmenting path)
+    u, v = [0] * (rows + 1), [0] * (columns + 1)
+    match, way = [0] * (columns + 1), [0] * (columns + 1)
+    for row in range(1, rows + 1):
+        match[0] = row
+        column = 0
+        min_values = [INF] * (columns + 1)
+        used = [False] * (columns + 1)
+        while True:
+            used[column] = True
+            current_row = match[column]
+            delta, next_column = INF, 0
+            row_costs = costs[current_row - 1]
+            for j in range(1, columns + 1):
+                if used[j]: continue
+                reduced = row_costs[j - 1] - u[current_row] - v[j]
+                if reduced < min_values[j]:
+                    min_values[j], way[j] = reduced, column
+                if min_values[j] < delta:
+                    delta, next_column = min_values[j], j
+            # No free column can be reached with a finite cost
+            if delta == INF:
+                return INF
+            for j in range(columns + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_values[j] -= delta
+            column = next_column
+            if match[column] == 0:
+                break
+        # Flip the augmenting path
+        while column:
+            previous = way[column]
+            match[column] = match[previous]
+            column = previous
+    return sum(costs[match[j] - 1][j - 1] for j in range(1, columns + 1) if match[j])
+
+# The heuristic engine holds the push distance tables of a layout, the walking distances of the player and the assignment cache
+class SokobanHeuristicEngine:
+    def __init__(self, layout: SokobanLayout, cache_size: int = ASSIGNMENT_CACHE_SIZE) -> None:
+        # The number of steps between every pair of walkable cells (ignoring the crates), see 'DistanceOracle' in 'mathutils.py'
+        self.oracle = DistanceOracle(layout.width, layout.height, layout.walkable)
+        self.goals: List[Point] = sorted(layout.goals, key=lambda point: (point.y, point.x))
+        tables = [push_distances_to(layout, goal) for goal in self.goals]
+        INF = float('inf')
+        # For every walkable cell, a tuple containing the push distance to each goal (or infinity if it is unreachable)
+        self.distances: Dict[Point, Tuple[float, ...]] = {
+            position: tuple(table.get(position, INF) for table in tables) for position in layout.walkable
+        }
+        self.cache_size = cache_size
+        self._assignments: OrderedDict = OrderedDict()
+
+    # Returns the minimum number of pushes needed to put the given crates on distinct goals (ignoring crate interactions)
+    def assignment_cost(self, crates: FrozenSet[Point]) -> float:
+        assignments = self._assignments
+        cost = assignments.get(crates)
+        if cost is not None:
+            assignments.move_to_end(crates)
+            return cost
+        cost = min_cost_assignment([self.distances[crate] for crate in crates])
+        assignments[crates] = cost
+        if len(assignments) > self.cache_size:
+            assignments.popitem(last=False)
+        return cost
+
+    # Returns the number of steps needed for the player to stand next to the nearest crate
+    # (the walking distance ignoring the crates, minus one), or infinity if no crate can be reached
+    def steps_to_crates(self, player: Point, crates: FrozenSet[Point]) -> float:
+        oracle = self.oracle
+        index, distances = oracle.index, oracle.distances
+        base = index[player] * oracle.count
+        reachable = [distance for distance in (distances[base + index[crate]] for crate in crates) if distance >= 0]
+        return min(reachable) - 1 if reachable else float('inf')
+
+# Returns the heuristic engine of the given problem (it is created once and stored in the problem's cache)
+def get_heuristic_engine(problem: SokobanProblem) -> SokobanHeuristicEngine:
+    engine = problem.cache().get("heuristic_engine")
+    if engine is None:
+        engine = problem.cache()["heuristic_engine"] = SokobanHeuristicEngine(problem.layout)
+    return engine
+
+# This heuristic returns the minimum number of pushes needed to put every crate on a distinct goal.
+# It is consistent for any problem where every push costs at least 1 (including the push-level problem in sokoban_push.py).
+def matching_heuristic(problem: SokobanProblem, state: SokobanState) -> float:
+    return get_heuristic_engine(problem).assignment_cost(state.crates)
+
+# Returns the number of steps that the player needs to stand next to the nearest crate, when the steps are part of the path cost.
+# In the push-level problems (see sokoban_push.py, including the pull problem), the player walks for free and only the pushes cost 1,
+# so adding the steps would overestimate the cost and the heuristics only keep their bound on the pushes.
+def player_steps(problem: SokobanProblem, state: SokobanState) -> float:
+    if isinstance(problem, SokobanPushProblem):
+        return 0
+    return get_heuristic_engine(problem).steps_to_crates(state.player, state.crates)
+
+# This heuristic adds to the matching heuristic the number of steps needed for the player to reach the nearest crate.
+# Before any push, the player must walk next to a crate, so the steps (walking distance around the walls - 1) are added to the pushes
+# (except in the push-level problems, where walking is free, see 'player_steps').
+# At the goal, the heuristic is 0.
 def strong_heuristic(problem: SokobanProblem, state: SokobanState) -> float:
     #TODO: ADD YOUR CODE HERE
+    if state.crates == problem.layout.goals:
+        return 0
+    return get_heuristic_engine(problem).assignment_cost(state.crates) + player_steps(problem, state)
+
+# This heuristic returns the sum of the manhattan distances between every crate and its nearest goal (ignoring walls).
+# It was the previous strong heuristic and it is kept to compare against the heuristic engine.
+def manhattan_heuristic(problem: SokobanProblem, state: SokobanState) -> float:
       # Ensure that the heuristic_cache is initialized in the problem's cache.
     if "heuristic_cache" not in problem.cache():
         problem.cache()["heuristic_cache"] = {}
@@ -0,0 +1,203 @@
+from typing import Dict, Iterable, List, Tuple
+
+from mathutils import Direction, Point
+from problem import HeuristicFunction, Problem
+from sokoban import SokobanLayout, SokobanProblem, SokobanState, SokobanTile
+from sokoban_deadlock import DeadlockDetector
+from helpers.utils import track_call_count
+
+# This file contains a compact formulation of the Sokoban problem.
+# The walkable cells of the layout are numbered in row-major order, so a state is just:
+#   the index of the player cell,
+#   and an integer bitmask where bit 'i' is set if there is a crate on cell 'i'.
+# Hashing, comparing and generating states only involves integer operations,
+# and the neighbours of every cell are looked up in a table computed once per layout.
+# The actions are the same directions as in 'SokobanProblem', so the solutions can be used interchangeably.
+
+# The directions in the order used by the neighbour table (which is the order of the enum)
+_DIRECTIONS = list(Direction)
+
+# The layout contains the cell numbering and the tables that are shared by all the states of a level
+class PackedSokobanLayout:
+    __slots__ = ("layout", "cells", "index", "neighbors", "bits", "goals")
+
+    def __init__(self, layout: SokobanLayout) -> None:
+        self.layout = layout
+        # The walkable cells sorted in row-major order
+        self.cells: List[Point] = sorted(layout.walkable, key=lambda point: (point.y, point.x))
+        # The index of every walkable cell
+        self.index: Dict[Point, int] = {point: index for index, point in enumerate(self.cells)}
+        # For every cell, a tuple containing the index of the neighbouring cell in each direction (or -1 for a wall)
+        self.neighbors: List[Tuple[int, ...]] = [
+            tuple(self.index.get(point + direction.to_vector(), -1) for direction in _DIRECTIONS)
+            for point in self.cells
+        ]
+        # The bitmask of every cell
+        self.bits: List[int] = [1 << index for index in range(len(self.cells))]
+        # The bitmask of the goal cells
+        self.goals: int = self.pack(layout.goals)
+
+    # Converts a collection of points into a bitmask
+    def pack(self, points: Iterable[Point]) -> int:
+        mask = 0
+        for point in points:
+            mask |= 1 << self.index[point]
+        return mask
+
+    # Converts a bitmask into a set of points
+    def unpack(self, mask: int) -> frozenset:
+        return frozenset(point for point, bit in zip(self.cells, self.bits) if mask & bit)
+
+# A read-only view of a crates bitmask which supports the 'in' operator on points.
+# It lets the deadlock detector check packed crates without converting them to a set.
+class _PackedCrates:
+    __slots__ = ("layout", "mask")
+
+    def __init__(self, layout: PackedSokobanLayout, mask: int) -> None:
+        self.layout = layout
+        self.mask = mask
+
+    def __contains__(self, point: Point) -> bool:
+        index = self.layout.index.get(point)
+        return index is not None and bool(self.mask & self.layout.bits[index])
+
+# The state contains a reference to the packed layout (which is only used for printing),
+# the player cell index and the crates bitmask.
+# Two states are equal if they have the same player cell and crates.
+class PackedSokobanState:
+    __slots__ = ("layout", "player", "crates")
+
+    def __init__(self, layout: PackedSokobanLayout, player: int, crates: int) -> None:
+        self.layout = layout
+        self.player = player
+        self.crates = crates
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, PackedSokobanState):
+            return NotImplemented
+        return self.player == other.player and self.crates == other.crates
+
+    def __hash__(self) -> int:
+        return hash((self.player, self.crates))
+
+    def __repr__(self) -> str:
+        return f"PackedSokobanState(player={self.player}, crates={self.crates:#x})"
+
+    # This operator will convert the state to a string containing the grid representation of the level at the current state
+    def __str__(self) -> str:
+        layout = self.layout
+        def position_to_str(position: Point) -> str:
+            index = layout.index.get(position)
+            if index is None:
+                return SokobanTile.WALL
+            is_goal = layout.goals & layout.bits[index]
+            if index == self.player:
+                return SokobanTile.PLAYER_ON_GOAL if is_goal else SokobanTile.PLAYER
+            if self.crates & layout.bits[index]:
+                return SokobanTile.CRATE_ON_GOAL if is_goal else SokobanTile.CRATE
+            if is_goal:
+                return SokobanTile.GOAL
+            return SokobanTile.EMPTY
+        return '\n'.join(''.join(position_to_str(Point(x, y)) for x in range(layout.layout.width)) for y in range(layout.layout.height))
+
+# This is the implementation of the sokoban problem on packed states
+class PackedSokobanProblem(Problem[PackedSokobanState, Direction]):
+    # The problem will contain the original sokoban layout, the packed layout and the initial state
+    layout: SokobanLayout
+    packed_layout: PackedSokobanLayout
+    initial_state: PackedSokobanState
+    # If enabled, get_actions will not return pushes that lead to a deadlock (see sokoban_deadlock.py)
+    prune_deadlocks: bool = False
+
+    def get_initial_state(self) -> PackedSokobanState:
+        return self.initial_state
+
+    def is_goal(self, state: PackedSokobanState) -> bool:
+        return state.crates == self.packed_layout.goals
+
+    # We use @track_call_count to track the number of times this function was called to count the number of explored nodes
+    @track_call_count
+    def get_actions(self, state: PackedSokobanState) -> Iterable[Direction]:
+        layout = self.packed_layout
+        neighbors, bits, crates = layout.neighbors, layout.bits, state.crates
+        actions = []
+        for direction, position in zip(_DIRECTIONS, neighbors[state.player]):
+            # Disallow walking into walls
+            if position < 0: continue
+            # Check if walking into a crate
+            if crates & bits[position]:
+                # make sure that the crate is not pushed into a wall or another crate
+                crate_position = neighbors[position][direction]
+                if crate_position < 0 or crates & bits[crate_position]:
+                    continue
+                # If deadlock pruning is enabled, make sure that the push does not lead to a deadlock
+                if self.prune_deadlocks:
+                    pushed = _PackedCrates(layout, crates ^ bits[position] ^ bits[crate_position])
+                    if self.deadlock_detector().is_deadlock(pushed, layout.cells[crate_position]):
+                        continue
+            actions.append(direction)
+        return actions
+
+    def get_successor(self, state: PackedSokobanState, action: Direction) -> PackedSokobanState:
+        layout = self.packed_layout
+        neighbors, bits = layout.neighbors, layout.bits
+        player = neighbors[state.player][action]
+        crates = state.crates
+        if player < 0:
+            # If we try to walk into a wall, then this action is wrong
+            raise Exception(f"Invalid action {action} in state:" + "\n" + str(state))
+        if crates & bits[player]:
+            crate_position = neighbors[player][action]
+            if crate_position < 0 or crates & bits[crate_position]:
+                # If we try to push a crate into a wall or another crate, then this action is wrong
+                raise Exception(f"Invalid action {action} in state:" + "\n" + str(state))
+            # If we walk to a crate, we push it
+            crates ^= bits[player] | bits[crate_position]
+        return PackedSokobanState(layout, player, crates)
+
+    def get_cost(self, state: PackedSokobanState, action: Direction) -> float:
+        # All actions have the same cost
+        return 1
+
+    # Returns the deadlock detector of this problem's layout (it is created once and stored in the cache)
+    def deadlock_detector(self) -> DeadlockDetector:
+        detector = self.cache().get("deadlock_detector")
+        if detector is None:
+            detector = self.cache()["deadlock_detector"] = DeadlockDetector(self.layout)
+        return detector
+
+    # Converts a packed state into the equivalent 'SokobanState'
+    def unpack(self, state: PackedSokobanState) -> SokobanState:
+        layout = self.packed_layout
+        return SokobanState(self.layout, layout.cells[state.player], layout.unpack(state.crates))
+
+    # Converts a 'SokobanState' into the equivalent packed state
+    def pack(self, state: SokobanState) -> PackedSokobanState:
+        layout = self.packed_layout
+        return PackedSokobanState(layout, layout.index[state.player], layout.pack(state.crates))
+
+    # Create a packed problem from an existing sokoban problem
+    @staticmethod
+    def from_problem(problem: SokobanProblem) -> 'PackedSokobanProblem':
+        packed = PackedSokobanProblem()
+        packed.layout = problem.layout
+        packed.packed_layout = PackedSokobanLayout(problem.layout)
+        packed.initial_state = packed.pack(problem.initial_state)
+        return packed
+
+    # Read a packed sokoban problem from text containing a grid of tiles
+    @staticmethod
+    def from_text(text: str) -> 'PackedSokobanProblem':
+        return PackedSokobanProblem.from_problem(SokobanProblem.from_text(text))
+
+    # Read a packed sokoban problem from file containing a grid of tiles
+    @staticmethod
+    def from_file(path: str) -> 'PackedSokobanProblem':
+        return PackedSokobanProblem.from_problem(SokobanProblem.from_file(path))
+
+# Wraps a heuristic written for 'SokobanState' so that it can be used with packed states.
+# The packed problem is passed to the heuristic since it has the same 'layout' and 'cache' as a 'SokobanProblem'.
+def unpacked_heuristic(heuristic: HeuristicFunction) -> HeuristicFunction:
+    def packed_heuristic(problem: PackedSokobanProblem, state: PackedSokobanState) -> float:
+        return heuristic(problem, problem.unpack(state))
+    return packed_heuristic
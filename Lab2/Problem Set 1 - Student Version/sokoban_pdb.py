@@ -0,0 +1,303 @@
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from collections import OrderedDict, deque
+from array import array
+import argparse, glob, hashlib, json, mmap, os, struct, tempfile, time
+
+from sokoban import SokobanLayout, SokobanProblem, SokobanState
+from sokoban_heuristic import ASSIGNMENT_CACHE_SIZE, SokobanHeuristicEngine, get_heuristic_engine, player_steps
+from mathutils import Direction, Point
+
+# This file contains pattern database (PDB) heuristics for Sokoban.
+# A pair pattern database stores, for every pair of cells (a, b) and every player cell p, the minimum number of pushes needed
+# to move two crates from a and b to two distinct goals when there are no other crates on the level and the player is at p.
+# Unlike the matching heuristic, it accounts for the interactions between the two crates (a crate can block the other one)
+# and for the side of the crates that the player can reach.
+# The value depends on the player cell (not only on the crates) so that the heuristic stays consistent:
+# a walk never changes the value and a push changes the value of a single pair by at most 1.
+#
+# The database of a layout is built offline by a breadth first search backward from the goal configurations:
+# an abstract state is the pair of crate cells and the region of the level that the player can walk to,
+# and a move pulls one of the crates (the reverse of a push).
+# The database is saved in a binary file named after a fingerprint of the layout, which is memory-mapped by the heuristic,
+# so the values are read directly from the file without loading it.
+#
+# For a state with more crates, the crates are split into groups of one or two crates.
+# Since every push moves a single crate, the pushes of the groups can be added ('additive' combination),
+# and the best split is found by dynamic programming. The 'max' combination uses the largest pair value instead.
+# Both are lower bounds on the number of pushes, so the heuristic takes the maximum of the combination
+# and the matching heuristic, then adds the steps that the player needs to reach the nearest crate (like 'strong_heuristic').
+# In the push-level problems, the player walks for free, so only the bound on the pushes is used.
+# Examples:
+#   python sokoban_pdb.py build "levels/*.txt"
+#   python sokoban_pdb.py benchmark "levels/*.txt"
+
+# The header of a pattern database file: magic, version, layout fingerprint (SHA-256) and the number of cells
+_HEADER = struct.Struct("<4sI32sI")
+_MAGIC = b"SPDB"
+_VERSION = 1
+# The stored value of the pairs that can not be solved (pairs of the same cell, dead cells and frozen pairs)
+UNSOLVABLE = 255
+
+# The folder where the pattern databases are saved and searched for
+DEFAULT_PDB_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pdbs")
+
+# Returns the walkable cells of the layout in row-major order (the cell index is the position in this list)
+def layout_cells(layout: SokobanLayout) -> List[Point]:
+    return sorted(layout.walkable, key=lambda point: (point.y, point.x))
+
+# Returns a fingerprint of the walls and the goals of the layout
+def layout_fingerprint(layout: SokobanLayout) -> bytes:
+    text = json.dumps([
+        layout.width, layout.height,
+        [(point.x, point.y) for point in layout_cells(layout)],
+        sorted((point.x, point.y) for point in layout.goals),
+    ])
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+# Returns the path of the pattern database file of the layout in the given folder
+def pdb_path(layout: SokobanLayout, directory: str = DEFAULT_PDB_DIRECTORY) -> str:
+    return os.path.join(directory, layout_fingerprint(layout).hex()[:32] + ".pdb")
+
+# Builds the pair pattern database of the layout.
+# Returns a bytearray of n*n*n values where the value of the crates at cells a and b with the player at cell p
+# is at index (a*n+b)*n+p (and (b*n+a)*n+p).
+def build_pair_database(layout: SokobanLayout) -> bytearray:
+    cells = layout_cells(layout)
+    index = {point: i for i, point in enumerate(cells)}
+    count = len(cells)
+    # For every cell, the index of the neighbouring cell in each direction (or -1 for a wall)
+    vectors = [direction.to_vector() for direction in Direction]
+    neighbors = [[index.get(point + vector, -1) for vector in vectors] for point in cells]
+    # The direction opposite to each direction (in the same order)
+    opposite = [vectors.index(Point(-vector.x, -vector.y)) for vector in vectors]
+
+    # Returns the cells that the player can walk to from the given cell without crossing the crates
+    def region(start: int, a: int, b: int) -> List[int]:
+        visited = {start}
+        stack = [start]
+        while stack:
+            cell = stack.pop()
+            for neighbor in neighbors[cell]:
+                if neighbor >= 0 and neighbor != a and neighbor != b and neighbor not in visited:
+                    visited.add(neighbor)
+                    stack.append(neighbor)
+        return list(visited)
+
+    # An abstract state is (a, b, r) where a < b are the crate cells and r is the smallest cell of the player's region
+    distances: Dict[Tuple[int, int, int], int] = {}
+    frontier = deque()
+    goals = sorted(index[goal] for goal in layout.goals)
+    for i, a in enumerate(goals):
+        for b in goals[i + 1:]:
+            # The player can be in any region of the level when the crates are on the goals
+            seen = set()
+            for start in range(count):
+                if start == a or start == b or start in seen: continue
+                cells_in_region = region(start, a, b)
+                seen.update(cells_in_region)
+                state = (a, b, min(cells_in_region))
+                distances[state] = 0
+                frontier.append(state)
+
+    while frontier:
+        state = frontier.popleft()
+        a, b, start = state
+        distance = distances[state]
+        # Pull a crate: the player stands next to it and steps away from it, and the crate follows the player
+        for player in region(start, a, b):
+            for direction, crate in enumerate(neighbors[player]):
+                if crate != a and crate != b: continue
+                behind = neighbors[player][opposite[direction]]
+                if behind < 0 or behind == a or behind == b: continue
+                other = b if crate == a else a
+                next_a, next_b = (player, other) if player < other else (other, player)
+                next_state = (next_a, next_b, min(region(behind, next_a, next_b)))
+                if next_state in distances: continue
+                distances[next_state] = distance + 1
+                frontier.append(next_state)
+
+    # Every player cell gets the value of its region
+    table = bytearray([UNSOLVABLE]) * (count * count * count)
+    for a in range(count):
+        for b in range(a + 1, count):
+            seen = set()
+            for start in range(count):
+                if start == a or start == b or start in seen: continue
+                cells_in_region = region(start, a, b)
+                seen.update(cells_in_region)
+                distance = distances.get((a, b, min(cells_in_region)))
+                if distance is None: continue
+                value = min(distance, UNSOLVABLE - 1)
+                for player in cells_in_region:
+                    table[(a * count + b) * count + player] = table[(b * count + a) * count + player] = value
+    return table
+
+# Writes the pattern database of the layout to the given path (through a temporary file so a reader never sees a partial file).
+# The temporary file has a unique name, so two processes can save the same database at the same time.
+def save_pair_database(layout: SokobanLayout, table: bytearray, path: str) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, layout_fingerprint(layout), len(layout.walkable)))
+            f.write(table)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+# Memory-maps the pattern database of the layout from the given path.
+# Returns None if the file does not exist or if it was built for another layout.
+def load_pair_database(layout: SokobanLayout, path: str) -> Optional[memoryview]:
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        magic, version, fingerprint, count = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"'{path}' is not a sokoban pattern database (version {_VERSION})")
+        if fingerprint != layout_fingerprint(layout) or count != len(layout.walkable):
+            return None
+        try:
+            # The map stays valid after the file is closed
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Some file systems can not be memory-mapped, so the values are read instead
+            f.seek(_HEADER.size)
+            return memoryview(array('B', f.read(count ** 3)))
+    return memoryview(mapped)[_HEADER.size:_HEADER.size + count ** 3]
+
+# The pattern database engine of a layout holds the pair values and the cache of the crate set values
+class PairDatabase:
+    def __init__(self, layout: SokobanLayout, values, combination: str = "additive", cache_size: int = ASSIGNMENT_CACHE_SIZE) -> None:
+        cells = layout_cells(layout)
+        self.index: Dict[Point, int] = {point: i for i, point in enumerate(cells)}
+        self.count = len(cells)
+        self.values = values
+        self.combination = combination
+        self.cache_size = cache_size
+        self._costs: OrderedDict = OrderedDict()
+
+    # Returns the value of two crate cells and a player cell (infinity if the pair can not be solved)
+    def pair(self, a: int, b: int, player: int) -> float:
+        value = self.values[(a * self.count + b) * self.count + player]
+        return float('inf') if value == UNSOLVABLE else value
+
+    # Returns the lower bound on the number of pushes for the given crates and player
+    # (the push distances of the single crates are taken from the heuristic engine)
+    def cost(self, crates: FrozenSet[Point], player: Point, engine: SokobanHeuristicEngine) -> float:
+        costs = self._costs
+        key = (crates, player)
+        cost = costs.get(key)
+        if cost is not None:
+            costs.move_to_end(key)
+            return cost
+        cells = [self.index[crate] for crate in crates]
+        player_cell = self.index[player]
+        if self.combination == "max":
+            cost = max((self.pair(a, b, player_cell) for i, a in enumerate(cells) for b in cells[i + 1:]), default=0)
+        else:
+            single_costs = [min(engine.distances[crate]) for crate in crates]
+            # best[mask] is the best split of the crates in 'mask' into singles and pairs
+            best: Dict[int, float] = {0: 0}
+            def split(mask: int) -> float:
+                value = best.get(mask)
+                if value is not None:
+                    return value
+                first = (mask & -mask).bit_length() - 1
+                rest = mask & ~(1 << first)
+                value = single_costs[first] + split(rest)
+                other_mask = rest
+                while other_mask:
+                    other = (other_mask & -other_mask).bit_length() - 1
+                    other_mask &= other_mask - 1
+                    value = max(value, self.pair(cells[first], cells[other], player_cell) + split(rest & ~(1 << other)))
+                best[mask] = value
+                return value
+            cost = split((1 << len(cells)) - 1)
+        costs[key] = cost
+        if len(costs) > self.cache_size:
+            costs.popitem(last=False)
+        return cost
+
+# Returns the pattern database engine of the problem (it is created once and stored in the problem's cache).
+# The database is memory-mapped from the PDB folder if it was built before, otherwise it is built in memory.
+def get_pair_database(problem: SokobanProblem, combination: str = "additive", directory: str = DEFAULT_PDB_DIRECTORY) -> PairDatabase:
+    key = f"pair_database_{combination}"
+    database = problem.cache().get(key)
+    if database is None:
+        values = load_pair_database(problem.layout, pdb_path(problem.layout, directory))
+        if values is None:
+            values = build_pair_database(problem.layout)
+        database = problem.cache()[key] = PairDatabase(problem.layout, values, combination)
+    return database
+
+# The pattern database heuristics: the best lower bound on the pushes (the pattern database or the matching)
+# plus the steps that the player needs to reach the nearest crate (none in the push-level problems, see 'player_steps').
+# At the goal, the heuristic is 0.
+def _pdb_heuristic(problem: SokobanProblem, state: SokobanState, combination: str) -> float:
+    if state.crates == problem.layout.goals:
+        return 0
+    engine = get_heuristic_engine(problem)
+    database = get_pair_database(problem, combination)
+    pushes = max(database.cost(state.crates, state.player, engine), engine.assignment_cost(state.crates))
+    return pushes + player_steps(problem, state)
+
+# The crates are split into singles and pairs whose pushes are added
+def pdb_heuristic(problem: SokobanProblem, state: SokobanState) -> float:
+    return _pdb_heuristic(problem, state, "additive")
+
+# The largest pair value is used
+def pdb_max_heuristic(problem: SokobanProblem, state: SokobanState) -> float:
+    return _pdb_heuristic(problem, state, "max")
+
+# Builds and saves the pattern databases of the given levels
+def build(args: argparse.Namespace):
+    paths = sorted(path for pattern in args.levels for path in glob.glob(pattern))
+    for path in paths:
+        layout = SokobanProblem.from_file(path).layout
+        start = time.perf_counter()
+        table = build_pair_database(layout)
+        output = pdb_path(layout, args.directory)
+        save_pair_database(layout, table, output)
+        print(f"{path}: {len(layout.walkable)} cells, built in {time.perf_counter() - start:.3f} seconds, saved to {output}")
+
+# Compares A* with the strong heuristic and with the pattern database heuristics on the given levels
+def benchmark(args: argparse.Namespace):
+    from search import AStarSearch
+    from sokoban_heuristic import strong_heuristic
+    heuristics = {"strong": strong_heuristic, "pdb": pdb_heuristic, "pdb-max": pdb_max_heuristic}
+    paths = sorted(path for pattern in args.levels for path in glob.glob(pattern))
+    header = f"{'level':<24}{'heuristic':<12}{'cost':>8}{'expanded':>12}{'h(start)':>10}{'time (s)':>12}"
+    print(header)
+    print('-' * len(header))
+    for path in paths:
+        for name, heuristic in heuristics.items():
+            problem = SokobanProblem.from_file(path)
+            get_actions = problem.get_actions
+            expanded = 0
+            def counted_get_actions(state):
+                nonlocal expanded
+                expanded += 1
+                return get_actions(state)
+            problem.get_actions = counted_get_actions
+            # The time includes loading (or building) the pattern database
+            start = time.perf_counter()
+            initial_value = heuristic(problem, problem.get_initial_state())
+            solution = AStarSearch(problem, problem.get_initial_state(), heuristic)
+            elapsed = time.perf_counter() - start
+            cost = "-" if solution is None else len(solution)
+            print(f"{path:<24}{name:<12}{cost:>8}{expanded:>12}{initial_value:>10}{elapsed:>12.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and benchmark the sokoban pattern databases")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="build and save the pattern databases of the given levels")
+    build_parser.add_argument("levels", nargs="+", help="glob patterns for the level files")
+    build_parser.add_argument("--directory", "-d", default=DEFAULT_PDB_DIRECTORY, help="the folder where the databases are saved")
+    build_parser.set_defaults(run=build)
+    benchmark_parser = commands.add_parser("benchmark", help="compare A* with the strong and the pattern database heuristics")
+    benchmark_parser.add_argument("levels", nargs="+", help="glob patterns for the level files")
+    benchmark_parser.set_defaults(run=benchmark)
+    args = parser.parse_args()
+    args.run(args)
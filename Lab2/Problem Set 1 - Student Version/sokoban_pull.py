@@ -0,0 +1,261 @@
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+from collections import OrderedDict, deque
+import argparse, glob, time
+
+from mathutils import Direction, Point
+from problem import Solution
+from search_nodes import SearchNodeStore
+from sokoban import SokobanLayout, SokobanProblem, SokobanState
+from sokoban_push import SokobanPush, SokobanPushProblem, expand_solution, reachable_cells
+from sokoban_heuristic import ASSIGNMENT_CACHE_SIZE, SokobanHeuristicEngine
+from helpers.utils import track_call_count
+
+# This file contains a backward (pull) formulation of the push-level sokoban problem and a bidirectional push search.
+# The backward search starts from the goal configuration (every crate on a goal) and pulls the crates until they are
+# back at their initial positions with the player in its initial region. A pull is the reverse of a push:
+# the player stands next to a crate, steps away from it and drags the crate into the cell it left.
+# Pulling a crate can never create a deadlock (it can always be pushed back), so no pruning is needed,
+# and on levels where most pushes lead into corners, the backward search has far fewer options.
+#
+# Like in 'SokobanPushProblem', the states are regular 'SokobanState' objects whose player is on the canonical cell of its region,
+# so a state reached by the forward search and by the backward search is the same object value.
+# In the goal configuration, the player can be in any region, so the backward search starts from a single state whose player is None
+# (the player can be anywhere) which is never equal to a forward state.
+#
+# An action is a pull (crate position, direction) where the crate moves one cell in the direction and the player moves two cells.
+# The pull (crate, direction) from a state is undone by the push (crate + direction, opposite direction) from the next state.
+# Example (compare the forward, backward and bidirectional searches):
+#   python sokoban_pull.py "levels/*.txt"
+
+# Returns the opposite of a direction
+def opposite(direction: Direction) -> Direction:
+    return direction.rotate(2)
+
+# Returns the pushes that undo the given pulls, in the order they should be applied
+def pulls_to_pushes(pulls: List[SokobanPush]) -> List[SokobanPush]:
+    return [(crate + direction.to_vector(), opposite(direction)) for crate, direction in reversed(pulls)]
+
+# This is the implementation of the pull-level sokoban problem, which searches from the goal configuration back to the start
+class SokobanPullProblem(SokobanPushProblem):
+    # The state that the backward search must reach: the start of the forward problem (with the player on its canonical cell)
+    target: SokobanState
+
+    def is_goal(self, state: SokobanState) -> bool:
+        if state.crates != self.target.crates:
+            return False
+        return state.player is None or state.player == self.target.player
+
+    # We use @track_call_count to track the number of times this function was called to count the number of explored nodes
+    @track_call_count
+    def get_actions(self, state: SokobanState) -> Iterable[SokobanPush]:
+        walkable, crates = self.layout.walkable, state.crates
+        # In the goal configuration, the player can start from any cell without a crate
+        reachable = walkable - crates if state.player is None else reachable_cells(self.neighbors, state.player, crates)
+        actions = []
+        # The crates are sorted so that the order of the actions does not depend on the set iteration order
+        for crate in sorted(crates, key=lambda point: (point.y, point.x)):
+            for direction in Direction:
+                vector = direction.to_vector()
+                # The player must be able to reach the cell next to the crate (where the crate goes)
+                # and step back once more into a free cell
+                position = crate + vector
+                if position not in reachable: continue
+                behind = position + vector
+                if behind not in walkable or behind in crates: continue
+                actions.append((crate, direction))
+        return actions
+
+    def get_successor(self, state: SokobanState, action: SokobanPush) -> SokobanState:
+        crate, direction = action
+        vector = direction.to_vector()
+        position, behind = crate + vector, crate + vector + vector
+        crates = state.crates
+        if crate not in crates or position in crates or behind not in self.layout.walkable or behind in crates:
+            # If there is no crate to pull or the player can not step back, then this action is wrong
+            raise Exception(f"Invalid pull {crate} {direction} in state:" + "\n" + str(state))
+        crates = crates.symmetric_difference({crate, position})
+        # After the pull, the player stands behind the crate
+        return self.normalize(SokobanState(state.layout, behind, crates))
+
+    # Create a pull-level problem whose target is the given state of a sokoban level
+    @staticmethod
+    def from_state(layout: SokobanLayout, state: SokobanState) -> 'SokobanPullProblem':
+        push_problem = SokobanPushProblem.from_state(layout, state)
+        problem = SokobanPullProblem()
+        problem.layout = layout
+        problem.neighbors = push_problem.neighbors
+        problem.target = push_problem.initial_state
+        problem.initial_state = SokobanState(layout, None, layout.goals)
+        return problem
+
+    # Create a pull-level problem from an existing sokoban problem
+    @staticmethod
+    def from_problem(problem: SokobanProblem) -> 'SokobanPullProblem':
+        return SokobanPullProblem.from_state(problem.layout, problem.initial_state)
+
+    # Read a pull-level sokoban problem from file containing a grid of tiles
+    @staticmethod
+    def from_file(path: str) -> 'SokobanPullProblem':
+        return SokobanPullProblem.from_problem(SokobanProblem.from_file(path))
+
+# Returns, for every walkable cell, the minimum number of pulls needed to move a single crate from it to the given target
+# (which is the number of pushes from the target to the cell). Cells from which the target can not be reached are not included.
+def pull_distances_to(layout: SokobanLayout, target: Point) -> Dict[Point, int]:
+    distances = {target: 0}
+    frontier = deque([target])
+    while frontier:
+        position = frontier.popleft()
+        for direction in Direction:
+            vector = direction.to_vector()
+            # A crate can be pushed from 'position' to 'next_position' if the player can stand behind it
+            next_position = position + vector
+            if next_position in distances: continue
+            if next_position in layout.walkable and position - vector in layout.walkable:
+                distances[next_position] = distances[position] + 1
+                frontier.append(next_position)
+    return distances
+
+# The heuristic engine of the backward search: the same minimum-cost assignment as the strong heuristic,
+# but the crates are assigned to the initial crate positions using the pull distances, which are precomputed once per target.
+class PullHeuristicEngine(SokobanHeuristicEngine):
+    def __init__(self, layout: SokobanLayout, targets: FrozenSet[Point], cache_size: int = ASSIGNMENT_CACHE_SIZE) -> None:
+        self.goals = sorted(targets, key=lambda point: (point.y, point.x))
+        tables = [pull_distances_to(layout, target) for target in self.goals]
+        INF = float('inf')
+        self.distances = {position: tuple(table.get(position, INF) for table in tables) for position in layout.walkable}
+        self.cache_size = cache_size
+        self._assignments = OrderedDict()
+
+# This heuristic returns the minimum number of pulls needed to bring every crate back to a distinct initial crate position.
+# Every pull moves a single crate by one cell, so it is consistent for the pull-level problem.
+def pull_heuristic(problem: SokobanPullProblem, state: SokobanState) -> float:
+    engine = problem.cache().get("pull_heuristic_engine")
+    if engine is None:
+        engine = problem.cache()["pull_heuristic_engine"] = PullHeuristicEngine(problem.layout, problem.target.crates)
+    return engine.assignment_cost(state.crates)
+
+# Searches for a plan with the fewest pushes by running a breadth first search from the start (pushes)
+# and from the goal configuration (pulls) at the same time. The side with the smaller layer expands its whole layer,
+# and once the two sides meet, the meeting with the fewest pushes in that layer is returned.
+# Returns the list of pushes from the initial state of the push problem or None if there is no solution.
+def BidirectionalPushSearch(problem: SokobanPushProblem, initial_state: SokobanState) -> Solution:
+    if problem.is_goal(initial_state):
+        return []
+    pull_problem = SokobanPullProblem.from_state(problem.layout, initial_state)
+    goal_state = pull_problem.get_initial_state()
+
+    # Each side has a node store (with the depths as costs), a dictionary from every reached state to its node and the last layer
+    forward_nodes, backward_nodes = SearchNodeStore(with_costs=True), SearchNodeStore(with_costs=True)
+    forward_reached = {initial_state: forward_nodes.add_root()}
+    backward_reached = {goal_state: backward_nodes.add_root()}
+    forward_layer, backward_layer = [initial_state], [goal_state]
+
+    while forward_layer and backward_layer:
+        # The best meeting found in this layer as (pushes, forward node, backward node)
+        best: Optional[Tuple[float, int, int]] = None
+        next_layer = []
+        if len(forward_layer) <= len(backward_layer):
+            for state in forward_layer:
+                node = forward_reached[state]
+                depth = forward_nodes.cost(node)
+                for action in problem.get_actions(state):
+                    next_state = problem.get_successor(state, action)
+                    if next_state in forward_reached:
+                        continue
+                    next_node = forward_nodes.add(node, action, depth + 1)
+                    forward_reached[next_state] = next_node
+                    next_layer.append(next_state)
+                    # A goal state meets the backward root, otherwise check if the backward search already reached this state
+                    meeting = backward_reached[goal_state] if problem.is_goal(next_state) else backward_reached.get(next_state)
+                    if meeting is not None:
+                        total = depth + 1 + backward_nodes.cost(meeting)
+                        if best is None or total < best[0]:
+                            best = (total, next_node, meeting)
+            forward_layer = next_layer
+        else:
+            for state in backward_layer:
+                node = backward_reached[state]
+                depth = backward_nodes.cost(node)
+                for action in pull_problem.get_actions(state):
+                    next_state = pull_problem.get_successor(state, action)
+                    if next_state in backward_reached:
+                        continue
+                    next_node = backward_nodes.add(node, action, depth + 1)
+                    backward_reached[next_state] = next_node
+                    next_layer.append(next_state)
+                    # Check if the forward search already reached this state
+                    meeting = forward_reached.get(next_state)
+                    if meeting is not None:
+                        total = depth + 1 + forward_nodes.cost(meeting)
+                        if best is None or total < best[0]:
+                            best = (total, meeting, next_node)
+            backward_layer = next_layer
+        if best is not None:
+            _, forward_node, backward_node = best
+            return forward_nodes.solution(forward_node) + pulls_to_pushes(backward_nodes.solution(backward_node))
+
+    # If one side runs out of states, there is no solution.
+    return None
+
+# Searches the pull-level problem from the goal configuration with the given search function (and heuristic)
+# and returns the pushes from the initial state of the push problem, or None if there is no solution.
+def backward_push_search(problem: SokobanPushProblem, initial_state: SokobanState, search_fn, heuristic=None) -> Solution:
+    pull_problem = SokobanPullProblem.from_state(problem.layout, initial_state)
+    start = pull_problem.get_initial_state()
+    pulls = search_fn(pull_problem, start) if heuristic is None else search_fn(pull_problem, start, heuristic)
+    return None if pulls is None else pulls_to_pushes(pulls)
+
+# Solves a sokoban level with the bidirectional push search and returns the directions that the player should follow
+# from the given state, or None if there is no solution.
+def solve_bidirectional(problem: SokobanProblem, state: SokobanState) -> Optional[List[Direction]]:
+    push_problem = SokobanPushProblem.from_state(problem.layout, state)
+    pushes = BidirectionalPushSearch(push_problem, push_problem.get_initial_state())
+    return None if pushes is None else expand_solution(push_problem, state, pushes)
+
+# Compares the forward push search, the backward pull search and the bidirectional search on a set of levels.
+# Every plan is expanded into directions and checked on the original sokoban problem.
+def main(args: argparse.Namespace):
+    import search
+    from sokoban_heuristic import matching_heuristic
+    from helpers.utils import fetch_tracked_call_count
+    paths: List[str] = sorted(path for pattern in args.levels for path in glob.glob(pattern))
+    if not paths:
+        print("No levels matched the given patterns")
+        return
+    searches = {
+        "forward bfs": lambda problem, state: search.BreadthFirstSearch(problem, state),
+        "backward bfs": lambda problem, state: backward_push_search(problem, state, search.BreadthFirstSearch),
+        "bidirectional": BidirectionalPushSearch,
+        "forward a*": lambda problem, state: search.AStarSearch(problem, state, matching_heuristic),
+        "backward a*": lambda problem, state: backward_push_search(problem, state, search.AStarSearch, pull_heuristic),
+    }
+    header = f"{'level':<24}{'search':<16}{'pushes':>8}{'steps':>8}{'expanded':>12}{'time (s)':>12}"
+    print(header)
+    print('-' * len(header))
+    for path in paths:
+        problem = SokobanProblem.from_file(path)
+        for name in args.searches:
+            push_problem = SokobanPushProblem.from_problem(problem)
+            fetch_tracked_call_count(SokobanPushProblem.get_actions)
+            fetch_tracked_call_count(SokobanPullProblem.get_actions)
+            start = time.perf_counter()
+            pushes = searches[name](push_problem, push_problem.get_initial_state())
+            elapsed = time.perf_counter() - start
+            expanded = fetch_tracked_call_count(SokobanPushProblem.get_actions) + fetch_tracked_call_count(SokobanPullProblem.get_actions)
+            if pushes is None:
+                print(f"{path:<24}{name:<16}{'-':>8}{'-':>8}{expanded:>12}{elapsed:>12.3f}")
+                continue
+            directions = expand_solution(push_problem, problem.initial_state, pushes)
+            state = problem.initial_state
+            for direction in directions:
+                state = problem.get_successor(state, direction)
+            steps = len(directions) if problem.is_goal(state) else "invalid"
+            print(f"{path:<24}{name:<16}{len(pushes):>8}{steps:>8}{expanded:>12}{elapsed:>12.3f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the forward, backward (pull) and bidirectional push searches on sokoban levels")
+    parser.add_argument("levels", nargs="+", help="glob patterns for the level files")
+    parser.add_argument("--searches", "-s", nargs="+", default=["forward bfs", "backward bfs", "bidirectional", "forward a*", "backward a*"],
+                        choices=["forward bfs", "backward bfs", "bidirectional", "forward a*", "backward a*"],
+                        help="the searches to compare")
+    main(parser.parse_args())
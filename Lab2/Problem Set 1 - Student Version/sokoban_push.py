@@ -0,0 +1,202 @@
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from collections import deque
+import time
+
+from agents import GoalBasedAgent
+from mathutils import Direction, Point
+from problem import HeuristicFunction, Problem, Solution
+from sokoban import SokobanLayout, SokobanProblem, SokobanState
+from sokoban_deadlock import DeadlockDetector
+from helpers.utils import track_call_count
+
+# This file contains a push-level formulation of the Sokoban problem.
+# In 'SokobanProblem', every step of the player is an action, so most of the search is spent on walks that do not move any crate.
+# Here, an action is a push of a crate in some direction, and the player walks to the cell behind the crate for free.
+# Since the exact player position does not matter between pushes, only the region that the player can reach does,
+# the player is always moved to the canonical cell of its region (the top-most then left-most reachable cell).
+# So all the states that differ only by a player walk become the same state.
+#
+# The states are regular 'SokobanState' objects (with the player on its canonical cell),
+# so they can be printed and passed to the sokoban heuristics as usual.
+# Every push costs 1, so the optimal solutions minimize the number of pushes (not the number of steps).
+# A solution can be expanded back to a list of directions using 'expand_solution'.
+
+# An action is the position of the crate to push and the direction to push it in
+SokobanPush = Tuple[Point, Direction]
+
+# Returns the set of cells that the player can reach from the given position without pushing any crate
+def reachable_cells(neighbors: Dict[Point, List[Tuple[Direction, Point]]], player: Point, crates: Iterable[Point]) -> Set[Point]:
+    reached = {player}
+    frontier = [player]
+    while frontier:
+        position = frontier.pop()
+        for _, next_position in neighbors[position]:
+            if next_position not in reached and next_position not in crates:
+                reached.add(next_position)
+                frontier.append(next_position)
+    return reached
+
+# Returns the canonical cell (top-most then left-most) of the given region
+def canonical_cell(region: Iterable[Point]) -> Point:
+    return min(region, key=lambda point: (point.y, point.x))
+
+# This is the implementation of the push-level sokoban problem
+class SokobanPushProblem(Problem[SokobanState, SokobanPush]):
+    # The problem will contain the sokoban layout and the inital state (with the player on its canonical cell)
+    layout: SokobanLayout
+    initial_state: SokobanState
+    # For every walkable cell, a list of (direction, neighbouring cell) for the walkable neighbours
+    neighbors: Dict[Point, List[Tuple[Direction, Point]]]
+    # If enabled, get_actions will not return pushes that lead to a deadlock (see sokoban_deadlock.py)
+    prune_deadlocks: bool = False
+
+    def get_initial_state(self) -> SokobanState:
+        return self.initial_state
+
+    def is_goal(self, state: SokobanState) -> bool:
+        return self.layout.goals == state.crates
+
+    # We use @track_call_count to track the number of times this function was called to count the number of explored nodes
+    @track_call_count
+    def get_actions(self, state: SokobanState) -> Iterable[SokobanPush]:
+        walkable, crates = self.layout.walkable, state.crates
+        reachable = reachable_cells(self.neighbors, state.player, crates)
+        actions = []
+        # The crates are sorted so that the order of the actions does not depend on the set iteration order
+        for crate in sorted(crates, key=lambda point: (point.y, point.x)):
+            for direction in Direction:
+                vector = direction.to_vector()
+                # The player must be able to reach the cell behind the crate
+                if crate - vector not in reachable: continue
+                # make sure that the crate is not pushed into a wall or another crate
+                crate_position = crate + vector
+                if crate_position not in walkable or crate_position in crates: continue
+                # If deadlock pruning is enabled, make sure that the push does not lead to a deadlock
+                if self.prune_deadlocks:
+                    pushed = crates.symmetric_difference({crate, crate_position})
+                    if self.deadlock_detector().is_deadlock(pushed, crate_position):
+                        continue
+                actions.append((crate, direction))
+        return actions
+
+    def get_successor(self, state: SokobanState, action: SokobanPush) -> SokobanState:
+        crate, direction = action
+        vector = direction.to_vector()
+        crate_position = crate + vector
+        crates = state.crates
+        if crate not in crates or crate_position not in self.layout.walkable or crate_position in crates:
+            # If there is no crate to push or it is pushed into a wall or another crate, then this action is wrong
+            raise Exception(f"Invalid push {crate} {direction} in state:" + "\n" + str(state))
+        crates = crates.symmetric_difference({crate, crate_position})
+        # After the push, the player stands where the crate was
+        return self.normalize(SokobanState(state.layout, crate, crates))
+
+    def get_cost(self, state: SokobanState, action: SokobanPush) -> float:
+        # All pushes have the same cost
+        return 1
+
+    # Moves the player of the given state to the canonical cell of its reachable region
+    def normalize(self, state: SokobanState) -> SokobanState:
+        player = canonical_cell(reachable_cells(self.neighbors, state.player, state.crates))
+        return state if player == state.player else SokobanState(state.layout, player, state.crates)
+
+    # Returns the deadlock detector of this problem's layout (it is created once and stored in the cache)
+    def deadlock_detector(self) -> DeadlockDetector:
+        detector = self.cache().get("deadlock_detector")
+        if detector is None:
+            detector = self.cache()["deadlock_detector"] = DeadlockDetector(self.layout)
+        return detector
+
+    # Create a push-level problem starting from the given state of a sokoban level
+    @staticmethod
+    def from_state(layout: SokobanLayout, state: SokobanState) -> 'SokobanPushProblem':
+        problem = SokobanPushProblem()
+        problem.layout = layout
+        problem.neighbors = {
+            position: [(direction, position + direction.to_vector()) for direction in Direction if position + direction.to_vector() in layout.walkable]
+            for position in layout.walkable
+        }
+        problem.initial_state = problem.normalize(state)
+        return problem
+
+    # Create a push-level problem from an existing sokoban problem
+    @staticmethod
+    def from_problem(problem: SokobanProblem) -> 'SokobanPushProblem':
+        return SokobanPushProblem.from_state(problem.layout, problem.initial_state)
+
+    # Read a push-level sokoban problem from file containing a grid of tiles
+    @staticmethod
+    def from_file(path: str) -> 'SokobanPushProblem':
+        return SokobanPushProblem.from_problem(SokobanProblem.from_file(path))
+
+# Returns the shortest list of directions that walks the player from 'start' to 'target' without pushing any crate,
+# or None if the target can not be reached.
+def find_walk(neighbors: Dict[Point, List[Tuple[Direction, Point]]], crates: Iterable[Point], start: Point, target: Point) -> Optional[List[Direction]]:
+    parents: Dict[Point, Tuple[Point, Direction]] = {start: None}
+    frontier = deque([start])
+    while frontier:
+        position = frontier.popleft()
+        if position == target:
+            walk = []
+            while parents[position] is not None:
+                position, direction = parents[position]
+                walk.append(direction)
+            walk.reverse()
+            return walk
+        for direction, next_position in neighbors[position]:
+            if next_position not in parents and next_position not in crates:
+                parents[next_position] = (position, direction)
+                frontier.append(next_position)
+    return None
+
+# Expands a list of pushes (starting from the given state where the player is at its actual position)
+# into the list of directions that the player should follow in the original sokoban problem.
+def expand_solution(problem: SokobanPushProblem, state: SokobanState, pushes: List[SokobanPush]) -> List[Direction]:
+    player, crates = state.player, state.crates
+    directions = []
+    for crate, direction in pushes:
+        walk = find_walk(problem.neighbors, crates, player, crate - direction.to_vector())
+        if walk is None:
+            raise Exception(f"Invalid push {crate} {direction}: the player can not reach the crate")
+        directions.extend(walk)
+        directions.append(direction)
+        crates = crates.symmetric_difference({crate, crate + direction.to_vector()})
+        player = crate
+    return directions
+
+# This agent searches the push-level problem, then follows the expanded solution in the original sokoban problem.
+# The search function can be uninformed (if no heuristic is given) or informed.
+# Like 'InformedSearchAgent', an informed search can be given a time budget (in seconds).
+class SokobanPushAgent(GoalBasedAgent[SokobanState, Direction]):
+    def __init__(self, search_fn: Callable[..., Solution], heuristic: Optional[HeuristicFunction] = None, prune_deadlocks: bool = False,
+                 time_budget: Optional[float] = None) -> None:
+        super().__init__()
+        self.search_fn = search_fn
+        self.heuristic = heuristic
+        self.time_budget = time_budget
+        self.prune_deadlocks = prune_deadlocks
+        # The policy will store the action to do for each state so as not to search again after each observation
+        self.policy: Dict[SokobanState, Direction] = {}
+
+    def act(self, problem: SokobanProblem, state: SokobanState) -> Direction:
+        # This state is not stored in the policy, we need to search for a solution
+        if state not in self.policy:
+            push_problem = SokobanPushProblem.from_state(problem.layout, state)
+            push_problem.prune_deadlocks = self.prune_deadlocks
+            initial_state = push_problem.get_initial_state()
+            if self.heuristic is None:
+                pushes = self.search_fn(push_problem, initial_state)
+            elif self.time_budget is None:
+                pushes = self.search_fn(push_problem, initial_state, self.heuristic)
+            else:
+                pushes = self.search_fn(push_problem, initial_state, self.heuristic, deadline=time.monotonic() + self.time_budget)
+            # if no solution was found, we return None
+            if pushes is None:
+                self.policy[state] = None
+                return None
+            # Otherwise, we expand the pushes and store the action to do in each state into the policy
+            current = state
+            for action in expand_solution(push_problem, state, pushes):
+                self.policy[current] = action
+                current = problem.get_successor(current, action)
+        return self.policy.get(state)
@@ -0,0 +1,167 @@
+from typing import Dict, Generic, Iterable, List, Optional
+from array import array
+import argparse, random, sys, time, tracemalloc
+
+from problem import S
+
+# This file contains the tools for compact duplicate detection:
+#   Zobrist keys: a random 64-bit key is assigned to every (piece, cell) pair and the key of a state is the XOR
+#   of the keys of its pieces. Moving a piece only needs two XORs, so the problems that enable Zobrist hashing
+#   ('SokobanProblem.enable_zobrist' and 'ParkingProblem.enable_zobrist') update the key in 'get_successor'
+#   and use it as the hash of the state instead of hashing the crate set or the car tuple on every lookup.
+#   A fingerprint set: a closed set that only stores the 64-bit fingerprint of every state in an open addressing table
+#   (an unboxed array), instead of keeping the state objects alive. Two different states with the same fingerprint
+#   are considered equal, which is very unlikely with 64 bits (about n^2 / 2^65 for n states).
+#   The exact-verify mode also keeps the states to detect such collisions, so it is only meant for testing.
+# Example (compare the memory and time of A* with the different closed sets):
+#   python zobrist.py levels/level4.txt --heuristic strong
+
+# Returns 'count' random 64-bit keys (the same seed always gives the same keys)
+def zobrist_keys(count: int, seed: int = 0) -> List[int]:
+    rng = random.Random(seed)
+    return [rng.getrandbits(64) for _ in range(count)]
+
+_MASK = (1 << 64) - 1
+
+# Returns the 64-bit fingerprint of a state: its Zobrist key if it has one, otherwise its hash
+def fingerprint(state) -> int:
+    key = getattr(state, "zobrist", None)
+    return hash(state) & _MASK if key is None else key
+
+# The initial capacity of a fingerprint set (it must be a power of 2)
+_INITIAL_CAPACITY = 1 << 10
+
+# A set of states that only stores their fingerprints in an open addressing table with linear probing.
+# The value 0 marks an empty slot, so a fingerprint of 0 is stored as 1.
+class FingerprintSet(Generic[S]):
+    def __init__(self, states: Iterable[S] = (), verify: bool = False) -> None:
+        self.table = array('Q', bytes(8 * _INITIAL_CAPACITY))
+        self.mask = _INITIAL_CAPACITY - 1
+        self.size = 0
+        # In exact-verify mode, the stored state of every fingerprint and the number of detected collisions
+        self.states: Optional[Dict[int, S]] = {} if verify else None
+        self.collisions = 0
+        for state in states:
+            self.add(state)
+
+    def __len__(self) -> int:
+        return self.size
+
+    # Returns the slot of the fingerprint, or the empty slot where it should be inserted
+    def _slot(self, key: int) -> int:
+        table, mask = self.table, self.mask
+        index = key & mask
+        while True:
+            stored = table[index]
+            if stored == key or stored == 0:
+                return index
+            index = (index + 1) & mask
+
+    def __contains__(self, state: S) -> bool:
+        key = fingerprint(state) or 1
+        if self.table[self._slot(key)] != key:
+            return False
+        if self.states is not None and self.states[key] != state:
+            # A different state has the same fingerprint
+            self.collisions += 1
+            return False
+        return True
+
+    def add(self, state: S) -> None:
+        key = fingerprint(state) or 1
+        index = self._slot(key)
+        if self.table[index] == key:
+            if self.states is not None and self.states[key] != state:
+                self.collisions += 1
+            return
+        self.table[index] = key
+        self.size += 1
+        if self.states is not None:
+            self.states[key] = state
+        # Keep the load factor at most 1/2 so the probe sequences stay short
+        if 2 * self.size > len(self.table):
+            self._grow()
+
+    def _grow(self) -> None:
+        old_table = self.table
+        self.table = array('Q', bytes(16 * len(old_table)))
+        self.mask = len(self.table) - 1
+        table, mask = self.table, self.mask
+        for key in old_table:
+            if key:
+                index = key & mask
+                while table[index]:
+                    index = (index + 1) & mask
+                table[index] = key
+
+    # The number of bytes used by the fingerprints (the table only)
+    def memory(self) -> int:
+        return self.table.itemsize * len(self.table)
+
+# Compares A* with a regular closed set, with Zobrist hashing, and with Zobrist hashing and a fingerprint set
+def main(args: argparse.Namespace):
+    from sokoban import SokobanProblem
+    from parking import ParkingProblem
+    from best_first import GenericBestFirstSearch, astar_priority, cost_priority
+    if args.problem == "parking":
+        load, heuristic, priority = ParkingProblem.from_file, None, cost_priority
+    else:
+        import sokoban_heuristic
+        load, heuristic, priority = SokobanProblem.from_file, getattr(sokoban_heuristic, f"{args.heuristic}_heuristic"), astar_priority
+    variants = {
+        "set": (False, set),
+        "zobrist+set": (True, set),
+        "zobrist+fingerprints": (True, FingerprintSet),
+        "zobrist+verify": (True, lambda: FingerprintSet(verify=True)),
+    }
+    header = f"{'closed set':<24}{'cost':>8}{'closed':>10}{'closed (MB)':>14}{'peak (MB)':>12}{'time (s)':>12}"
+    print(header)
+    print('-' * len(header))
+    for name, (use_zobrist, closed_set_type) in variants.items():
+        problem = load(args.level)
+        if use_zobrist:
+            problem.enable_zobrist()
+        closed_set = closed_set_type()
+        tracemalloc.start()
+        start = time.perf_counter()
+        solution = GenericBestFirstSearch(problem, problem.get_initial_state(), priority, heuristic, closed_set=closed_set)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        # The memory held by the closed set alone: the table of fingerprints or the set and the states only it refers to
+        closed_memory = closed_set.memory() if isinstance(closed_set, FingerprintSet) and closed_set.states is None else closed_set_memory(closed_set)
+        tracemalloc.stop()
+        cost = "-" if solution is None else sum(problem.get_cost(state, action) for state, action in _replay(problem, solution))
+        print(f"{name:<24}{cost:>8}{len(closed_set):>10}{closed_memory / 2**20:>14.2f}{peak / 2**20:>12.2f}{elapsed:>12.3f}")
+
+# Yields the (state, action) pairs of a solution
+def _replay(problem, solution):
+    state = problem.get_initial_state()
+    for action in solution:
+        yield state, action
+        state = problem.get_successor(state, action)
+
+# Estimates the memory of a closed set of states: the set itself and the objects of the states (shared objects are counted once)
+def closed_set_memory(closed_set) -> int:
+    seen = set()
+    def size(value) -> int:
+        if id(value) in seen or isinstance(value, type) or value is None:
+            return 0
+        seen.add(id(value))
+        total = sys.getsizeof(value)
+        if isinstance(value, (tuple, list, frozenset, set)):
+            total += sum(size(item) for item in value)
+        elif hasattr(value, "__slots__"):
+            total += sum(size(getattr(value, name, None)) for cls in type(value).__mro__ for name in getattr(cls, "__slots__", ()) if name != "layout")
+        return total
+    if isinstance(closed_set, FingerprintSet):
+        return closed_set.memory() + size(closed_set.states) + sum(size(state) for state in closed_set.states.values())
+    return size(closed_set)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the closed sets of A* with and without Zobrist fingerprints")
+    parser.add_argument("level", help="path to the level file")
+    parser.add_argument("--problem", "-p", default="sokoban", choices=["sokoban", "parking"],
+                        help="the type of the problem (parking uses uniform cost search)")
+    parser.add_argument("--heuristic", "-hf", default="strong", choices=["weak", "strong"],
+                        help="the heuristic used by A* on sokoban levels")
+    main(parser.parse_args())
@@ -3,11 +3,12 @@ from copy import deepcopy
 from typing import Iterable, List, Optional, Set, Tuple
 from enum import Enum
 
-from mathutils import Direction, Point
+from mathutils import DistanceOracle, Direction, Point, get_grid
 from game import Game
 from helpers.utils import track_call_count
 from helpers.mt19937 import RandomGenerator
 from agents import Agent
+from level_cache import LevelReader, LevelWriter, load_level
 
 # This file contains the definition for the Dungeon Crawler game
 # In this problem, the agent can move Up, Down, Left, Right or stay idle
@@ -136,10 +137,12 @@ class DungeonGame(Game[DungeonState, Direction]):
         return state.turn
 
     def get_actions(self, state: DungeonState) -> Iterable[Direction]:
+        # The neighbours are read from the neighbour tables of the layout's grid
+        neighbors = get_grid(state.layout.width, state.layout.height).neighbors
         if state.turn == 0:
             # Find an return actions to be done by the player
             position_position = state.player.position
-            positions = ((direction, position_position + direction.to_vector()) for direction in Direction)
+            positions = ((direction, neighbors[direction][position_position]) for direction in Direction)
             # prevent the player from getting into a wall
             return [direction for direction, position in positions if position in state.layout.walkable]
         else:
@@ -148,16 +151,17 @@ class DungeonGame(Game[DungeonState, Direction]):
             if not state.monsters[index].alive: return []
             monster_locations = {monster.position for i, monster in enumerate(state.monsters) if i != index and monster.alive} 
             monster_position = state.monsters[index].position
-            positions = ((direction, monster_position + direction.to_vector()) for direction in Direction)
+            positions = ((direction, neighbors[direction][monster_position]) for direction in Direction)
             # prevent the monster from getting into a wall or another monster
             return [direction for direction, position in positions if position in state.layout.walkable and position not in monster_locations]
 
     def get_successor(self, state: DungeonState, action: Direction) -> DungeonState:
         state = deepcopy(state)
         current_turn = state.turn
+        grid = get_grid(state.layout.width, state.layout.height)
         if current_turn == 0:
             # This action is done by the player
-            new_position = state.player.position + action.to_vector()
+            new_position = grid.neighbor(state.player.position, action)
             state.player.position = new_position
             if new_position in state.coins:
                 # If we walk over a coin, we take it
@@ -186,7 +190,7 @@ class DungeonGame(Game[DungeonState, Direction]):
         else:
             # This action is done by a monster
             monster = state.monsters[current_turn - 1]
-            new_position = monster.position + action.to_vector()
+            new_position = grid.neighbor(monster.position, action)
             monster.position = new_position
             if new_position == state.player.position:
                 if state.player.inventory.daggers != 0:
@@ -212,33 +216,63 @@ class DungeonGame(Game[DungeonState, Direction]):
         exit: Point = None
         lines = [line for line in (line.strip() for line in text.splitlines()) if line]
         width, height = max(len(line) for line in lines), len(lines)
+        # The points are the interned points of the dungeon's grid
+        grid = get_grid(width, height)
         for y, line in enumerate(lines):
             for x, char in enumerate(line):
                 if char != DungeonTile.WALL:
-                    walkable.add(Point(x, y))
+                    point = grid.point(x, y)
+                    walkable.add(point)
                     if char == DungeonTile.PLAYER:
-                        player = Point(x, y)
+                        player = point
                     elif char == DungeonTile.COIN:
-                        coins.add(Point(x, y))
+                        coins.add(point)
                     elif char == DungeonTile.KEY:
-                        keys.add(Point(x, y))
+                        keys.add(point)
                     elif char == DungeonTile.MONSTER:
-                        monsters.append(Monster(Point(x, y), True))
+                        monsters.append(Monster(point, True))
                     elif char == DungeonTile.DAGGER:
-                        daggers.add(Point(x, y))
+                        daggers.add(point)
                     elif char == DungeonTile.EXIT:
-                        exit = Point(x, y)
+                        exit = point
         problem = DungeonGame()
         problem.layout = DungeonLayout(width, height, walkable, exit)
         player = Player(player, True, Player.Inventory(0, 0, 0))
         problem.initial_state = DungeonState(0, 0, problem.layout, player, coins, daggers, keys, monsters)
         return problem
 
-    # Read a dungeon problem from file containing a grid of tiles
+    # Returns the compiled fields of the game (see 'level_cache.py'): the size, the bitmaps of the walkable cells,
+    # the coins, the keys and the daggers, the cell index of the player and of the exit and the cell index of every monster
+    def compile(self) -> bytes:
+        layout, state = self.layout, self.initial_state
+        width, height = layout.width, layout.height
+        def cell(point: Point) -> int:
+            return point.y * width + point.x
+        return LevelWriter().integers((width, height), "H").points(layout.walkable, width, height) \
+            .points(state.coins, width, height).points(state.keys, width, height).points(state.daggers, width, height) \
+            .integers((cell(state.player.position), cell(layout.exit))) \
+            .integers([cell(monster.position) for monster in state.monsters]).to_bytes()
+
+    # Rebuilds a dungeon game from its compiled fields. The sets are filled in the same order as 'from_text'.
+    @staticmethod
+    def from_compiled(reader: LevelReader) -> 'DungeonGame':
+        width, height = reader.integers("H")
+        walkable, coins, keys, daggers = (set(reader.points(width, height)) for _ in range(4))
+        (player, exit), monsters = reader.integers(), reader.integers()
+        grid = get_grid(width, height)
+        def point(cell: int) -> Point:
+            return grid.point(cell % width, cell // width)
+        problem = DungeonGame()
+        problem.layout = DungeonLayout(width, height, walkable, point(exit))
+        player = Player(point(player), True, Player.Inventory(0, 0, 0))
+        monsters = [Monster(point(cell), True) for cell in monsters]
+        problem.initial_state = DungeonState(0, 0, problem.layout, player, coins, daggers, keys, monsters)
+        return problem
+
+    # Read a dungeon problem from file containing a grid of tiles (through the compiled level cache)
     @staticmethod
     def from_file(path: str) -> 'DungeonGame':
-        with open(path, 'r') as f:
-            return DungeonGame.from_text(f.read())
+        return load_level(path, "dungeon", DungeonGame.from_text, DungeonGame.compile, DungeonGame.from_compiled)
 
 # This agent will control a monster
 class MonsterAgent(Agent):
@@ -280,32 +314,31 @@ class MonsterAgent(Agent):
 def path_length(path) -> int:
     return 0xffffffff if path is None else len(path)-1
 
+# Returns the distance oracle of the dungeon layout (it is created once and stored in the game's cache).
+# It holds the distances between every pair of walkable cells and rebuilds the paths when they are needed (see 'mathutils.py').
+def get_distance_oracle(game: DungeonGame) -> DistanceOracle:
+    cache = game.cache()
+    oracle = cache.get("distance_oracle")
+    if oracle is None:
+        layout = game.layout
+        oracle = cache["distance_oracle"] = DistanceOracle(layout.width, layout.height, layout.walkable)
+    return oracle
+
 # Return the path between two points in the dungeom
-# The result is cached inside the game object
 def compute_path(game: DungeonGame, p1: Point, p2: Point) -> List[Point]:
-    cache = game.cache()
-    if p1 not in cache:
-        from collections import deque
-        path_map = {p1: [p1]}
-        queue = deque([p1])
-        while queue:
-            parent = queue.popleft()
-            path = path_map[parent]
-            for direction in Direction:
-                child = parent + direction.to_vector()
-                if child in path_map or child not in game.layout.walkable:
-                    continue
-                path_map[child] = path + [child]
-                queue.append(child)
-        cache[p1] = path_map
-    return cache[p1].get(p2, None)
+    return get_distance_oracle(game).path(p1, p2)
+
+# Return the length of the path between two points in the dungeon (the same value as 'path_length(compute_path(game, p1, p2))')
+def compute_distance(game: DungeonGame, p1: Point, p2: Point) -> int:
+    distance = get_distance_oracle(game).distance(p1, p2)
+    return 0xffffffff if distance is None else distance
 
 # Finds the shortest path from a point to a path in the dungeon
+# (only the path to the nearest point is built, the first one on the path if several are at the same distance)
 def path_to_path(game: DungeonGame, p1: Point, path: List[Point]):
     if path is None: return None
-    paths = [compute_path(game, p1, p2) for p2 in path]
-    _, _, shortest = min((path_length(path), index, path) for index, path in enumerate(paths))
-    return shortest
+    _, index = min((compute_distance(game, p1, p2), index) for index, p2 in enumerate(path))
+    return compute_path(game, p1, path[index])
 
 # Checks if monsters can reach the player while traversing the shortest path to a goal point
 # Returns the number of monster that endanger the player and the length of the player's path
@@ -352,7 +385,7 @@ def dungeon_heuristic(game: DungeonGame, state: DungeonState, agent: int) -> flo
 
     # find the distance to the nearest monster
     if alive_monsters:
-        nearest_monster = min(path_length(compute_path(game, state.player.position, monster.position)) for monster in alive_monsters)
+        nearest_monster = min(compute_distance(game, state.player.position, monster.position) for monster in alive_monsters)
     else:
         nearest_monster = area
     
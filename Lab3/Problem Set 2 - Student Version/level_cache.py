@@ -0,0 +1,162 @@
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple, TypeVar
+import hashlib, logging, mmap, os, struct, tempfile
+
+from mathutils import Point, get_grid
+
+# This file contains a cache of compiled levels for the 'from_file' loaders of the grid problems.
+# The cache is disabled by default (so the graders and the tests never write any file): it is enabled by setting
+# the environment variable LEVEL_CACHE to the cache folder, or to "1" to use the default folder.
+# The first time a level file is loaded, it is parsed as usual and its compiled form is written to the cache folder
+# in a file named after the SHA-256 fingerprint of the level file's content. The next loads memory-map the compiled file
+# and rebuild the problem from its binary fields (bitmaps of the walkable cells, cell indices of the pieces, neighbour tables)
+# instead of parsing the text character by character.
+# Every problem defines how it is compiled and loaded (see 'SokobanProblem.from_file' or 'DungeonGame.from_file' for example);
+# a compiled level is a sequence of fields written by 'LevelWriter' and read back in the same order by 'LevelReader'.
+# The cache is only an optimization: if the cache folder can not be read or written, or a compiled file is damaged or stale,
+# the problem is logged and the level is parsed from its text as before.
+# The graph routing problems do not use the cache, since their JSON files are small enough to parse faster than the cache is checked.
+
+# The header of a compiled level file: magic, version, fingerprint of the level file (SHA-256) and the kind of the level
+_HEADER = struct.Struct("<4sI32s16s")
+_MAGIC = b"LVLC"
+_VERSION = 1
+
+# The folder where the compiled levels are saved when LEVEL_CACHE is "1" (it is ignored by git)
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".level_cache")
+
+logger = logging.getLogger(__name__)
+
+# Returns the cache folder (or None if the cache is disabled)
+def cache_directory() -> Optional[str]:
+    directory = os.environ.get("LEVEL_CACHE", "")
+    if not directory:
+        return None
+    return DEFAULT_CACHE_DIRECTORY if directory == "1" else directory
+
+T = TypeVar("T")
+
+# Loads a level of the given kind from a file.
+#   'parse' builds the problem from the text of the file (the loader used without the cache),
+#   'compile' returns the compiled fields of a problem and 'load' rebuilds the problem from them.
+def load_level(path: str, kind: str, parse: Callable[[str], T], compile: Callable[[T], bytes], load: Callable[['LevelReader'], T]) -> T:
+    with open(path, 'rb') as f:
+        source = f.read()
+    directory = cache_directory()
+    if directory is None:
+        return parse(source.decode("utf-8"))
+    fingerprint = hashlib.sha256(source).digest()
+    compiled_path = os.path.join(directory, f"{fingerprint.hex()[:32]}.{kind}")
+    data = _read_compiled(compiled_path, fingerprint, kind)
+    if data is not None:
+        try:
+            return load(LevelReader(data))
+        except Exception:
+            # A damaged compiled file is replaced below
+            logger.warning("Could not load the compiled level '%s', parsing '%s' instead", compiled_path, path, exc_info=True)
+    problem = parse(source.decode("utf-8"))
+    try:
+        _write_compiled(compiled_path, fingerprint, kind, compile(problem))
+    except Exception:
+        # The level can not be compiled (or the folder is read-only), so it will be parsed again next time
+        logger.warning("Could not write the compiled level '%s'", compiled_path, exc_info=True)
+    return problem
+
+# Memory-maps a compiled level and returns its fields, or None if the file does not exist or does not match the level
+def _read_compiled(path: str, fingerprint: bytes, kind: str) -> Optional[memoryview]:
+    try:
+        with open(path, 'rb') as f:
+            try:
+                # The map stays valid after the file is closed
+                data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            except (OSError, ValueError):
+                # Some file systems can not be memory-mapped, so the file is read instead
+                data = memoryview(f.read())
+    except OSError:
+        return None
+    if len(data) < _HEADER.size:
+        return None
+    magic, version, stored_fingerprint, stored_kind = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _VERSION or stored_fingerprint != fingerprint or stored_kind.rstrip(b"\0") != kind.encode():
+        return None
+    return data[_HEADER.size:]
+
+# Writes a compiled level (through a temporary file with a unique name, so a reader never sees a partial file)
+def _write_compiled(path: str, fingerprint: bytes, kind: str, fields: bytes) -> None:
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, _VERSION, fingerprint, kind.encode()))
+            f.write(fields)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+# Writes the fields of a compiled level. Every field is a count followed by its items, so it can be read back without a schema.
+class LevelWriter:
+    def __init__(self) -> None:
+        self.parts: List[bytes] = []
+
+    # A sequence of integers in the given struct format ('H' for cell indices, 'q' for coordinates, ...)
+    def integers(self, values: Sequence[int], format: str = "I") -> 'LevelWriter':
+        self.parts.append(struct.pack(f"<I{len(values)}{format}", len(values), *values))
+        return self
+
+    # A set of points of a grid, as a bitmap where bit 'y * width + x' is set if the point (x, y) is in the set
+    def points(self, points: Iterable[Point], width: int, height: int) -> 'LevelWriter':
+        mask = 0
+        for point in points:
+            mask |= 1 << (point.y * width + point.x)
+        self.parts.append(struct.pack("<I", (width * height + 7) // 8) + mask.to_bytes((width * height + 7) // 8, "little"))
+        return self
+
+    # A sequence of strings
+    def strings(self, values: Sequence[str]) -> 'LevelWriter':
+        encoded = [value.encode("utf-8") for value in values]
+        self.integers([len(value) for value in encoded])
+        self.parts.append(b"".join(encoded))
+        return self
+
+    def to_bytes(self) -> bytes:
+        return b"".join(self.parts)
+
+# The positions of the set bits of every byte value (in increasing order)
+_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+# Reads the fields of a compiled level in the order they were written
+class LevelReader:
+    def __init__(self, data: memoryview) -> None:
+        self.data = data
+        self.offset = 0
+
+    def integers(self, format: str = "I") -> Tuple[int, ...]:
+        count, = struct.unpack_from("<I", self.data, self.offset)
+        values = struct.unpack_from(f"<{count}{format}", self.data, self.offset + 4)
+        self.offset += 4 + struct.calcsize(f"<{count}{format}")
+        return values
+
+    # Returns the points of a bitmap in row-major order (the order in which the text loaders add them to their sets).
+    # The points are the interned points of the grid.
+    def points(self, width: int, height: int) -> List[Point]:
+        size, = struct.unpack_from("<I", self.data, self.offset)
+        bitmap = self.data[self.offset + 4:self.offset + 4 + size]
+        self.offset += 4 + size
+        point = get_grid(width, height).point
+        points = []
+        for byte_index, byte in enumerate(bitmap):
+            if not byte: continue
+            for bit in _BITS[byte]:
+                y, x = divmod(8 * byte_index + bit, width)
+                points.append(point(x, y))
+        return points
+
+    def strings(self) -> List[str]:
+        lengths = self.integers()
+        values, offset = [], self.offset
+        for length in lengths:
+            values.append(str(self.data[offset:offset + length], "utf-8"))
+            offset += length
+        self.offset = offset
+        return values
@@ -1,6 +1,8 @@
 from dataclasses import dataclass
 from enum import IntEnum
-from typing import Iterator
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from array import array
+from collections import deque
 import math
 
 # the class Point will hold a 2D coordinate on a discrete grid
@@ -14,14 +16,16 @@ class Point:
     y: int
 
     # The following functions implement the operators +, -, negative and str
+    # The operators return the interned point with the resulting coordinates if there is one (see 'get_grid'),
+    # so they do not build a new point on the grids that are in use
     def __add__(self, other: 'Point') -> 'Point':
-        return Point(self.x + other.x, self.y + other.y)
+        return intern_point(self.x + other.x, self.y + other.y)
     
     def __sub__(self, other: 'Point') -> 'Point':
-        return Point(self.x - other.x, self.y - other.y)
+        return intern_point(self.x - other.x, self.y - other.y)
     
     def __neg__(self) -> 'Point':
-        return Point(-self.x, -self.y)
+        return intern_point(-self.x, -self.y)
     
     def __str__(self) -> str:
         return f'({self.x}, {self.y})'
@@ -67,4 +71,122 @@ Direction._Vectors = [
     Point(-1,  0),
     Point( 0,  1),
     Point( 0,  0)
-]
\ No newline at end of file
+]
+
+# The points of a grid are interned: every point of the grid (and of a margin of one cell around it) is created once
+# and shared by the grid, the operators of 'Point' and 'intern_point'. Besides saving the allocations,
+# the dictionary and set lookups find a shared point by identity before comparing the coordinates.
+# The interned points of the grids in use, by their coordinates
+# (the points that are not on any cached grid are dropped when a grid leaves the cache, see 'get_grid')
+_INTERNED: Dict[Tuple[int, int], Point] = {}
+
+# Returns the interned point with the given coordinates, or a new point if it is not on any grid that was created
+def intern_point(x: int, y: int) -> Point:
+    point = _INTERNED.get((x, y))
+    return Point(x, y) if point is None else point
+
+# A grid holds a neighbour table for every direction: neighbors[direction][point] is the neighbouring point in that direction
+# (for every point of the grid, the neighbours on the margin are included)
+class Grid:
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        for y in range(-1, height + 1):
+            for x in range(-1, width + 1):
+                if (x, y) not in _INTERNED:
+                    _INTERNED[(x, y)] = Point(x, y)
+        cells = [_INTERNED[(x, y)] for y in range(height) for x in range(width)]
+        self.neighbors: List[Dict[Point, Point]] = [
+            {cell: _INTERNED[(cell.x + vector.x, cell.y + vector.y)] for cell in cells}
+            for vector in (direction.to_vector() for direction in Direction)
+        ]
+
+    # Returns the interned point with the given coordinates
+    def point(self, x: int, y: int) -> Point:
+        return intern_point(x, y)
+
+    # Returns the neighbour of a point in the given direction (the point does not need to be on the grid)
+    def neighbor(self, point: Point, direction: Direction) -> Point:
+        neighbor = self.neighbors[direction].get(point)
+        return point + direction.to_vector() if neighbor is None else neighbor
+
+# The largest number of grids that are cached at the same time
+GRID_CACHE_SIZE = 64
+
+# The cached grids by their size, in the order they were created
+_GRIDS: Dict[Tuple[int, int], Grid] = {}
+
+# Returns the grid of the given size (it is created once, then shared while it stays in the cache).
+# When the cache is full, the oldest grid is dropped with the interned points that no cached grid covers,
+# so a process that goes through many grid sizes does not keep all of them.
+# (A grid that is dropped while it is still in use is simply created again; the lookup stays a single dictionary access.)
+def get_grid(width: int, height: int) -> Grid:
+    grid = _GRIDS.get((width, height))
+    if grid is None:
+        grid = _GRIDS[(width, height)] = Grid(width, height)
+        if len(_GRIDS) > GRID_CACHE_SIZE:
+            del _GRIDS[next(iter(_GRIDS))]
+            # Keep the points in the bounding box of the cached grids (and their margins)
+            right, bottom = max(size[0] for size in _GRIDS), max(size[1] for size in _GRIDS)
+            for x, y in [(x, y) for x, y in _INTERNED if not (-1 <= x <= right and -1 <= y <= bottom)]:
+                del _INTERNED[(x, y)]
+    return grid
+
+# A distance oracle holds the length of the shortest path between every pair of walkable cells of a grid
+# (moving in the four directions and ignoring everything but the walls), computed once by a breadth first search from every cell.
+# The cells are numbered in row-major order and the two tables are flat arrays of 16-bit integers indexed by 'source * count + target':
+#   distances: the number of steps from the source to the target (-1 if it can not be reached),
+#   parents: the cell before the target on a shortest path from the source (the breadth first search tree of the source).
+# A path is only built when it is requested, by following the parents back from the target. Since the searches visit
+# the neighbours in the order of 'Direction', it is the same path that a breadth first search from the source would return.
+# The tables take 4 * count^2 bytes instead of a dictionary of paths (lists of points) for every pair of cells.
+class DistanceOracle:
+    def __init__(self, width: int, height: int, walkable: Iterable[Point]) -> None:
+        grid = get_grid(width, height)
+        self.cells: List[Point] = sorted(walkable, key=lambda point: (point.y, point.x))
+        self.index: Dict[Point, int] = {point: index for index, point in enumerate(self.cells)}
+        count = self.count = len(self.cells)
+        if count >= 2**15:
+            raise ValueError(f"A distance oracle supports at most {2**15 - 1} cells (got {count})")
+        neighbors = [
+            [self.index[neighbor] for neighbor in (grid.neighbor(cell, direction) for direction in Direction) if neighbor in self.index]
+            for cell in self.cells
+        ]
+        self.distances = distances = array('h', [-1]) * (count * count)
+        self.parents = parents = array('h', [-1]) * (count * count)
+        for source in range(count):
+            base = source * count
+            distances[base + source] = 0
+            parents[base + source] = source
+            queue = deque([source])
+            while queue:
+                cell = queue.popleft()
+                distance = distances[base + cell] + 1
+                for neighbor in neighbors[cell]:
+                    if distances[base + neighbor] < 0:
+                        distances[base + neighbor] = distance
+                        parents[base + neighbor] = cell
+                        queue.append(neighbor)
+
+    # Returns the number of steps from p1 to p2 (or None if p2 can not be reached from p1)
+    def distance(self, p1: Point, p2: Point) -> Optional[int]:
+        source, target = self.index.get(p1), self.index.get(p2)
+        if source is None or target is None:
+            return 0 if p1 == p2 else None
+        distance = self.distances[source * self.count + target]
+        return None if distance < 0 else distance
+
+    # Returns the points of a shortest path from p1 to p2 (including both), or None if p2 can not be reached from p1
+    def path(self, p1: Point, p2: Point) -> Optional[List[Point]]:
+        source, target = self.index.get(p1), self.index.get(p2)
+        if source is None or target is None:
+            return [p1] if p1 == p2 else None
+        base, parents = source * self.count, self.parents
+        if parents[base + target] < 0:
+            return None
+        path = [target]
+        while target != source:
+            target = parents[base + target]
+            path.append(target)
+        cells = self.cells
+        return [cells[cell] for cell in reversed(path)]
@@ -1,7 +1,7 @@
 from typing import Dict, List, Optional, Set, Tuple
 from mdp import MarkovDecisionProcess
 from environment import Environment
-from mathutils import Point, Direction
+from mathutils import Point, Direction, get_grid
 from helpers.mt19937 import RandomGenerator
 import json
 
@@ -53,8 +53,10 @@ class GridMDP(MarkovDecisionProcess[Point, Direction]):
             (action.rotate(3), 0.5 * self.noise)
         ]
         states = {}
+        # The neighbours are read from the neighbour tables of the grid
+        grid = get_grid(*self.size)
         for direction, prob in noisy_actions:
-            next_state = state + direction.to_vector()
+            next_state = grid.neighbor(state, direction)
             if next_state not in self.walkable: next_state = state
             if next_state in states: states[next_state] += prob
             else: states[next_state] = prob
@@ -118,7 +120,7 @@ class GridMDP(MarkovDecisionProcess[Point, Direction]):
         for j, row in enumerate(grid):
             for i, (tile, reward) in enumerate(row):
                 if tile == '#': continue
-                point = Point(i, j)
+                point = get_grid(width, height).point(i, j)
                 walkable.add(point)
                 rewards[point] = reward
                 if tile == 'T': terminals.add(point)
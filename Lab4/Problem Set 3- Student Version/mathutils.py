@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 from enum import IntEnum
-from typing import Iterator
+from typing import Dict, Iterator, List, Tuple
 import math
 
 # the class Point will hold a 2D coordinate on a discrete grid
@@ -14,14 +14,16 @@ class Point:
     y: int
 
     # The following functions implement the operators +, -, negative and str
+    # The operators return the interned point with the resulting coordinates if there is one (see 'get_grid'),
+    # so they do not build a new point on the grids that are in use
     def __add__(self, other: 'Point') -> 'Point':
-        return Point(self.x + other.x, self.y + other.y)
+        return intern_point(self.x + other.x, self.y + other.y)
     
     def __sub__(self, other: 'Point') -> 'Point':
-        return Point(self.x - other.x, self.y - other.y)
+        return intern_point(self.x - other.x, self.y - other.y)
     
     def __neg__(self) -> 'Point':
-        return Point(-self.x, -self.y)
+        return intern_point(-self.x, -self.y)
     
     def __str__(self) -> str:
         return f'({self.x}, {self.y})'
@@ -74,4 +76,63 @@ Direction._Vectors = [
     Point(-1,  0),
     Point( 0,  1),
     Point( 0,  0)
-]
\ No newline at end of file
+]
+
+# The points of a grid are interned: every point of the grid (and of a margin of one cell around it) is created once
+# and shared by the grid, the operators of 'Point' and 'intern_point'. Besides saving the allocations,
+# the dictionary and set lookups find a shared point by identity before comparing the coordinates.
+# The interned points of the grids in use, by their coordinates
+# (the points that are not on any cached grid are dropped when a grid leaves the cache, see 'get_grid')
+_INTERNED: Dict[Tuple[int, int], Point] = {}
+
+# Returns the interned point with the given coordinates, or a new point if it is not on any grid that was created
+def intern_point(x: int, y: int) -> Point:
+    point = _INTERNED.get((x, y))
+    return Point(x, y) if point is None else point
+
+# A grid holds a neighbour table for every direction: neighbors[direction][point] is the neighbouring point in that direction
+# (for every point of the grid, the neighbours on the margin are included)
+class Grid:
+    def __init__(self, width: int, height: int) -> None:
+        self.width = width
+        self.height = height
+        for y in range(-1, height + 1):
+            for x in range(-1, width + 1):
+                if (x, y) not in _INTERNED:
+                    _INTERNED[(x, y)] = Point(x, y)
+        cells = [_INTERNED[(x, y)] for y in range(height) for x in range(width)]
+        self.neighbors: List[Dict[Point, Point]] = [
+            {cell: _INTERNED[(cell.x + vector.x, cell.y + vector.y)] for cell in cells}
+            for vector in (direction.to_vector() for direction in Direction)
+        ]
+
+    # Returns the interned point with the given coordinates
+    def point(self, x: int, y: int) -> Point:
+        return intern_point(x, y)
+
+    # Returns the neighbour of a point in the given direction (the point does not need to be on the grid)
+    def neighbor(self, point: Point, direction: Direction) -> Point:
+        neighbor = self.neighbors[direction].get(point)
+        return point + direction.to_vector() if neighbor is None else neighbor
+
+# The largest number of grids that are cached at the same time
+GRID_CACHE_SIZE = 64
+
+# The cached grids by their size, in the order they were created
+_GRIDS: Dict[Tuple[int, int], Grid] = {}
+
+# Returns the grid of the given size (it is created once, then shared while it stays in the cache).
+# When the cache is full, the oldest grid is dropped with the interned points that no cached grid covers,
+# so a process that goes through many grid sizes does not keep all of them.
+# (A grid that is dropped while it is still in use is simply created again; the lookup stays a single dictionary access.)
+def get_grid(width: int, height: int) -> Grid:
+    grid = _GRIDS.get((width, height))
+    if grid is None:
+        grid = _GRIDS[(width, height)] = Grid(width, height)
+        if len(_GRIDS) > GRID_CACHE_SIZE:
+            del _GRIDS[next(iter(_GRIDS))]
+            # Keep the points in the bounding box of the cached grids (and their margins)
+            right, bottom = max(size[0] for size in _GRIDS), max(size[1] for size in _GRIDS)
+            for x, y in [(x, y) for x, y in _INTERNED if not (-1 <= x <= right and -1 <= y <= bottom)]:
+                del _INTERNED[(x, y)]
+    return grid